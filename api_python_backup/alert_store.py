@@ -0,0 +1,460 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+
+from events import event_key, version_key
+from spatial_index import FacilityGrid
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; writers are then only serialized within the process
+    fcntl = None
+
+# Alerts are sparse compared to facilities, so the grid cells are coarser
+ALERT_GRID_CELL_DEG = 2.0
+
+ALERT_LEVELS = {'green': 1, 'orange': 2, 'red': 3}
+
+# Column files of a segment, all memory-mapped on open
+SEGMENT_COLUMNS = ('time', 'latitude', 'longitude', 'event_type', 'alert_level', 'key', 'event_key',
+                   'record_offsets', 'grid_order', 'grid_cells')
+
+MANIFEST = 'MANIFEST.json'
+
+# A new segment is merged into the previous one while that is at most this
+# many times larger (see AlertStore._merge_tail)
+MERGE_RATIO = 2
+
+# Store the feed's alert versions are recorded in (with GDACS_ALERT_HISTORY=1)
+# and history queries read from. Point it at storage shared by all workers.
+ALERT_STORE_DIR = os.getenv('GDACS_ALERT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'gdacs_alert_store'))
+
+
+def pub_time(pub_date):
+    """Epoch seconds of an RSS pubDate (RFC 822) or ISO 8601 timestamp, None if unparseable"""
+    if not pub_date:
+        return None
+    try:
+        parsed = parsedate_to_datetime(pub_date)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(pub_date.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _hash64(*parts):
+    digest = hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def alert_level(disaster):
+    level = disaster.get('alertLevel') or disaster.get('parameters', {}).get('alertlevel', '')
+    return ALERT_LEVELS.get(str(level).lower(), 0)
+
+
+def _coordinate(value):
+    try:
+        return float(value) if value not in (None, '') else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class AlertSegment:
+    """
+    One immutable batch of alert versions opened read-only through memory
+    maps. Rows are sorted by time, so a time range is one slice; a lat/lon
+    grid over the event points answers bounding-box queries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in SEGMENT_COLUMNS}
+        self.time = columns['time']
+        self.latitude = columns['latitude']
+        self.longitude = columns['longitude']
+        self.event_type = columns['event_type']
+        self.alert_level = columns['alert_level']
+        self.key = columns['key']
+        self.event_key = columns['event_key']
+        self._record_offsets = columns['record_offsets']
+        self._records = np.memmap(os.path.join(path, 'records.bin'), dtype=np.uint8, mode='r') \
+            if self._record_offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+        self._grid = FacilityGrid.from_sorted(np.nan_to_num(self.latitude), np.nan_to_num(self.longitude),
+                                              columns['grid_order'], columns['grid_cells'],
+                                              cell_deg=self.meta['cellDeg'])
+
+    def __len__(self):
+        return len(self.time)
+
+    def record(self, index):
+        start, stop = self._record_offsets[index], self._record_offsets[index + 1]
+        return json.loads(bytes(self._records[start:stop]))
+
+    def rows(self, start=None, end=None, bbox=None, event_types=None, alert_levels=None):
+        """Sorted indices of the rows matching every given filter"""
+        meta = self.meta
+        if (start is not None and meta['timeMax'] < start) or (end is not None and meta['timeMin'] > end):
+            return np.empty(0, dtype=np.int64)
+        lo = 0 if start is None else int(np.searchsorted(self.time, start, side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.time, end, side='right'))
+
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            candidates = self._grid.query_bbox(lat_min, lon_min, lat_max, lon_max)
+            candidates = np.sort(candidates[(candidates >= lo) & (candidates < hi)])
+            lat, lon = self.latitude[candidates], self.longitude[candidates]
+            inside_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+            rows = candidates[(lat >= lat_min) & (lat <= lat_max) & inside_lon]
+        else:
+            rows = np.arange(lo, hi, dtype=np.int64)
+
+        if event_types is not None:
+            codes = [code for code, name in enumerate(meta['eventTypes']) if name in event_types]
+            rows = rows[np.isin(self.event_type[rows], codes)]
+        if alert_levels is not None:
+            rows = rows[np.isin(self.alert_level[rows], list(alert_levels))]
+        return rows
+
+
+class AlertStore:
+    """
+    Append-only store of GDACS alert versions, one per (event, pubDate).
+
+    Each `append` writes the versions it has not seen before as a new
+    columnar segment (time, coordinates, event type, alert level and the
+    JSON of each alert), published atomically and listed in a manifest, so
+    readers never see a partial segment. Small new segments are merged into
+    their predecessors as the store grows; `compact` merges all of them.
+    Queries select by time range, bounding box of the event point, event
+    types and alert levels, and by default return the latest version of
+    each event in the window.
+    """
+
+    def __init__(self, root, cell_deg=ALERT_GRID_CELL_DEG):
+        self.root = root
+        self.cell_deg = cell_deg
+        self._segments = {}
+        self._manifest = None
+        self._manifest_stamp = None
+        self._keys = None
+        self._lock = threading.Lock()
+        # Serializes this process's writers; the file lock covers other processes
+        self._write_mutex = threading.Lock()
+
+    # Reading
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return []
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp != self._manifest_stamp:
+            with open(path, encoding='utf-8') as f:
+                self._manifest = json.load(f)['segments']
+            self._manifest_stamp = stamp
+        return self._manifest
+
+    def segments(self):
+        """The live segments, reopened when another writer changed the manifest"""
+        with self._lock:
+            names = self._read_manifest()
+            for name in names:
+                if name not in self._segments:
+                    self._segments[name] = AlertSegment(os.path.join(self.root, name))
+            for name in set(self._segments) - set(names):
+                del self._segments[name]
+            return [self._segments[name] for name in names]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments())
+
+    def query(self, start=None, end=None, bbox=None, event_types=None, alert_levels=None, latest=True,
+              limit=None):
+        """
+        Alerts (as stored disaster dicts) whose pubDate lies in [start, end]
+        (epoch seconds), ordered by time. `bbox` is (lat_min, lon_min,
+        lat_max, lon_max), with lon_min > lon_max crossing the antimeridian.
+        With `latest` only the newest matching version of each event is kept;
+        `limit` keeps the most recent ones.
+        """
+        if event_types is not None:
+            event_types = {str(t).upper() for t in event_types}
+        if alert_levels is not None:
+            alert_levels = {ALERT_LEVELS.get(str(level).lower(), level) for level in alert_levels}
+
+        segments = self.segments()
+        parts = []
+        for number, segment in enumerate(segments):
+            rows = segment.rows(start, end, bbox, event_types, alert_levels)
+            if rows.size:
+                parts.append((number, rows, segment.time[rows], segment.event_key[rows]))
+        if not parts:
+            return []
+
+        segment_no = np.concatenate([np.full(rows.size, number, dtype=np.int64) for number, rows, _, _ in parts])
+        rows = np.concatenate([rows for _, rows, _, _ in parts])
+        times = np.concatenate([times for _, _, times, _ in parts])
+        events = np.concatenate([events for _, _, _, events in parts])
+
+        # By time, then order of arrival
+        order = np.lexsort((rows, segment_no, times))
+        if latest:
+            # Last occurrence of each event in that order
+            reversed_order = order[::-1]
+            _, first = np.unique(events[reversed_order], return_index=True)
+            order = reversed_order[first]
+            order = order[np.lexsort((rows[order], segment_no[order], times[order]))]
+        if limit is not None:
+            order = order[-limit:] if limit > 0 else order[:0]
+        return [segments[segment_no[i]].record(rows[i]) for i in order.tolist()]
+
+    # Writing
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        """Exclusive lock on the store across threads and (where fcntl exists) processes"""
+        with self._write_mutex:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, '.lock'), 'a') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                yield
+
+    def _known_keys(self):
+        if self._keys is None:
+            keys = [np.asarray(segment.key) for segment in self.segments()]
+            self._keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.uint64)
+        return self._keys
+
+    def append(self, disasters):
+        """
+        Store the versions among `disasters` that are not stored yet; returns
+        how many were added. Alerts without a parseable pubDate are skipped.
+        """
+        with self._write_lock():
+            # Another process may have appended since the keys were loaded
+            if self._keys is not None and self._manifest_stamp != self._stamp():
+                self._keys = None
+            known = self._known_keys()
+
+            rows, seen = [], set()
+            for disaster in disasters:
+                when = pub_time(disaster.get('pubDate'))
+                event = event_key(disaster)
+                if when is None or event is None:
+                    continue
+                key = _hash64(version_key(disaster))
+                if key in seen:
+                    continue
+                seen.add(key)
+                rows.append((when, key, _hash64(event), disaster))
+            if not rows:
+                return 0
+
+            keys = np.array([row[1] for row in rows], dtype=np.uint64)
+            new = ~np.isin(keys, known)
+            rows = [row for row, keep in zip(rows, new.tolist()) if keep]
+            if not rows:
+                return 0
+
+            disasters = [row[3] for row in rows]
+            event_types = sorted({str(d.get('eventType', '')).upper() for d in disasters})
+            type_codes = {name: code for code, name in enumerate(event_types)}
+            columns = {
+                'time': np.array([row[0] for row in rows], dtype=np.int64),
+                'latitude': np.array([_coordinate(d.get('latitude')) for d in disasters], dtype=np.float64),
+                'longitude': np.array([_coordinate(d.get('longitude')) for d in disasters], dtype=np.float64),
+                'event_type': np.array([type_codes[str(d.get('eventType', '')).upper()] for d in disasters],
+                                       dtype=np.uint8),
+                'alert_level': np.array([alert_level(d) for d in disasters], dtype=np.uint8),
+                'key': np.array([row[1] for row in rows], dtype=np.uint64),
+                'event_key': np.array([row[2] for row in rows], dtype=np.uint64),
+            }
+            records = [json.dumps(d, separators=(',', ':')).encode('utf-8') for d in disasters]
+            names = self._read_manifest() + [self._write_segment(columns, records, event_types)]
+            self._publish(names)
+            added = np.sort(keys[new])
+            self._keys = np.insert(known, np.searchsorted(known, added), added)
+            self._merge_tail()
+            return len(rows)
+
+    def compact(self):
+        """Merge all segments into one; returns the number of segments merged"""
+        with self._write_lock():
+            segments = self.segments()
+            if len(segments) < 2:
+                return 0
+            self._merge(segments, [])
+            return len(segments)
+
+    def _merge_tail(self):
+        """
+        Size-tiered merging: the newest segment is merged into the one before
+        while that one is at most MERGE_RATIO times larger, so a store of n
+        versions keeps O(log n) segments and each version is rewritten
+        O(log n) times.
+        """
+        segments = self.segments()
+        tail = 1
+        total = len(segments[-1]) if segments else 0
+        while tail < len(segments) and len(segments[-tail - 1]) <= total * MERGE_RATIO:
+            total += len(segments[-tail - 1])
+            tail += 1
+        if tail > 1:
+            self._merge(segments[-tail:], segments[:-tail])
+
+    def _merge(self, segments, keep):
+        """Replace `segments` (consecutive, oldest first) by one segment after `keep`"""
+        event_types = sorted(set().union(*(segment.meta['eventTypes'] for segment in segments)))
+        columns = {name: [] for name in ('time', 'latitude', 'longitude', 'event_type', 'alert_level', 'key', 'event_key')}
+        records = []
+        for segment in segments:
+            remap = np.array([event_types.index(name) for name in segment.meta['eventTypes']] or [0], dtype=np.uint8)
+            columns['event_type'].append(remap[np.asarray(segment.event_type)])
+            for name in ('time', 'latitude', 'longitude', 'alert_level', 'key', 'event_key'):
+                columns[name].append(np.asarray(getattr(segment, name)))
+            # Records are copied as stored, without decoding them
+            offsets = segment._record_offsets.tolist()
+            data = bytes(segment._records)
+            records.extend(data[offsets[i]:offsets[i + 1]] for i in range(len(segment)))
+        columns = {name: np.concatenate(parts) for name, parts in columns.items()}
+
+        name = self._write_segment(columns, records, event_types)
+        self._publish([segment.path.rsplit(os.sep, 1)[-1] for segment in keep] + [name])
+        for segment in segments:
+            # Open maps stay valid after the files are unlinked
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.root, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _publish(self, names):
+        fd, tmp = tempfile.mkstemp(prefix='.manifest.', dir=self.root)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'segments': names}, f)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+        self.segments()
+
+    def _write_segment(self, columns, records, event_types):
+        """Write the rows, sorted by time, as a new segment directory; returns its name"""
+        # Stable, so equal times keep their order of arrival
+        order = np.argsort(columns['time'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+        records = [records[i] for i in order.tolist()]
+        lat, lon = columns['latitude'], columns['longitude']
+        # Alerts without a point sit in cell (0, 0) and fail every exact bbox test
+        grid = FacilityGrid(np.nan_to_num(lat), np.nan_to_num(lon), cell_deg=self.cell_deg)
+        columns['record_offsets'] = np.concatenate(([0], np.cumsum([len(r) for r in records]))).astype(np.int64)
+        columns['grid_order'] = grid.order
+        columns['grid_cells'] = grid.sorted_cells
+
+        times = columns['time']
+        name = f"segment-{time.time_ns():020d}-{os.getpid()}"
+        staging = tempfile.mkdtemp(prefix=f'.{name}.', dir=self.root)
+        try:
+            for column, values in columns.items():
+                np.save(os.path.join(staging, f'{column}.npy'), np.ascontiguousarray(values))
+            with open(os.path.join(staging, 'records.bin'), 'wb') as f:
+                f.write(b''.join(records))
+            with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'count': len(times), 'timeMin': int(times[0]), 'timeMax': int(times[-1]),
+                           'eventTypes': event_types, 'cellDeg': self.cell_deg}, f)
+            os.rename(staging, os.path.join(self.root, name))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return name
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            'segments': len(segments),
+            'versions': sum(len(segment) for segment in segments),
+            'timeMin': min((segment.meta['timeMin'] for segment in segments), default=None),
+            'timeMax': max((segment.meta['timeMax'] for segment in segments), default=None),
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(root=ALERT_STORE_DIR):
+    """The AlertStore for `root`, shared by every handler of this process"""
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = AlertStore(root)
+        return store
+
+
+def _timestamp(value, name):
+    if isinstance(value, (int, float)):
+        return int(value)
+    when = pub_time(str(value))
+    if when is None:
+        raise ValueError(f"Invalid {name} '{value}': expected epoch seconds or an ISO 8601 / RFC 822 date")
+    return when
+
+
+def window_options(options, now=None):
+    """
+    AlertStore.query() arguments from a request's history options:
+
+        {"start": ..., "end": ...,              # epoch seconds or ISO 8601 / RFC 822 dates
+         "days": 90,                            # or: the last N days up to end (default now)
+         "bbox": [lat_min, lon_min, lat_max, lon_max],
+         "eventTypes": ["EQ"], "alertLevels": ["Orange", "Red"],
+         "versions": "latest" | "all", "limit": 1000}
+    """
+    if not isinstance(options, dict):
+        raise ValueError("history must be an object")
+    query = {}
+    end = _timestamp(options['end'], 'end') if options.get('end') is not None else None
+    if options.get('start') is not None:
+        query['start'] = _timestamp(options['start'], 'start')
+    elif options.get('days') is not None:
+        days = float(options['days'])
+        if days <= 0:
+            raise ValueError("days must be positive")
+        query['start'] = int((end if end is not None else (now or time.time())) - days * 86400)
+    if end is not None:
+        query['end'] = end
+
+    if options.get('bbox') is not None:
+        bbox = [float(v) for v in options['bbox']]
+        if len(bbox) != 4 or not (-90 <= bbox[0] <= bbox[2] <= 90) or not all(-180 <= v <= 180 for v in bbox[1::2]):
+            raise ValueError("bbox must be [lat_min, lon_min, lat_max, lon_max] in degrees")
+        query['bbox'] = tuple(bbox)
+    if options.get('eventTypes'):
+        query['event_types'] = list(options['eventTypes'])
+    if options.get('alertLevels'):
+        query['alert_levels'] = list(options['alertLevels'])
+
+    versions = options.get('versions', 'latest')
+    if versions not in ('latest', 'all'):
+        raise ValueError(f"Unknown versions option '{versions}'")
+    query['latest'] = versions == 'latest'
+    if options.get('limit') is not None:
+        query['limit'] = int(options['limit'])
+    return query
@@ -0,0 +1,122 @@
+"""
+Alert history: the columnar AlertStore vs scanning a JSON dump of every
+stored alert version.
+
+Records a year of synthetic feed refreshes, then times window queries ("EQ
+alerts in a bbox over the last 90 days" and friends), compaction and an
+impact assessment against a historical window.
+
+    python benchmarks/bench_alert_store.py [--days 365] [--new-per-day 20] [--repeats 20]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from alert_store import AlertStore, pub_time  # noqa: E402
+from synthetic import alert_history, facilities_csv  # noqa: E402
+
+DAY = 86400
+
+
+def json_scan(path, start, end, bbox, event_types):
+    """Baseline: load the dump and filter every version in Python, latest per guid"""
+    with open(path) as f:
+        versions = json.load(f)
+    latest = {}
+    for d in versions:
+        when = pub_time(d['pubDate'])
+        if not start <= when <= end or d['eventType'] not in event_types:
+            continue
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            if not (lat_min <= d['latitude'] <= lat_max and lon_min <= d['longitude'] <= lon_max):
+                continue
+        if d['guid'] not in latest or pub_time(latest[d['guid']]['pubDate']) <= when:
+            latest[d['guid']] = d
+    return sorted(latest.values(), key=lambda d: pub_time(d['pubDate']))
+
+
+def median_ms(fn, repeats):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--new-per-day', type=int, default=20)
+    parser.add_argument('--refreshes-per-day', type=int, default=4)
+    parser.add_argument('--facilities', type=int, default=20_000)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    snapshots = alert_history(args.days, args.new_per_day, args.refreshes_per_day)
+    root = tempfile.mkdtemp(prefix='bench_alert_store.')
+    try:
+        store = AlertStore(os.path.join(root, 'store'))
+        start = time.perf_counter()
+        for snapshot in snapshots:
+            store.append(snapshot)
+        append_s = time.perf_counter() - start
+        stats = store.stats()
+        items = sum(len(snapshot) for snapshot in snapshots)
+        print(f"{len(snapshots)} feed refreshes, {items} items, {stats['versions']} distinct versions")
+        print(f"append: {append_s / len(snapshots) * 1e3:.2f} ms per refresh, {stats['segments']} segments")
+
+        # The baseline's dump holds the same versions the store kept
+        dump = os.path.join(root, 'alerts.json')
+        with open(dump, 'w') as f:
+            json.dump(store.query(latest=False), f)
+
+        end = stats['timeMax']
+        queries = [
+            ('EQ, bbox 40x40 deg, last 90 days', end - 90 * DAY, (-20.0, 0.0, 20.0, 40.0), ['EQ']),
+            ('all types, bbox 10x10 deg, 1 year', stats['timeMin'], (30.0, -10.0, 40.0, 0.0), list('EQ TC FL VO DR'.split())),
+            ('all types, no bbox, last 7 days', end - 7 * DAY, None, list('EQ TC FL VO DR'.split())),
+        ]
+
+        def report(label, segments):
+            print(f"\n{segments} segment(s)")
+            print(f"{'query':<38} {'events':>7} {'json scan ms':>13} {'store ms':>9} {'speed-up':>9}")
+            for name, q_start, bbox, types in queries:
+                expected = json_scan(dump, q_start, end, bbox, set(types))
+                found = store.query(start=q_start, end=end, bbox=bbox, event_types=types)
+                assert sorted((d['pubDate'], d['guid']) for d in found) == \
+                    sorted((d['pubDate'], d['guid']) for d in expected), name
+                scan_ms = median_ms(lambda: json_scan(dump, q_start, end, bbox, set(types)), max(1, args.repeats // 10))
+                store_ms = median_ms(lambda: store.query(start=q_start, end=end, bbox=bbox, event_types=types),
+                                     args.repeats)
+                print(f"{name:<38} {len(found):>7} {scan_ms:>13.2f} {store_ms:>9.3f} {scan_ms / store_ms:>8.0f}x")
+
+        report('appended', stats['segments'])
+        start = time.perf_counter()
+        merged = store.compact()
+        print(f"\ncompact: {merged} segments merged in {time.perf_counter() - start:.2f} s")
+        report('compacted', store.stats()['segments'])
+
+        from facility_ingest import read_facilities
+        from impact_assessment import assess_history
+        facilities = read_facilities(facilities_csv(args.facilities, clusters=200))
+        window = dict(start=end - 90 * DAY, end=end)
+        events = len(store.query(**window))
+        assess_ms = median_ms(lambda: assess_history(facilities, store, workers=1, **window), max(1, args.repeats // 4))
+        print(f"\nassess_history: {args.facilities} facilities x {events} events (90 days) {assess_ms:.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Sequential vs concurrent batch recommendations against the stub LLM server.
+
+    python benchmarks/bench_batch_recommendations.py [--facilities 100] [--latency 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import start_stub_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--facilities', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, fail_every=args.fail_every)
+    os.environ['OPENAI_API_BASE'] = stub.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    # Every run must reach the model
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+
+    import openai
+    from recommendations import generate_recommendations_batch
+    openai.api_base = stub.base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+
+    items = [{
+        'facility': {'name': f'Facility {i}', 'latitude': 10.0, 'longitude': 20.0},
+        'impacts': [{'disaster': {'eventType': 'TC', 'title': 'Cyclone X', 'description': 'Cat 3'},
+                     'distance': 120.5}],
+    } for i in range(args.facilities)]
+
+    print(f"{args.facilities} facilities, {args.latency}s stub latency")
+    print(f"{'concurrency':>11} {'total s':>8} {'first result s':>15} {'errors':>7}")
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        first = None
+        errors = 0
+        for _, recommendations in generate_recommendations_batch(items, concurrency=concurrency, rate_limit=0):
+            first = first or time.perf_counter() - start
+            errors += isinstance(recommendations, Exception) or 'error' in recommendations
+        total = time.perf_counter() - start
+        print(f"{concurrency:>11} {total:>8.2f} {first:>15.2f} {errors:>7}")
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
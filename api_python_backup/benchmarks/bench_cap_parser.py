@@ -0,0 +1,133 @@
+"""
+Buffered ElementTree vs streaming iterparse parsing of the GDACS CAP feed.
+
+Parses synthetic feeds of growing size with the original fromstring/findall
+parser and with gdacs.iter_gdacs_cap_data, reporting time and peak traced
+memory. The streaming parser reads from a file so the document is never held
+in memory as a whole.
+
+    python benchmarks/bench_cap_parser.py [--vertices 40]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gdacs import iter_gdacs_cap_data  # noqa: E402
+from synthetic import cap_feed  # noqa: E402
+
+
+def buffered_parse(xml_text):
+    """The original fetch_gdacs_cap_data parsing code, kept as the baseline"""
+    root = ET.fromstring(xml_text)
+    disasters = []
+    namespaces = {
+        'cap': 'urn:oasis:names:tc:emergency:cap:1.2',
+        'geo': 'http://www.w3.org/2003/01/geo/wgs84_pos#',
+        'gdacs': 'http://www.gdacs.org'
+    }
+    for item in root.findall('.//item'):
+        title = item.find('title').text if item.find('title') is not None else ''
+        description = item.find('description').text if item.find('description') is not None else ''
+        pub_date = item.find('pubDate').text if item.find('pubDate') is not None else ''
+        link = item.find('link').text if item.find('link') is not None else ''
+        guid = item.find('guid').text if item.find('guid') is not None else ''
+        geo_point = item.find('.//geo:Point', namespaces)
+        lat = geo_point.find('./geo:lat', namespaces) if geo_point is not None else None
+        lon = geo_point.find('./geo:long', namespaces) if geo_point is not None else None
+        cap_alert = item.find('.//cap:alert', namespaces)
+        cap_info = cap_alert.find('.//cap:info', namespaces) if cap_alert is not None else None
+        if cap_info is not None:
+            event = cap_info.find('.//cap:event', namespaces)
+            severity = cap_info.find('.//cap:severity', namespaces)
+            certainty = cap_info.find('.//cap:certainty', namespaces)
+            urgency = cap_info.find('.//cap:urgency', namespaces)
+            headline = cap_info.find('.//cap:headline', namespaces)
+            cap_area = cap_info.find('.//cap:area', namespaces)
+            polygon = cap_area.find('.//cap:polygon', namespaces) if cap_area is not None else None
+            polygon_coordinates = []
+            if polygon is not None and polygon.text:
+                for point in polygon.text.strip().split(' '):
+                    coords = point.split(',')
+                    if len(coords) == 2:
+                        try:
+                            polygon_coordinates.append([float(coords[0]), float(coords[1])])
+                        except ValueError:
+                            continue
+            parameters = {}
+            for param in cap_info.findall('.//cap:parameter', namespaces):
+                name = param.find('.//cap:valueName', namespaces)
+                value = param.find('.//cap:value', namespaces)
+                if name is not None and value is not None and name.text and value.text:
+                    parameters[name.text] = value.text
+            web_url = cap_info.find('.//cap:web', namespaces)
+            web_link = web_url.text if web_url is not None else link
+            if web_link == link and 'link' in parameters:
+                web_link = parameters['link']
+            disasters.append({
+                'title': title, 'description': description, 'pubDate': pub_date, 'link': link,
+                'webUrl': web_link, 'guid': guid,
+                'latitude': float(lat.text) if lat is not None and lat.text else None,
+                'longitude': float(lon.text) if lon is not None and lon.text else None,
+                'eventType': event.text if event is not None else '',
+                'severity': severity.text if severity is not None else '',
+                'certainty': certainty.text if certainty is not None else '',
+                'urgency': urgency.text if urgency is not None else '',
+                'headline': headline.text if headline.text is not None else '',
+                'polygon': polygon_coordinates, 'parameters': parameters
+            })
+    return disasters
+
+
+def measure(fn):
+    """Wall time of an untraced run, then peak memory of a traced one"""
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--vertices', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'items':>7} {'feed MB':>8} {'buffered ms':>12} {'peak MB':>8} {'stream ms':>10} {'peak MB':>8}")
+    for items in [150, 1_000, 5_000, 20_000]:
+        xml_text = cap_feed(items=items, vertices=args.vertices, seed=args.seed)
+        with tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False, encoding='utf-8') as f:
+            f.write(xml_text)
+            path = f.name
+        try:
+            # Baseline: whole body as text (as response.text) + full tree
+            def buffered():
+                with open(path, encoding='utf-8') as fh:
+                    return sum(1 for _ in buffered_parse(fh.read()))
+
+            # Streaming: count items without keeping them, as a consumer would
+            def streaming():
+                return sum(1 for _ in iter_gdacs_cap_data(path))
+
+            n_buf, t_buf, m_buf = measure(buffered)
+            n_str, t_str, m_str = measure(streaming)
+            assert n_buf == n_str == items
+            print(f"{items:>7} {len(xml_text) / 1e6:>8.1f} {t_buf * 1e3:>12.1f} {m_buf / 1e6:>8.1f} "
+                  f"{t_str * 1e3:>10.1f} {m_str / 1e6:>8.1f}")
+        finally:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Facility ingestion: read_csv + iterrows vs columnar readers.
+
+Builds a synthetic facilities file and measures wall time and peak traced
+memory of the original per-row dict construction, the chunked columnar CSV
+reader and, when pyarrow is installed, the Parquet reader.
+
+    python benchmarks/bench_facility_ingest.py [--rows 1000000] [--skip-baseline]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from facility_ingest import read_facilities, read_facilities_parquet  # noqa: E402
+from synthetic import facilities_csv  # noqa: E402
+
+
+def iterrows_baseline(csv_text):
+    """The original handler code path"""
+    df = pd.read_csv(io.StringIO(csv_text))
+    facilities = []
+    for _, row in df.iterrows():
+        facilities.append({
+            'name': row['name'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude']
+        })
+    return len(facilities)
+
+
+def measure(label, fn):
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {count:>9} rows {elapsed:>8.2f} s {peak / 1e6:>9.1f} MB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-baseline', action='store_true', help='iterrows takes minutes at 1M rows')
+    args = parser.parse_args()
+
+    csv_text = facilities_csv(args.rows, seed=args.seed)
+    print(f"{args.rows} rows, {len(csv_text) / 1e6:.1f} MB CSV")
+
+    if not args.skip_baseline:
+        measure('read_csv + iterrows', lambda: iterrows_baseline(csv_text))
+    measure('columnar csv', lambda: len(read_facilities(csv_text)))
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print('pyarrow not installed, skipping Parquet')
+        return
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(pd.read_csv(io.StringIO(csv_text))), buffer)
+    parquet = buffer.getvalue()
+    print(f"Parquet upload: {len(parquet) / 1e6:.1f} MB")
+    measure('columnar parquet', lambda: len(read_facilities_parquet(io.BytesIO(parquet))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Upstream fetch benchmark: the CAP feed, the RSS feed and per-event geometry
+served by a local stand-in for GDACS with artificial latency, fetched and
+merged sequentially (one worker) and concurrently over the pooled session.
+Also reports connections opened, bytes on the wire (gzip) and how long a
+stalled upstream holds a fetch.
+
+    python benchmarks/bench_feed_fetch.py [--events 150] [--latency 0.05] [--workers 8]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import cap_feed, event_geometry, rss_feed  # noqa: E402
+
+
+def start_gdacs_server(cap, rss, latency, stall=3600):
+    """Stand-in GDACS: /cap.xml, /rss.xml, /geometry?eventtype=&eventid=&episodeid= and a stalled /stall"""
+    stats = {'connections': 0, 'requests': 0, 'bytes': 0}
+    lock = threading.Lock()
+    feeds = {'/cap.xml': (cap.encode(), 'application/xml'), '/rss.xml': (rss.encode(), 'application/xml')}
+
+    class GDACSHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with lock:
+                stats['connections'] += 1
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stall':
+                time.sleep(stall)
+                return
+            time.sleep(latency)
+            if url.path == '/geometry':
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                payload = json.dumps(event_geometry(query.get('eventtype'), query.get('eventid'),
+                                                    query.get('episodeid'))).encode()
+                content_type = 'application/json'
+            elif url.path in feeds:
+                payload, content_type = feeds[url.path]
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                payload = gzip.compress(payload, compresslevel=5)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            with lock:
+                stats['requests'] += 1
+                stats['bytes'] += len(payload)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GDACSHandler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=150)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--read-timeout', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = start_gdacs_server(cap_feed(args.events, 40), rss_feed(args.events), args.latency)
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    os.environ['HTTP_READ_TIMEOUT'] = str(args.read_timeout)
+    import gdacs
+    import http_client
+
+    cap_size = len(cap_feed(args.events, 40).encode())
+    print(f"{args.events} events, {args.latency * 1e3:.0f} ms upstream latency, "
+          f"CAP feed {cap_size / 1e6:.1f} MB uncompressed")
+    print(f"{'mode':>22} {'seconds':>8} {'requests':>9} {'conns':>6} {'wire MB':>8}")
+
+    results = {}
+    for label, workers in (('sequential', 1), (f'concurrent ({args.workers})', args.workers)):
+        # Fresh pool per mode, so connection counts are comparable
+        session = http_client.make_session()
+        gdacs.SESSION = session
+        http_client.SESSION = session
+        server.stats.update(connections=0, requests=0, bytes=0)
+
+        start = time.perf_counter()
+        disasters = gdacs.fetch_gdacs_cap_data(base + '/cap.xml')
+        merged = gdacs.enrich_gdacs_events(disasters, rss_url=base + '/rss.xml', fetch_geometry=True,
+                                           geometry_url=base + '/geometry', max_workers=workers)
+        elapsed = time.perf_counter() - start
+        stats = server.stats
+        print(f"{label:>22} {elapsed:>8.2f} {stats['requests']:>9} {stats['connections']:>6} "
+              f"{stats['bytes'] / 1e6:>8.2f}")
+        results[label] = merged
+
+    merged = list(results.values())[-1]
+    assert merged == list(results.values())[0], "sequential and concurrent merges differ"
+    rss_only = len(merged) - len(gdacs.fetch_gdacs_cap_data(base + '/cap.xml'))
+    with_geometry = sum(1 for d in merged if 'geometry' in d)
+    ids = sum(1 for d in merged if d.get('eventId') and d.get('episodeId') and d.get('alertLevel'))
+    print(f"\nmerged {len(merged)} events: {rss_only} RSS-only appended, {with_geometry} with geometry, "
+          f"{ids} with alert level and event/episode ids")
+
+    start = time.perf_counter()
+    stalled = gdacs.fetch_gdacs_cap_data(base + '/stall')
+    print(f"stalled upstream: gave up after {time.perf_counter() - start:.2f} s "
+          f"(read timeout {args.read_timeout} s), {len(stalled)} items")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
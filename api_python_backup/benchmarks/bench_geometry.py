@@ -0,0 +1,58 @@
+"""
+Feed payload size and processing time for polygon simplification,
+quantization and polyline encoding, cold and from the per-event cache.
+
+    python benchmarks/bench_geometry.py [--events 150] [--vertices 2000]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from geometry import GeometryProcessor  # noqa: E402
+from gdacs import iter_gdacs_cap_data  # noqa: E402
+from synthetic import cap_feed  # noqa: E402
+
+CASES = [
+    ('as parsed', {}),
+    ('precision=4', {'precision': 4}),
+    ('simplify=0.01 dp', {'tolerance': 0.01}),
+    ('simplify=0.05 dp', {'tolerance': 0.05}),
+    ('simplify=0.05 vw', {'tolerance': 0.05, 'method': 'vw'}),
+    ('polyline', {'encoding': 'polyline'}),
+    ('simplify=0.01 polyline p4', {'tolerance': 0.01, 'precision': 4, 'encoding': 'polyline'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=150)
+    parser.add_argument('--vertices', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    disasters = list(iter_gdacs_cap_data(io.BytesIO(cap_feed(args.events, args.vertices, args.seed).encode())))
+    vertices = sum(len(d['polygon']) for d in disasters)
+    print(f"{len(disasters)} events, {vertices} polygon vertices")
+    print(f"{'options':>26} {'cold ms':>8} {'cached ms':>10} {'dumps ms':>9} {'bytes':>11}")
+    for label, options in CASES:
+        processor = GeometryProcessor()
+        start = time.perf_counter()
+        processor.process(disasters, **options)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        processed = processor.process(disasters, **options)
+        cached = time.perf_counter() - start
+        start = time.perf_counter()
+        payload = json.dumps(processed).encode()
+        dumps = time.perf_counter() - start
+        print(f"{label:>26} {cold * 1e3:>8.1f} {cached * 1e3:>10.2f} {dumps * 1e3:>9.1f} {len(payload):>11,}")
+
+
+if __name__ == '__main__':
+    main()
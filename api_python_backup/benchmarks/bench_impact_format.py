@@ -0,0 +1,65 @@
+"""
+Size and serialization time of the full vs compact impact response.
+
+Facilities are clustered around the events of a synthetic CAP feed, so each
+disaster (with its polygon, description and parameters) is referenced by many
+impact entries, as a cyclone crossing a dense facility network would be.
+
+    python benchmarks/bench_impact_format.py [--events 30] [--per-event 1000] [--vertices 100]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import cap_feed  # noqa: E402
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=30)
+    parser.add_argument('--per-event', type=int, default=1000, help='facilities scattered around each event')
+    parser.add_argument('--vertices', type=int, default=100, help='polygon vertices per event')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    from facility_ingest import FacilityColumns
+    from gdacs import iter_gdacs_cap_data
+    from impact_assessment import assess_impact
+
+    disasters = list(iter_gdacs_cap_data(io.BytesIO(cap_feed(args.events, args.vertices, args.seed).encode())))
+    rng = np.random.default_rng(args.seed)
+    lat = np.concatenate([d['latitude'] + rng.uniform(-1, 1, args.per_event) for d in disasters])
+    lon = np.concatenate([d['longitude'] + rng.uniform(-1, 1, args.per_event) for d in disasters])
+    facilities = FacilityColumns([f'Facility {i}' for i in range(len(lat))], lat, np.clip(lon, -180, 180))
+
+    print(f"{len(disasters)} events with {args.vertices}-vertex polygons, {len(lat)} facilities")
+    print(f"{'format':>8} {'impacts':>8} {'assess s':>9} {'dumps s':>8} {'bytes':>12}")
+    for response_format in ('full', 'compact'):
+        assess, impacted = best_of(lambda: assess_impact(facilities, disasters, response_format=response_format))
+        dumps, payload = best_of(lambda: json.dumps({'impactedFacilities': impacted}).encode())
+        if response_format == 'full':
+            impacts = sum(len(entry['impacts']) for entry in impacted)
+        else:
+            impacts = len(impacted['impacts']['distance'])
+        print(f"{response_format:>8} {impacts:>8} {assess:>9.3f} {dumps:>8.3f} {len(payload):>12,}")
+
+
+if __name__ == '__main__':
+    main()
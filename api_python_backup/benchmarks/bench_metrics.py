@@ -0,0 +1,71 @@
+"""
+Overhead of the instrumentation in metrics.py: cost per span()/count() call
+with metrics disabled and enabled, and the latency of a typical impact
+assessment in either state.
+
+    python benchmarks/bench_metrics.py [--calls 1000000] [--facilities 20000] [--repeats 20]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics  # noqa: E402
+from synthetic import cap_feed, facilities_csv  # noqa: E402
+
+
+def per_call_ns(calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        with metrics.span('bench'):
+            pass
+    span_ns = (time.perf_counter() - start) / calls * 1e9
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        metrics.count('bench')
+    count_ns = (time.perf_counter() - start) / calls * 1e9
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        pass
+    loop_ns = (time.perf_counter() - start) / calls * 1e9
+    return span_ns - loop_ns, count_ns - loop_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=1_000_000)
+    parser.add_argument('--facilities', type=int, default=20_000)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    from gdacs import iter_gdacs_cap_data
+    from facility_ingest import read_facilities
+    from impact_assessment import assess_impact
+
+    disasters = list(iter_gdacs_cap_data(io.BytesIO(cap_feed(150, 40).encode())))
+    facilities = read_facilities(facilities_csv(args.facilities))
+    print(f"{len(disasters)} disasters, {args.facilities} facilities, median of {args.repeats} assessments")
+    print(f"{'metrics':>9} {'span ns':>8} {'count ns':>9} {'assess ms':>10}")
+
+    for enabled in (False, True):
+        metrics.configure(enabled=enabled)
+        span_ns, count_ns = per_call_ns(args.calls)
+        assess_impact(facilities, disasters, workers=1)
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            assess_impact(facilities, disasters, workers=1)
+            timings.append(time.perf_counter() - start)
+        print(f"{'on' if enabled else 'off':>9} {span_ns:>8.0f} {count_ns:>9.0f} {statistics.median(timings) * 1e3:>10.2f}")
+    metrics.configure(enabled=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+k-nearest facilities per disaster: grid ring search on a registered facility
+set vs computing every facility's distance and sorting.
+
+Registers clustered synthetic facility sets in a temporary registry, then
+times nearest_facilities() for feed events and for events placed next to
+facilities, checking the results against the brute-force ranking.
+
+    python benchmarks/bench_nearest.py [--facilities 10000 100000 500000] [--k 10] [--events 150]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from facility_ingest import read_facilities  # noqa: E402
+from facility_registry import FacilityRegistry  # noqa: E402
+from geo_engine import disaster_profile, ellipsoidal_km  # noqa: E402
+from nearest_facilities import nearest_facilities  # noqa: E402
+from synthetic import cap_feed, facilities_csv  # noqa: E402
+
+
+def brute_force(facilities, disasters, k):
+    """Baseline: every facility's distance to each event, sorted"""
+    lat, lon = np.asarray(facilities.latitude), np.asarray(facilities.longitude)
+    _, dis_lat, dis_lon, _ = disaster_profile(disasters)
+    nearest = []
+    for j in range(len(dis_lat)):
+        distances = ellipsoidal_km(lat, lon, dis_lat[j], dis_lon[j])
+        order = np.lexsort((np.arange(len(distances)), distances))[:k]
+        nearest.append(np.round(distances[order], 2).tolist())
+    return nearest
+
+
+def median_ms(fn, repeats):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--facilities', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--events', type=int, default=150)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    from gdacs import iter_gdacs_cap_data
+    feed_events = list(iter_gdacs_cap_data(io.BytesIO(cap_feed(args.events, 10).encode())))
+    registry = FacilityRegistry(tempfile.mkdtemp(prefix='bench_nearest.'))
+    print(f"k={args.k}, ellipsoidal distances, ms per event (median of {args.repeats})")
+    print(f"{'facilities':>10} {'events':<16} {'brute force':>12} {'grid k-NN':>10} {'speed-up':>9}")
+
+    for rows in args.facilities:
+        facilities = registry.open(registry.register(read_facilities(facilities_csv(rows, clusters=200))))
+        rng = np.random.default_rng(rows)
+        picks = rng.integers(0, rows, args.events)
+        near_events = [{'latitude': float(facilities.latitude[i]) + 0.2, 'longitude': float(facilities.longitude[i]),
+                        'title': f'near {i}'} for i in picks]
+
+        for label, events in (('feed', feed_events), ('near facilities', near_events)):
+            found = nearest_facilities(facilities, events, k=args.k)
+            sample = events[:10]
+            expected = brute_force(facilities, sample, args.k)
+            assert [[f['distance'] for f in entry['facilities']] for entry in found[:10]] == expected, (rows, label)
+
+            brute_ms = median_ms(lambda: brute_force(facilities, sample, args.k), 1) / len(sample)
+            grid_ms = median_ms(lambda: nearest_facilities(facilities, events, k=args.k), args.repeats) / len(events)
+            print(f"{rows:>10} {label:<16} {brute_ms:>12.3f} {grid_ms:>10.3f} {brute_ms / grid_ms:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Scaling of sharded multi-process impact assessment.
+
+Runs assess_impact over a large synthetic facility set and a historical-size
+disaster archive with 1, 2, 4, ... workers (up to the machine's cores) and
+reports speedup and parallel efficiency against the single-process run.
+
+    python benchmarks/bench_parallel_impact.py [--facilities 1000000] [--disasters 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facility_ingest import FacilityColumns  # noqa: E402
+from impact_assessment import assess_impact  # noqa: E402
+
+EVENT_TYPES = ['EQ', 'TC', 'FL', 'VO', 'DR']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--facilities', type=int, default=1_000_000)
+    parser.add_argument('--disasters', type=int, default=2_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    facilities = FacilityColumns(np.arange(args.facilities).astype(str),
+                                 rng.uniform(-60, 60, args.facilities),
+                                 rng.uniform(-180, 180, args.facilities))
+    disasters = [{
+        'title': f'Earthquake (M={rng.uniform(4, 8):.1f}, depth 10km)',
+        'eventType': EVENT_TYPES[i % len(EVENT_TYPES)],
+        'latitude': float(rng.uniform(-60, 60)),
+        'longitude': float(rng.uniform(-180, 180)),
+    } for i in range(args.disasters)]
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= args.max_workers:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != args.max_workers:
+        worker_counts.append(args.max_workers)
+
+    print(f"{args.facilities} facilities x {args.disasters} disasters, {os.cpu_count()} cores")
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8} {'efficiency':>10}")
+    baseline = reference = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        result = assess_impact(facilities, disasters, workers=workers)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline, reference = elapsed, result
+        elif result != reference:
+            raise AssertionError(f"{workers} workers produced a different result")
+        speedup = baseline / elapsed
+        print(f"{workers:>7} {elapsed:>8.2f} {speedup:>7.2f}x {speedup / workers:>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
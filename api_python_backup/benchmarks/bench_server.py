@@ -0,0 +1,173 @@
+"""
+Load test of the unified server: concurrent keep-alive clients issuing a mix
+of feed, impact-assessment and recommendation requests, reporting throughput
+and latency percentiles. The GDACS feed and the LLM are local stubs.
+
+    python benchmarks/bench_server.py [--clients 16] [--duration 10] [--workers 16] [--compare]
+
+--compare also runs the same load against a single-threaded HTTP/1.0 server,
+i.e. one standalone handler process as deployed before.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import start_stub_server  # noqa: E402
+from synthetic import cap_feed, facilities_csv, rss_feed  # noqa: E402
+
+
+def start_feed_server(feed, rss=None):
+    """Serves `feed` on every path, or `rss` on paths ending in rss.xml when given"""
+    payloads = {'cap': feed.encode(), 'rss': rss.encode() if rss is not None else None}
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            payload = payloads['rss'] if self.path.endswith('rss.xml') and payloads['rss'] else payloads['cap']
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float('nan')
+
+
+def run_load(port, requests_mix, clients, duration, keepalive=True):
+    """Latencies per route from `clients` threads issuing requests for `duration` seconds"""
+    latencies = {name: [] for name, *_ in requests_mix}
+    errors = []
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = None
+        while time.perf_counter() < deadline:
+            name, method, path, body, _ = rng.choices(requests_mix, weights=[r[4] for r in requests_mix])[0]
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            start = time.perf_counter()
+            try:
+                headers = {'Content-Type': 'application/json'} if body else {}
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - start
+                if response.status != 200:
+                    raise RuntimeError(f"{name}: HTTP {response.status}")
+                if not keepalive or response.will_close:
+                    conn.close()
+                    conn = None
+            except Exception as e:
+                if conn is not None:
+                    conn.close()
+                conn = None
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies[name].append(elapsed)
+        if conn is not None:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def report(label, latencies, errors, duration):
+    total = sum(len(v) for v in latencies.values())
+    everything = [x for v in latencies.values() for x in v]
+    print(f"\n{label}: {total / duration:.1f} req/s, p50 {percentile(everything, 50) * 1e3:.1f} ms, "
+          f"p99 {percentile(everything, 99) * 1e3:.1f} ms, {len(errors)} errors")
+    print(f"{'route':>16} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in latencies.items():
+        print(f"{name:>16} {len(values):>9} {percentile(values, 50) * 1e3:>8.1f} {percentile(values, 99) * 1e3:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--facilities', type=int, default=2000)
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    feed_server = start_feed_server(cap_feed(150, 40), rss_feed(150))
+    stub = start_stub_server(latency=args.llm_latency, token_delay=0.0)
+    os.environ['GDACS_CAP_URL'] = f'http://127.0.0.1:{feed_server.server_port}/gdacs_cap.xml'
+    os.environ['GDACS_RSS_URL'] = f'http://127.0.0.1:{feed_server.server_port}/rss.xml'
+    os.environ['OPENAI_API_BASE'] = stub.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+
+    import openai
+    import gdacs
+    import server
+    openai.api_base = stub.base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+    server.RouterHandler.log_message = lambda *a: None
+
+    disasters = gdacs.FEED_CACHE.get()[0]
+    impact_body = json.dumps({'facilities': facilities_csv(args.facilities), 'disasters': disasters})
+    recommendation_body = json.dumps({
+        'facility': {'name': 'Facility 1', 'latitude': 10.0, 'longitude': 20.0},
+        'impacts': [{'disaster': disasters[0], 'distance': 42.0}],
+    })
+    requests_mix = [
+        ('gdacs', 'GET', '/api/gdacs', None, 5),
+        ('impact', 'POST', '/api/impact_assessment', impact_body, 3),
+        ('recommendations', 'POST', '/api/recommendations', recommendation_body, 2),
+    ]
+    print(f"{args.clients} clients for {args.duration:.0f}s; impact requests carry {args.facilities} facilities "
+          f"({len(impact_body) / 1e6:.1f} MB), LLM stub latency {args.llm_latency}s")
+
+    pooled = server.make_server(port=0, workers=args.workers, warm=False)
+    threading.Thread(target=pooled.serve_forever, daemon=True).start()
+    latencies, errors = run_load(pooled.server_port, requests_mix, args.clients, args.duration)
+    report(f"unified server, {args.workers} workers, keep-alive", latencies, errors, args.duration)
+    pooled.shutdown()
+    pooled.server_close()
+
+    if args.compare:
+        class SingleHandler(server.RouterHandler):
+            protocol_version = 'HTTP/1.0'
+
+        single = HTTPServer(('127.0.0.1', 0), SingleHandler)
+        threading.Thread(target=single.serve_forever, daemon=True).start()
+        latencies, errors = run_load(single.server_port, requests_mix, args.clients, args.duration, keepalive=False)
+        report("single-threaded HTTP/1.0 (standalone handler)", latencies, errors, args.duration)
+        single.shutdown()
+        single.server_close()
+
+    stub.shutdown()
+    feed_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Prompt size and SitRep latency as impacted facilities grow: the unbounded
+line-per-impact overview vs the token-budgeted one (and map-reduce), against
+the stub LLM server. The stub does not model prompt processing time, so real
+latency differences are larger than the totals shown.
+
+    python benchmarks/bench_sitrep_overview.py [--facilities 1000 10000 100000] [--budget 3000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import start_stub_server  # noqa: E402
+from synthetic import impacted_facilities  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--facilities', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--budget', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, token_delay=0.0)
+    os.environ['OPENAI_API_BASE'] = stub.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+
+    import openai
+    import sitrep
+    openai.api_base = stub.base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+
+    print(f"{args.events} events, 2 impacts per facility, budget {args.budget} tokens")
+    print(f"{'facilities':>10} {'mode':>10} {'prompt tokens':>14} {'build s':>8} {'sitrep s':>9}")
+    for n in args.facilities:
+        impacted, disasters = impacted_facilities(n, args.events)
+        for mode in ('unbounded', 'budgeted', 'mapreduce'):
+            options = {'token_budget': sys.maxsize if mode == 'unbounded' else args.budget,
+                       'map_reduce': mode == 'mapreduce'}
+            build = float('nan')
+            if mode != 'mapreduce':
+                # Map-reduce builds its overview with model calls; only its total is comparable
+                start = time.perf_counter()
+                sitrep.sitrep_completion_request(impacted, disasters, **options)
+                build = time.perf_counter() - start
+
+            before = stub.prompt_chars
+            start = time.perf_counter()
+            sitrep.generate_sitrep(impacted, disasters, **options)
+            total = time.perf_counter() - start
+            prompt_tokens = (stub.prompt_chars - before) // 4
+            print(f"{n:>10} {mode:>10} {prompt_tokens:>14} {build:>8.3f} {total:>9.2f}")
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Time to first byte and total time of buffered vs streamed (SSE) SitReps,
+served by the sitrep handler against the stub LLM server.
+
+    python benchmarks/bench_sitrep_stream.py [--latency 0.5] [--token-delay 0.02] [--runs 5]
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import start_stub_server  # noqa: E402
+
+SITREP_ANSWER = ' '.join(['word'] * 600)
+
+
+def timed_request(port, body, stream):
+    """(seconds to first body byte, total seconds, body bytes)"""
+    headers = {'Content-Type': 'application/json'}
+    if stream:
+        headers['Accept'] = 'text/event-stream'
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    conn.request('POST', '/', body=body, headers=headers)
+    response = conn.getresponse()
+    first = response.read1(1)
+    ttfb = time.perf_counter() - start
+    rest = response.read()
+    total = time.perf_counter() - start
+    conn.close()
+    return ttfb, total, len(first) + len(rest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency=args.latency, token_delay=args.token_delay, answer=SITREP_ANSWER)
+    os.environ['OPENAI_API_BASE'] = stub.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    # Every run must reach the model
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+
+    import openai
+    from sitrep import handler
+    openai.api_base = stub.base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+
+    handler.log_message = lambda *a: None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    disasters = [{'guid': f'EQ{i}', 'eventType': 'EQ', 'title': f'Earthquake {i}', 'alertLevel': 'Orange'}
+                 for i in range(20)]
+    body = json.dumps({'disasters': disasters, 'impactedFacilities': []})
+
+    print(f"{len(SITREP_ANSWER.split())} tokens, {args.latency}s stub latency, {args.token_delay}s/token")
+    print(f"{'mode':>9} {'ttfb s (median)':>16} {'total s (median)':>17} {'bytes':>7}")
+    for stream in (False, True):
+        runs = [timed_request(server.server_port, body, stream) for _ in range(args.runs)]
+        ttfb = statistics.median(r[0] for r in runs)
+        total = statistics.median(r[1] for r in runs)
+        print(f"{'streamed' if stream else 'buffered':>9} {ttfb:>16.3f} {total:>17.3f} {runs[-1][2]:>7}")
+
+    server.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Brute-force vs grid-indexed impact assessment.
+
+Times both paths of assess_impact over a range of facility counts for a fixed
+GDACS-sized disaster list and reports where the grid starts to win.
+
+    python benchmarks/bench_spatial_index.py [--disasters 150] [--seed 7]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_engine import disaster_profile, impact_pairs  # noqa: E402
+from spatial_index import FacilityGrid, indexed_impact_pairs  # noqa: E402
+
+EVENT_TYPES = ['EQ', 'TC', 'FL', 'VO', 'DR']
+
+
+def synthetic_disasters(count, rng):
+    return [{
+        'title': f'Green earthquake alert (M={rng.uniform(4, 8):.1f}, depth 10km)',
+        'eventType': EVENT_TYPES[i % len(EVENT_TYPES)],
+        'latitude': float(rng.uniform(-60, 60)),
+        'longitude': float(rng.uniform(-180, 180)),
+    } for i in range(count)]
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--disasters', type=int, default=150)
+    parser.add_argument('--method', default='ellipsoidal')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    _, dis_lat, dis_lon, radii = disaster_profile(synthetic_disasters(args.disasters, rng))
+
+    print(f"{'facilities':>10} {'pairs':>12} {'brute (ms)':>11} {'grid (ms)':>10} {'speedup':>8}")
+    crossover = None
+    for n in [10, 100, 300, 1_000, 3_000, 10_000, 40_000, 100_000]:
+        fac_lat = rng.uniform(-60, 60, n)
+        fac_lon = rng.uniform(-180, 180, n)
+
+        brute = best_of(lambda: impact_pairs(fac_lat, fac_lon, dis_lat, dis_lon, radii, method=args.method))
+        # Grid build is part of the cost for a one-off request
+        grid = best_of(lambda: indexed_impact_pairs(FacilityGrid(fac_lat, fac_lon), dis_lat, dis_lon,
+                                                    radii, method=args.method))
+        if crossover is None and grid < brute:
+            crossover = n * args.disasters
+        print(f"{n:>10} {n * args.disasters:>12} {brute * 1e3:>11.2f} {grid * 1e3:>10.2f} {brute / grid:>7.1f}x")
+
+    print(f"\ncrossover: grid wins from ~{crossover} pairs" if crossover else "\ncrossover: not reached")
+
+
+if __name__ == '__main__':
+    main()
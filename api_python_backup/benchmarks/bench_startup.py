@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark: for each handler, a fresh interpreter imports the
+handler module and serves one request, reporting import time, first-request
+latency and which heavy dependencies each step loaded. The GDACS feed and
+the LLM are local stubs, so the numbers are this process's own start-up cost.
+
+    python benchmarks/bench_startup.py [--runs 5] [--facilities 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+HEAVY_MODULES = ('numpy', 'pandas', 'pyarrow', 'requests', 'openai', 'dotenv')
+
+# (module, method, path) of the request each handler serves; its body is
+# written to <module>.json by the parent
+HANDLERS = [
+    ('gdacs', 'GET', '/api/gdacs'),
+    ('impact_assessment', 'POST', '/api/impact_assessment'),
+    ('nearest_facilities', 'POST', '/api/nearest_facilities'),
+    ('recommendations', 'POST', '/api/recommendations'),
+    ('sitrep', 'POST', '/api/sitrep'),
+]
+
+
+def child(module_name, method, path, body_path):
+    """Runs in the fresh interpreter: import, serve one request, print JSON timings"""
+    start = time.perf_counter()
+    module = __import__(module_name)
+    imported = time.perf_counter() - start
+    loaded_by_import = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    import http.client
+    import threading
+    from http.server import HTTPServer
+
+    module.handler.log_message = lambda *args: None
+    server = HTTPServer(('127.0.0.1', 0), module.handler)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    body = open(body_path, 'rb').read() if body_path else None
+
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=120)
+    conn.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+    response = conn.getresponse()
+    response.read()
+    first_request = time.perf_counter() - start
+
+    print(json.dumps({
+        'import': imported,
+        'firstRequest': first_request,
+        'status': response.status,
+        'loadedByImport': loaded_by_import,
+        'loadedByRequest': [m for m in HEAVY_MODULES if m in sys.modules and m not in loaded_by_import],
+    }))
+
+
+def run_child(module_name, method, path, body_path, env):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', module_name, method, path, body_path or ''],
+        cwd=API_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--facilities', type=int, default=1000)
+    parser.add_argument('--child', nargs=4, metavar=('MODULE', 'METHOD', 'PATH', 'BODY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    from bench_server import start_feed_server
+    from stub_llm import start_stub_server
+    from synthetic import cap_feed, facilities_csv, rss_feed
+
+    feed = cap_feed(150, 40)
+    feed_server = start_feed_server(feed, rss_feed(150))
+    stub = start_stub_server(latency=0.0, token_delay=0.0)
+    env = dict(os.environ)
+    env.update({
+        'GDACS_CAP_URL': f'http://127.0.0.1:{feed_server.server_port}/gdacs_cap.xml',
+        'GDACS_RSS_URL': f'http://127.0.0.1:{feed_server.server_port}/rss.xml',
+        'OPENAI_API_BASE': stub.base_url,
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'stub'),
+        'LLM_CACHE_ENABLED': '0',
+    })
+
+    import io
+    from gdacs import iter_gdacs_cap_data
+    disasters = list(iter_gdacs_cap_data(io.BytesIO(feed.encode())))[:20]
+    impacts = [{'disaster': disasters[0], 'distance': 42.0}]
+    facility = {'name': 'Facility 1', 'latitude': 10.0, 'longitude': 20.0}
+    bodies = {
+        'impact_assessment': {'facilities': facilities_csv(args.facilities), 'disasters': disasters},
+        'nearest_facilities': {'facilities': facilities_csv(args.facilities), 'disasters': disasters},
+        'recommendations': {'facility': facility, 'impacts': impacts},
+        'sitrep': {'impactedFacilities': [{'facility': facility, 'impacts': impacts}], 'disasters': disasters},
+    }
+
+    baseline = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        baseline.append(time.perf_counter() - start)
+    print(f"median of {args.runs} fresh interpreters; bare interpreter start {statistics.median(baseline) * 1e3:.0f} ms\n")
+    print(f"{'handler':>18} {'import ms':>10} {'1st req ms':>11} {'process ms':>11}  heavy modules (import / first request)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for module_name, method, path in HANDLERS:
+            body_path = None
+            if module_name in bodies:
+                body_path = os.path.join(tmp, f'{module_name}.json')
+                with open(body_path, 'w') as f:
+                    json.dump(bodies[module_name], f)
+
+            runs = [run_child(module_name, method, path, body_path, env) for _ in range(args.runs)]
+            statuses = {r['status'] for r in runs}
+            if statuses != {200}:
+                print(f"{module_name}: unexpected HTTP status {statuses}")
+            median = {key: statistics.median(r[key] for r in runs) * 1e3 for key in ('import', 'firstRequest', 'process')}
+            print(f"{module_name:>18} {median['import']:>10.0f} {median['firstRequest']:>11.0f} {median['process']:>11.0f}  "
+                  f"{', '.join(runs[-1]['loadedByImport']) or '-'} / {', '.join(runs[-1]['loadedByRequest']) or '-'}")
+
+    stub.shutdown()
+    feed_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare two benchmark suite result files (see benchmarks/suite.py), case by
+case: median latency, p99 latency and peak memory, with changes beyond the
+threshold flagged.
+
+    python benchmarks/compare.py base.json new.json [--threshold 0.10] [--min-ms 1] [--fail]
+
+With --fail the exit status is 1 when any case regressed, for use in CI.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r['stage'], r['name']): r for r in report['results']}
+
+
+def describe(report):
+    commit = (report.get('commit') or 'unknown')[:12]
+    dirty = ' (dirty)' if report.get('dirty') else ''
+    return f"{commit}{dirty} {report.get('timestamp', '')} {report.get('profile', '')} profile, python {report.get('python', '?')}"
+
+
+def change(base, new):
+    return (new - base) / base if base else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative change reported as a regression or improvement (default 10%%)")
+    parser.add_argument('--min-ms', type=float, default=1.0,
+                        help="latency differences below this many ms are treated as noise")
+    parser.add_argument('--fail', action='store_true', help="exit with status 1 if any case regressed")
+    args = parser.parse_args()
+
+    base_report, base = load(args.base)
+    new_report, new = load(args.new)
+    print(f"base: {describe(base_report)}")
+    print(f"new:  {describe(new_report)}")
+    if (base_report.get('platform'), base_report.get('cpuCount')) != (new_report.get('platform'), new_report.get('cpuCount')):
+        print("warning: results come from different machines")
+    print()
+    print(f"{'stage':>15} {'case':<34} {'p50 ms':>19} {'change':>8} {'p99 ms':>19} {'peak MB':>15} {'change':>8}")
+
+    regressions = []
+    for key, new_result in new.items():
+        base_result = base.get(key)
+        if base_result is None:
+            continue
+        b50, n50 = base_result['latencyMs']['p50'], new_result['latencyMs']['p50']
+        b99, n99 = base_result['latencyMs']['p99'], new_result['latencyMs']['p99']
+        bmem, nmem = base_result['peakMemoryBytes'] / 2**20, new_result['peakMemoryBytes'] / 2**20
+        latency_change, memory_change = change(b50, n50), change(bmem, nmem)
+
+        flags = []
+        if abs(n50 - b50) >= args.min_ms and abs(latency_change) > args.threshold:
+            flags.append('slower' if latency_change > 0 else 'faster')
+        if abs(nmem - bmem) >= 1 and abs(memory_change) > args.threshold:
+            flags.append('more memory' if memory_change > 0 else 'less memory')
+        if 'slower' in flags or 'more memory' in flags:
+            regressions.append(key)
+
+        print(f"{key[0]:>15} {key[1]:<34} {b50:>9.2f} -> {n50:>7.2f} {latency_change:>+8.0%} "
+              f"{b99:>9.2f} -> {n99:>7.2f} {bmem:>6.1f} -> {nmem:>6.1f} {memory_change:>+8.0%}  {', '.join(flags)}")
+
+    missing = sorted(set(base) - set(new))
+    added = sorted(set(new) - set(base))
+    if missing:
+        print(f"\nonly in base: {', '.join(' / '.join(key) for key in missing)}")
+    if added:
+        print(f"only in new: {', '.join(' / '.join(key) for key in added)}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
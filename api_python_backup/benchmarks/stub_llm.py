@@ -0,0 +1,127 @@
+"""
+OpenAI-compatible stub completion server for benchmarks and local testing.
+
+Serves POST /v1/chat/completions with a canned answer after a configurable
+delay, either as one JSON response or as a Server-Sent Events token stream
+(`"stream": true`); both take `token_delay` per token to generate. Point the handlers at it with
+OPENAI_API_BASE=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/stub_llm.py [--port 8099] [--latency 0.5] [--token-delay 0.02]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = json.dumps({
+    "Immediate Safety Measures": ["Inspect structures for damage", "Account for all staff"],
+    "Resource Mobilization": ["Pre-position medical supplies"],
+    "Evacuation Considerations": ["Identify safe assembly points"],
+    "Communication Protocols": ["Establish satellite phone check-ins"],
+    "Medium-term Mitigation Strategies": ["Reinforce critical infrastructure"],
+})
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.prompt_chars += sum(len(m.get('content', '')) for m in body.get('messages', []))
+            fail = server.fail_every and server.requests % server.fail_every == 0
+
+        time.sleep(server.latency)
+        if fail:
+            payload = json.dumps({'error': {'message': 'stub overloaded', 'type': 'server_error'}}).encode()
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if body.get('stream'):
+            self.stream(body)
+            return
+
+        # A buffered answer takes as long as generating every token
+        time.sleep(server.token_delay * len(server.answer.split(' ')))
+        payload = json.dumps({
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': server.answer}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        tokens = self.server.answer.split(' ')
+        try:
+            for i, token in enumerate(tokens):
+                chunk = {
+                    'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'model': body.get('model'),
+                    'choices': [{'index': 0, 'delta': {'content': token + (' ' if i < len(tokens) - 1 else '')},
+                                 'finish_reason': None}],
+                }
+                self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                time.sleep(self.server.token_delay)
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. its own client disconnected)
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, latency=0.5, token_delay=0.02, answer=DEFAULT_ANSWER, fail_every=0):
+    """Start the stub on a background thread; returns the server (see .base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.token_delay = token_delay
+    server.answer = answer
+    server.fail_every = fail_every
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.prompt_chars = 0
+    server.base_url = f'http://127.0.0.1:{server.server_port}/v1'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first byte')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    parser.add_argument('--fail-every', type=int, default=0, help='answer every Nth request with a 503')
+    args = parser.parse_args()
+    server = start_stub_server(args.port, args.latency, args.token_delay, fail_every=args.fail_every)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Reproducible benchmark suite: CAP feed parsing, facility ingestion, impact
+assessment, nearest-facility queries, situation overviews and the HTTP
+handlers, on seeded synthetic inputs with the GDACS feed and the LLM served
+by local stubs.
+
+Every case reports latency percentiles, throughput and peak traced memory,
+and the run is written as JSON stamped with the git commit, so two runs can
+be compared with benchmarks/compare.py.
+
+    python benchmarks/suite.py [--profile quick|full] [--stages cap_parse impact ...]
+                               [--repeats 5] [--seed 0] [--output results.json]
+
+The quick profile uses 1k-100k facilities, the full one 1k-1M.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_llm import start_stub_server  # noqa: E402
+from synthetic import cap_feed, facilities_csv, impacted_facilities, rss_feed  # noqa: E402
+
+STAGES = ('cap_parse', 'facility_ingest', 'impact', 'nearest', 'overview', 'handlers')
+
+PROFILES = {
+    'quick': {'facilities': (1_000, 10_000, 100_000), 'feed_items': (150, 1_500), 'impacted': (1_000, 10_000)},
+    'full': {'facilities': (1_000, 10_000, 100_000, 1_000_000), 'feed_items': (150, 1_500, 15_000),
+             'impacted': (1_000, 10_000, 100_000)},
+}
+
+# Events in the feed assessed against each facility set, and the facility
+# clusters (cities) those sets are drawn around
+FEED_EVENTS = 150
+FACILITY_CLUSTERS = 200
+
+# Requests per handler case, sent one after another over one connection
+HANDLER_REQUESTS = 30
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def measure(run, repeats, units):
+    """Time `run` `repeats` times after a warm-up, then once more under tracemalloc"""
+    run()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = percentile(timings, 50)
+    return {
+        'repeats': repeats,
+        'latencyMs': {
+            'min': min(timings) * 1e3,
+            'p50': median * 1e3,
+            'p90': percentile(timings, 90) * 1e3,
+            'p99': percentile(timings, 99) * 1e3,
+            'mean': sum(timings) / len(timings) * 1e3,
+        },
+        'throughput': units / median if median > 0 else None,
+        'peakMemoryBytes': peak,
+    }
+
+
+class Suite:
+    def __init__(self, profile, repeats, seed):
+        self.profile = PROFILES[profile]
+        self.repeats = repeats
+        self.seed = seed
+        self.results = []
+        self._facility_csvs = {}
+
+    def case(self, stage, name, params, units, unit, run, repeats=None):
+        result = {'stage': stage, 'name': name, 'params': params, 'units': units, 'unit': unit}
+        result.update(measure(run, repeats or self.repeats, units))
+        self.results.append(result)
+        latency = result['latencyMs']
+        print(f"{stage:>15} {name:<34} p50 {latency['p50']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms  "
+              f"{result['throughput']:>12,.0f} {unit}/s  peak {result['peakMemoryBytes'] / 2**20:>8.1f} MB",
+              flush=True)
+
+    def facility_csv(self, rows):
+        if rows not in self._facility_csvs:
+            self._facility_csvs[rows] = facilities_csv(rows, seed=self.seed, clusters=FACILITY_CLUSTERS)
+        return self._facility_csvs[rows]
+
+    def feed_disasters(self, items=FEED_EVENTS, vertices=40):
+        from gdacs import iter_gdacs_cap_data
+        return list(iter_gdacs_cap_data(io.BytesIO(cap_feed(items, vertices, seed=self.seed).encode())))
+
+    def cap_parse(self):
+        from gdacs import iter_gdacs_cap_data
+        shapes = [(items, 40) for items in self.profile['feed_items']] + [(FEED_EVENTS, 2_000)]
+        for items, vertices in shapes:
+            payload = cap_feed(items, vertices, seed=self.seed).encode()
+            self.case('cap_parse', f'{items} items x {vertices} vertices',
+                      {'items': items, 'vertices': vertices, 'bytes': len(payload)}, items, 'items',
+                      lambda: list(iter_gdacs_cap_data(io.BytesIO(payload))))
+
+    def facility_ingest(self):
+        from facility_ingest import read_facilities
+        for rows in self.profile['facilities']:
+            csv_text = self.facility_csv(rows)
+            self.case('facility_ingest', f'csv {rows} rows', {'rows': rows, 'bytes': len(csv_text)}, rows, 'rows',
+                      lambda: read_facilities(csv_text), repeats=max(1, self.repeats if rows < 1_000_000 else 2))
+
+    def impact(self):
+        from facility_ingest import read_facilities
+        from impact_assessment import assess_impact
+        disasters = self.feed_disasters()
+        for rows in self.profile['facilities']:
+            facilities = read_facilities(self.facility_csv(rows))
+            for mode in ('radius', 'polygon'):
+                # One process, so results do not depend on the machine's core count
+                self.case('impact', f'assess_impact {mode} {rows}',
+                          {'facilities': rows, 'disasters': len(disasters), 'mode': mode, 'workers': 1},
+                          rows, 'facilities',
+                          lambda: assess_impact(facilities, disasters, mode=mode, workers=1))
+
+    def nearest(self):
+        from facility_registry import FacilityRegistry
+        from facility_ingest import read_facilities
+        from nearest_facilities import nearest_facilities
+        disasters = self.feed_disasters()
+        registry = FacilityRegistry(tempfile.mkdtemp(prefix='suite_registry.'))
+        for rows in self.profile['facilities']:
+            # Registered, so the grid is prebuilt as in production
+            facilities = registry.open(registry.register(read_facilities(self.facility_csv(rows))))
+            self.case('nearest', f'nearest_facilities k=10 {rows}',
+                      {'facilities': rows, 'disasters': len(disasters), 'k': 10}, len(disasters), 'events',
+                      lambda: nearest_facilities(facilities, disasters, k=10))
+
+    def overview(self):
+        from sitrep import create_situation_overview
+        from situation_overview import budgeted_overview
+        for count in self.profile['impacted']:
+            impacted, disasters = impacted_facilities(count, events=50, seed=self.seed)
+            params = {'impactedFacilities': count, 'disasters': len(disasters), 'impactsPerFacility': 2}
+            self.case('overview', f'create_situation_overview {count}', params, count, 'facilities',
+                      lambda: create_situation_overview(impacted, disasters))
+            self.case('overview', f'budgeted_overview {count}', dict(params, tokenBudget=3000), count, 'facilities',
+                      lambda: budgeted_overview(impacted, disasters, 3000))
+
+    def handlers(self, port):
+        import http.client
+        from facility_ingest import read_facilities
+        from impact_assessment import assess_impact
+        disasters = self.feed_disasters()
+        rows = 10_000
+        impact_body = json.dumps({'facilities': self.facility_csv(rows), 'disasters': disasters}).encode()
+        impacted = assess_impact(read_facilities(self.facility_csv(rows)), disasters, workers=1)
+        recommendation_body = json.dumps({'facility': impacted[0]['facility'],
+                                          'impacts': impacted[0]['impacts']}).encode()
+        sitrep_body = json.dumps({'impactedFacilities': impacted, 'disasters': disasters}).encode()
+
+        cases = [
+            ('GET /api/gdacs', 'GET', '/api/gdacs', None, {'feedItems': FEED_EVENTS}),
+            (f'POST /api/impact_assessment {rows}', 'POST', '/api/impact_assessment', impact_body,
+             {'facilities': rows, 'disasters': len(disasters), 'bytes': len(impact_body)}),
+            ('POST /api/recommendations', 'POST', '/api/recommendations', recommendation_body, {}),
+            ('POST /api/sitrep', 'POST', '/api/sitrep', sitrep_body,
+             {'impactedFacilities': len(impacted), 'bytes': len(sitrep_body)}),
+        ]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        for name, method, path, body, params in cases:
+            def run(method=method, path=path, body=body):
+                conn.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"{method} {path}: HTTP {response.status}")
+            self.case('handlers', name, params, 1, 'requests', run, repeats=HANDLER_REQUESTS)
+        conn.close()
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=API_DIR, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', 'HEAD')
+    return {'commit': commit or None, 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')) if commit else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm-latency', type=float, default=0.0)
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    # The handlers read their upstream URLs at import, so the stubs come first
+    from bench_server import start_feed_server
+    feed_server = start_feed_server(cap_feed(FEED_EVENTS, 40, seed=args.seed), rss_feed(FEED_EVENTS, seed=args.seed))
+    stub = start_stub_server(latency=args.llm_latency, token_delay=0.0)
+    os.environ.update({
+        'GDACS_CAP_URL': f'http://127.0.0.1:{feed_server.server_port}/gdacs_cap.xml',
+        'GDACS_RSS_URL': f'http://127.0.0.1:{feed_server.server_port}/rss.xml',
+        'OPENAI_API_BASE': stub.base_url,
+        'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'stub'),
+        'LLM_CACHE_ENABLED': '0',
+        'IMPACT_WORKERS': '1',
+    })
+    import openai
+    openai.api_base = stub.base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+
+    suite = Suite(args.profile, args.repeats, args.seed)
+    started = time.time()
+    for stage in STAGES:
+        if stage not in args.stages:
+            continue
+        if stage == 'handlers':
+            import server
+            server.RouterHandler.log_message = lambda *a: None
+            httpd = server.make_server(port=0, workers=4, warm=False)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            suite.handlers(httpd.server_port)
+            httpd.shutdown()
+            httpd.server_close()
+        else:
+            getattr(suite, stage)()
+
+    report = dict(git_commit(), **{
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(started)),
+        'durationSeconds': round(time.time() - started, 1),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'profile': args.profile,
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'llmLatency': args.llm_latency,
+        # Peak resident memory of the whole run (ru_maxrss is in KiB on Linux)
+        'maxRssBytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'results': suite.results,
+    })
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{(report['commit'] or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{len(suite.results)} cases in {report['durationSeconds']} s, results written to {output}")
+
+    stub.shutdown()
+    feed_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Seeded synthetic inputs shared by the benchmarks."""
+import math
+import random
+import time
+from xml.sax.saxutils import escape
+
+EVENT_TYPES = ['EQ', 'TC', 'FL', 'VO', 'DR']
+ALERT_LEVELS = ['Green', 'Orange', 'Red']
+
+CAP_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:geo="http://www.w3.org/2003/01/geo/wgs84_pos#" xmlns:gdacs="http://www.gdacs.org" xmlns:cap="urn:oasis:names:tc:emergency:cap:1.2">
+<channel>
+<title>GDACS CAP feed (synthetic)</title>
+<link>https://www.gdacs.org</link>
+'''
+CAP_FOOTER = '</channel>\n</rss>\n'
+
+
+def cap_item(i, rng, vertices=40):
+    event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+    alert = rng.choice(ALERT_LEVELS)
+    lat = rng.uniform(-60, 60)
+    lon = rng.uniform(-180, 180)
+    magnitude = rng.uniform(4, 8)
+    title = f'{alert} {event_type} alert (M={magnitude:.1f}, depth 10km) in synthetic region {i}'
+    ring = []
+    for k in range(vertices):
+        # Jittered circle around the event point
+        angle = 6.283185307179586 * k / max(vertices, 1)
+        radius = rng.uniform(0.5, 2.0)
+        ring.append(f'{lat + radius * math.sin(angle):.4f},'
+                    f'{lon + radius * math.cos(angle):.4f}')
+    if ring:
+        ring.append(ring[0])
+    guid = f'{event_type}{1000000 + i}'
+    return f'''<item>
+<title>{escape(title)}</title>
+<description>{escape('Synthetic event description ' * 4)}</description>
+<link>https://www.gdacs.org/report.aspx?eventtype={event_type}&amp;eventid={1000000 + i}</link>
+<pubDate>Mon, 01 Jan 2024 {i % 24:02d}:00:00 GMT</pubDate>
+<guid isPermaLink="false">{guid}</guid>
+<geo:Point><geo:lat>{lat:.4f}</geo:lat><geo:long>{lon:.4f}</geo:long></geo:Point>
+<cap:alert>
+<cap:identifier>{guid}</cap:identifier>
+<cap:info>
+<cap:category>Geo</cap:category>
+<cap:event>{event_type}</cap:event>
+<cap:urgency>Past</cap:urgency>
+<cap:severity>{'Extreme' if alert == 'Red' else 'Moderate'}</cap:severity>
+<cap:certainty>Observed</cap:certainty>
+<cap:headline>{escape(title)}</cap:headline>
+<cap:web>https://www.gdacs.org/report.aspx?eventid={1000000 + i}</cap:web>
+<cap:parameter><cap:valueName>alertlevel</cap:valueName><cap:value>{alert}</cap:value></cap:parameter>
+<cap:parameter><cap:valueName>severity</cap:valueName><cap:value>Magnitude {magnitude:.1f}M</cap:value></cap:parameter>
+<cap:parameter><cap:valueName>eventid</cap:valueName><cap:value>{1000000 + i}</cap:value></cap:parameter>
+<cap:parameter><cap:valueName>currentepisodeid</cap:valueName><cap:value>{1 + i % 3}</cap:value></cap:parameter>
+<cap:area>
+<cap:areaDesc>Synthetic area {i}</cap:areaDesc>
+<cap:polygon>{' '.join(ring)}</cap:polygon>
+</cap:area>
+</cap:info>
+</cap:alert>
+</item>
+'''
+
+
+def cap_feed(items=150, vertices=40, seed=0):
+    """A GDACS-like CAP feed as a UTF-8 XML string"""
+    rng = random.Random(seed)
+    return CAP_HEADER + ''.join(cap_item(i, rng, vertices) for i in range(items)) + CAP_FOOTER
+
+
+def rss_feed(items=150, extra=5, seed=0):
+    """
+    A GDACS-like RSS feed whose first `items` events share guids with
+    cap_feed(items), followed by `extra` events found only in the RSS feed
+    """
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0" '
+             'xmlns:geo="http://www.w3.org/2003/01/geo/wgs84_pos#" xmlns:gdacs="http://www.gdacs.org">\n'
+             '<channel>\n<title>GDACS RSS (synthetic)</title>\n']
+    for i in range(items + extra):
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        parts.append(f'''<item>
+<title>{event_type} event {i}</title>
+<description>Synthetic RSS event</description>
+<pubDate>Mon, 01 Jan 2024 {i % 24:02d}:00:00 GMT</pubDate>
+<guid isPermaLink="false">{event_type}{1000000 + i}</guid>
+<geo:Point><geo:lat>{rng.uniform(-60, 60):.4f}</geo:lat><geo:long>{rng.uniform(-180, 180):.4f}</geo:long></geo:Point>
+<gdacs:eventtype>{event_type}</gdacs:eventtype>
+<gdacs:alertlevel>{rng.choice(ALERT_LEVELS)}</gdacs:alertlevel>
+<gdacs:eventid>{1000000 + i}</gdacs:eventid>
+<gdacs:episodeid>{1 + i % 3}</gdacs:episodeid>
+<gdacs:severity unit="M">Magnitude {rng.uniform(4, 8):.1f}M</gdacs:severity>
+<gdacs:population unit="people">{rng.randrange(10 ** 6)} people affected</gdacs:population>
+<gdacs:country>Country {i % 20}</gdacs:country>
+<gdacs:iso3>C{i % 20:02d}</gdacs:iso3>
+</item>
+''')
+    parts.append(CAP_FOOTER)
+    return ''.join(parts)
+
+
+def event_geometry(event_type, event_id, episode_id):
+    """A small GeoJSON FeatureCollection like the GDACS getgeometry endpoint's"""
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {'eventtype': event_type, 'eventid': event_id, 'episodeid': episode_id},
+            'geometry': {'type': 'Point', 'coordinates': [0.0, 0.0]},
+        }],
+    }
+
+
+def facilities_csv(rows=1000, seed=0, clusters=0):
+    """
+    A facilities CSV (name,latitude,longitude,type) as a string. Facilities
+    are spread uniformly, or with `clusters` > 0 grouped around that many
+    random centres (e.g. cities) with a spread of about a degree, as real
+    facility networks are.
+    """
+    rng = random.Random(seed)
+    lines = ['name,latitude,longitude,type']
+    kinds = ['Health Centre', 'Hospital', 'Warehouse', 'School', 'Office']
+    centres = [(rng.uniform(-55, 55), rng.uniform(-180, 180)) for _ in range(clusters)]
+    for i in range(rows):
+        if centres:
+            lat, lon = rng.choice(centres)
+            lat = min(90.0, max(-90.0, rng.gauss(lat, 1.0)))
+            lon = (rng.gauss(lon, 1.0) + 180) % 360 - 180
+        else:
+            lat, lon = rng.uniform(-60, 60), rng.uniform(-180, 180)
+        lines.append(f'Facility {i},{lat:.6f},{lon:.6f},{kinds[i % len(kinds)]}')
+    return '\n'.join(lines) + '\n'
+
+
+def impacted_facilities(facilities=1000, events=50, impacts_per_facility=2, seed=0):
+    """
+    (impactedFacilities, disasters) shaped like the impact-assessment
+    response, for exercising the SitRep and recommendation prompts
+    """
+    rng = random.Random(seed)
+    disasters = [{
+        'guid': f'{EVENT_TYPES[i % len(EVENT_TYPES)]}{1000000 + i}',
+        'pubDate': 'Mon, 01 Jan 2024 00:00:00 GMT',
+        'eventType': EVENT_TYPES[i % len(EVENT_TYPES)],
+        'alertLevel': rng.choice(ALERT_LEVELS),
+        'title': f'Synthetic {EVENT_TYPES[i % len(EVENT_TYPES)]} event {i}',
+    } for i in range(events)]
+    countries = [f'Country {c}' for c in range(20)]
+    impacted = []
+    for i in range(facilities):
+        country = rng.choice(countries)
+        facility = {'name': f'Facility {i}', 'latitude': rng.uniform(-60, 60),
+                    'longitude': rng.uniform(-180, 180), 'country': country,
+                    'district': f'{country} district {rng.randrange(30)}'}
+        hits = rng.sample(disasters, min(impacts_per_facility, len(disasters)))
+        impacted.append({'facility': facility,
+                         'impacts': [{'disaster': d, 'distance': round(rng.uniform(1, 500), 2)} for d in hits]})
+    return impacted, disasters
+
+
+def alert_history(days=365, new_per_day=20, refreshes_per_day=4, vertices=10, seed=0):
+    """
+    Feed snapshots over `days` days, oldest first, as lists of disaster dicts:
+    every day `new_per_day` events start and stay in the feed for 1-10 days,
+    and each refresh republishes about a third of them with a new pubDate.
+    """
+    rng = random.Random(seed)
+    start = 1_704_067_200  # 2024-01-01T00:00:00Z
+    active = []
+    snapshots = []
+    for day in range(days):
+        for i in range(new_per_day):
+            event_type = rng.choice(EVENT_TYPES)
+            lat, lon = rng.uniform(-60, 60), rng.uniform(-180, 180)
+            ring = [[round(lon + math.cos(a) * 0.5, 4), round(lat + math.sin(a) * 0.5, 4)]
+                    for a in (2 * math.pi * k / vertices for k in range(vertices))]
+            active.append({'guid': f'{event_type}{day * new_per_day + i}', 'eventType': event_type,
+                           'latitude': lat, 'longitude': lon, 'until': day + rng.randint(1, 10),
+                           'alertLevel': rng.choice(ALERT_LEVELS), 'polygon': [ring + [ring[0]]], 'time': None})
+        active = [event for event in active if event['until'] > day]
+        for refresh in range(refreshes_per_day):
+            now = start + day * 86400 + refresh * 86400 // refreshes_per_day
+            snapshot = []
+            for event in active:
+                if event['time'] is None or rng.random() < 0.33:
+                    event['time'] = now
+                    event['alertLevel'] = rng.choice(ALERT_LEVELS)
+                snapshot.append({
+                    'guid': event['guid'],
+                    'pubDate': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(event['time'])),
+                    'title': f"Synthetic {event['eventType']} event {event['guid']}",
+                    'eventType': event['eventType'],
+                    'alertLevel': event['alertLevel'],
+                    'latitude': event['latitude'],
+                    'longitude': event['longitude'],
+                    'polygon': event['polygon'],
+                })
+            snapshots.append(snapshot)
+    return snapshots
@@ -0,0 +1,37 @@
+"""
+Identity of GDACS events and of their published versions, shared by the feed
+merge, incremental assessment, the response formats, the situation overview
+and the alert store, so one event has the same key in every layer.
+"""
+
+
+def _text(value):
+    return str(value).strip() if value not in (None, '') else ''
+
+
+def event_key(disaster):
+    """
+    Identity of an event across feed refreshes and sources: eventType and
+    eventId (CAP parameters or RSS), as the Next.js feed route merges, then
+    the guid, then eventType and title. None when the item carries none of
+    these; callers fall back to the item's position or object identity.
+    """
+    event_type = _text(disaster.get('eventType')).upper()
+    event_id = _text(disaster.get('eventId')) or _text(disaster.get('parameters', {}).get('eventid'))
+    if event_id:
+        return f"{event_type}:{event_id}"
+    guid = _text(disaster.get('guid'))
+    if guid:
+        return guid
+    title = _text(disaster.get('title'))
+    if title:
+        return f"{event_type}|{title}"
+    return None
+
+
+def version_key(disaster):
+    """Identity of one published version of an event: its event key and pubDate"""
+    key = event_key(disaster)
+    if key is None:
+        return None
+    return f"{key}@{_text(disaster.get('pubDate'))}"
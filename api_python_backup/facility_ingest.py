@@ -0,0 +1,179 @@
+import base64
+import io
+
+import numpy as np
+
+FACILITY_COLUMNS = ('name', 'latitude', 'longitude')
+
+# Optional columns naming a facility's administrative area, kept when present
+# (the SitRep overview groups impacts by them, see situation_overview.py)
+ADMIN_COLUMNS = ('district', 'admin', 'region', 'country')
+
+# Rows parsed per pandas chunk when streaming a CSV
+CSV_CHUNK_ROWS = 200_000
+
+FACILITY_FORMATS = ('csv', 'parquet', 'arrow')
+
+
+class FacilityColumns:
+    """
+    Facility set held as contiguous columns instead of one dict per row.
+
+    assess_impact reads `latitude` / `longitude` directly and only builds the
+    dicts (via `record`) for the facilities that end up in the response.
+    `admin_columns` holds the ADMIN_COLUMNS the upload had, None where a row
+    has no value; records only carry the values that are set.
+    """
+
+    def __init__(self, name, latitude, longitude, admin_columns=None):
+        self.name = np.asarray(name, dtype=object)
+        self.latitude = np.ascontiguousarray(latitude, dtype=np.float64)
+        self.longitude = np.ascontiguousarray(longitude, dtype=np.float64)
+        self.admin_columns = {column: np.asarray(values, dtype=object)
+                              for column, values in (admin_columns or {}).items()}
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def record(self, index):
+        record = {
+            'name': self.name[index],
+            'latitude': float(self.latitude[index]),
+            'longitude': float(self.longitude[index])
+        }
+        for column, values in self.admin_columns.items():
+            if values[index] is not None:
+                record[column] = values[index]
+        return record
+
+
+def admin_values(values):
+    """Object array of admin area values, None for missing or blank ones"""
+    values = np.asarray(values, dtype=object)
+    cleaned = [str(value).strip() if value is not None and value == value else '' for value in values.tolist()]
+    return np.array([value or None for value in cleaned], dtype=object)
+
+
+def validate_coordinates(latitude, longitude):
+    """Raise ValueError listing the rows with missing or out-of-range coordinates"""
+    valid = (np.isfinite(latitude) & np.isfinite(longitude) &
+             (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180))
+    if valid.all():
+        return
+    invalid = np.flatnonzero(~valid)
+    # Row numbers as seen in the file: 1-based, after the header line
+    rows = ', '.join(str(i + 2) for i in invalid[:10])
+    more = f" and {invalid.size - 10} more" if invalid.size > 10 else ''
+    raise ValueError(f"{invalid.size} facilities have invalid coordinates (rows {rows}{more})")
+
+
+def _columns_from_chunks(chunks):
+    names, lats, lons, admin = [], [], [], {}
+    for chunk in chunks:
+        missing = [c for c in FACILITY_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Facilities CSV is missing columns: {', '.join(missing)}")
+        names.append(chunk['name'].to_numpy(dtype=object))
+        lats.append(chunk['latitude'].to_numpy(dtype=np.float64))
+        lons.append(chunk['longitude'].to_numpy(dtype=np.float64))
+        for column in ADMIN_COLUMNS:
+            if column in chunk.columns:
+                admin.setdefault(column, []).append(admin_values(chunk[column].to_numpy(dtype=object)))
+    if not names:
+        return FacilityColumns([], [], [])
+    return FacilityColumns(np.concatenate(names), np.concatenate(lats), np.concatenate(lons),
+                           {column: np.concatenate(parts) for column, parts in admin.items()})
+
+
+def read_facilities_csv(source, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Read the name/latitude/longitude columns, and any ADMIN_COLUMNS, of a
+    facilities CSV (path or file-like object) in chunks, so only one chunk's
+    frame is alive at a time.
+    """
+    # pandas is imported here rather than at module load: it is the slowest
+    # import of the impact handler and JSON/Arrow uploads never need it
+    import pandas as pd
+
+    wanted = set(FACILITY_COLUMNS + ADMIN_COLUMNS)
+    reader = pd.read_csv(
+        source,
+        usecols=lambda column: column in wanted,
+        dtype=dict({'latitude': np.float64, 'longitude': np.float64}, **{column: str for column in ADMIN_COLUMNS}),
+        chunksize=chunk_rows,
+    )
+    with reader:
+        facilities = _columns_from_chunks(reader)
+
+    validate_coordinates(facilities.latitude, facilities.longitude)
+    return facilities
+
+
+def _columns_from_table(table):
+    missing = [c for c in FACILITY_COLUMNS if c not in table.column_names]
+    if missing:
+        raise ValueError(f"Facilities table is missing columns: {', '.join(missing)}")
+    facilities = FacilityColumns(
+        table.column('name').to_numpy(zero_copy_only=False),
+        table.column('latitude').cast('float64').to_numpy(),
+        table.column('longitude').cast('float64').to_numpy(),
+        {column: admin_values(table.column(column).to_numpy(zero_copy_only=False))
+         for column in ADMIN_COLUMNS if column in table.column_names},
+    )
+    validate_coordinates(facilities.latitude, facilities.longitude)
+    return facilities
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet/Arrow facility uploads require the pyarrow package")
+    return pyarrow
+
+
+def _table_columns(names):
+    """The facility columns present among a table's column `names`"""
+    return [column for column in FACILITY_COLUMNS + ADMIN_COLUMNS if column in names]
+
+
+def read_facilities_parquet(source):
+    """Read facilities from a Parquet file, loading only the needed columns"""
+    pa = _pyarrow()
+    columns = _table_columns(pa.parquet.read_schema(source).names)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return _columns_from_table(pa.parquet.read_table(source, columns=columns))
+
+
+def read_facilities_arrow(source):
+    """Read facilities from an Arrow IPC file or stream"""
+    pa = _pyarrow()
+    if isinstance(source, (bytes, bytearray)):
+        source = pa.BufferReader(source)
+    try:
+        table = pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        table = pa.ipc.open_stream(source).read_all()
+    return _columns_from_table(table.select(_table_columns(table.column_names)))
+
+
+def read_facilities(payload, facilities_format='csv'):
+    """
+    Facilities from a request payload: CSV text, or base64-encoded Parquet /
+    Arrow bytes for the binary formats
+    """
+    if facilities_format not in FACILITY_FORMATS:
+        raise ValueError(f"Unknown facilities format '{facilities_format}'")
+    if facilities_format == 'csv':
+        # pandas buffers a whole text stream before chunking; a bytes stream
+        # is read incrementally
+        return read_facilities_csv(io.BytesIO(payload.encode('utf-8')))
+
+    data = base64.b64decode(payload)
+    if facilities_format == 'parquet':
+        return read_facilities_parquet(io.BytesIO(data))
+    return read_facilities_arrow(data)
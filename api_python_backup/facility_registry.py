@@ -0,0 +1,246 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from facility_ingest import ADMIN_COLUMNS, admin_values
+from geo_engine import facility_coordinates
+from spatial_index import DEFAULT_CELL_DEG, FacilityGrid
+
+SET_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Column files of a stored facility set, all memory-mapped on open
+COLUMN_FILES = ('latitude', 'longitude', 'grid_order', 'grid_cells')
+
+# Bounds of a registry; past either, the least recently used sets are evicted
+MAX_SETS = int(os.getenv('FACILITY_REGISTRY_MAX_SETS', '256'))
+MAX_BYTES = int(os.getenv('FACILITY_REGISTRY_MAX_BYTES', str(4 * 1024 ** 3)))
+
+
+class StringColumn:
+    """UTF-8 strings stored as one byte file plus an offsets array, memory-mapped"""
+
+    def __init__(self, data_path, offsets_path):
+        self._offsets = np.load(offsets_path, mmap_mode='r')
+        self._data = np.memmap(data_path, dtype=np.uint8, mode='r') \
+            if self._offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+
+    def __getitem__(self, index):
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        return bytes(self._data[start:stop]).decode('utf-8')
+
+    @staticmethod
+    def write(data_path, offsets_path, encoded):
+        np.save(offsets_path, np.concatenate(([0], np.cumsum([len(v) for v in encoded]))).astype(np.int64))
+        with open(data_path, 'wb') as f:
+            f.write(b''.join(encoded))
+
+
+def _string_files(path, column):
+    """(data, offsets) file paths of a string column; names keep their original file names"""
+    if column == 'name':
+        return os.path.join(path, 'names.bin'), os.path.join(path, 'name_offsets.npy')
+    return os.path.join(path, f'{column}.bin'), os.path.join(path, f'{column}_offsets.npy')
+
+
+class RegisteredFacilitySet:
+    """
+    A stored facility set opened read-only through memory maps.
+
+    It exposes the same interface as facility_ingest.FacilityColumns, plus the
+    precomputed grid index. Pages are shared by every process that maps the
+    same set. Admin area columns are stored only for sets uploaded with them;
+    an empty string marks a row without a value.
+    """
+
+    def __init__(self, set_id, path):
+        self.set_id = set_id
+        self.path = path
+        columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in COLUMN_FILES}
+        self.latitude = columns['latitude']
+        self.longitude = columns['longitude']
+        self._names = StringColumn(*_string_files(path, 'name'))
+        self.admin_columns = {column: StringColumn(*_string_files(path, column)) for column in ADMIN_COLUMNS
+                              if os.path.exists(_string_files(path, column)[1])}
+        self._grid = FacilityGrid.from_sorted(self.latitude, self.longitude, columns['grid_order'],
+                                              columns['grid_cells'], cell_deg=DEFAULT_CELL_DEG)
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def name_at(self, index):
+        return self._names[index]
+
+    def record(self, index):
+        record = {
+            'name': self.name_at(index),
+            'latitude': float(self.latitude[index]),
+            'longitude': float(self.longitude[index])
+        }
+        for column, values in self.admin_columns.items():
+            value = values[index]
+            if value:
+                record[column] = value
+        return record
+
+    def grid(self):
+        return self._grid
+
+
+class FacilityRegistry:
+    """
+    Content-addressed store of facility sets. A set is uploaded once with
+    `register`, which returns its id; later requests `open` it by id without
+    re-sending or re-parsing the CSV.
+
+    The registry holds at most `max_sets` sets and `max_bytes` bytes. Every
+    register and open marks a set as used (its directory's mtime); a new set
+    that goes past a bound evicts the least recently used others. Requests
+    with an evicted id get "Unknown facility set" and register it again.
+    Maps already open stay valid after their files are removed.
+    """
+
+    def __init__(self, root, max_sets=MAX_SETS, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_sets = max_sets
+        self.max_bytes = max_bytes
+        self._open_sets = {}
+        self._lock = threading.Lock()
+
+    def _path(self, set_id):
+        if not SET_ID_PATTERN.match(set_id or ''):
+            raise ValueError(f"Invalid facility set id '{set_id}'")
+        return os.path.join(self.root, set_id)
+
+    def register(self, facilities):
+        """Store a facility set (dicts, columns or an opened set) and return its id"""
+        if isinstance(facilities, RegisteredFacilitySet) and os.path.isdir(self._path(facilities.set_id)):
+            # Ids are content hashes, so a set opened from any registry keeps its id
+            self._touch(facilities.set_id)
+            return facilities.set_id
+        lat, lon = facility_coordinates(facilities)
+        names, admin = _facility_strings(facilities)
+        strings = {'name': [name.encode('utf-8') for name in names]}
+        for column in ADMIN_COLUMNS:
+            if column in admin:
+                strings[column] = [(value or '').encode('utf-8') for value in admin[column]]
+
+        # Sets without admin columns keep the ids they had before those were stored
+        digest = hashlib.sha256(lat.tobytes())
+        digest.update(lon.tobytes())
+        for column, encoded in strings.items():
+            if column != 'name':
+                digest.update(column.encode() + b'\0')
+            for value in encoded:
+                digest.update(value + b'\0')
+        set_id = digest.hexdigest()[:32]
+
+        path = self._path(set_id)
+        if os.path.exists(path):
+            self._touch(set_id)
+            return set_id
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{set_id}.', dir=self.root)
+        try:
+            grid = FacilityGrid(lat, lon, cell_deg=DEFAULT_CELL_DEG)
+            columns = {
+                'latitude': lat,
+                'longitude': lon,
+                'grid_order': grid.order,
+                'grid_cells': grid.sorted_cells,
+            }
+            for name, values in columns.items():
+                np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(values))
+            for column, encoded in strings.items():
+                StringColumn.write(*_string_files(staging, column), encoded)
+
+            # Publish atomically; a concurrent writer of the same set may win
+            try:
+                os.rename(staging, path)
+            except OSError:
+                if not os.path.exists(path):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict(keep=set_id)
+        return set_id
+
+    def open(self, set_id):
+        """The stored set for `set_id`, mapped once per process"""
+        path = self._path(set_id)
+        with self._lock:
+            facility_set = self._open_sets.get(set_id)
+            if facility_set is None:
+                if not os.path.isdir(path):
+                    raise ValueError(f"Unknown facility set '{set_id}'")
+                facility_set = self._open_sets[set_id] = RegisteredFacilitySet(set_id, path)
+        self._touch(set_id)
+        return facility_set
+
+    def _touch(self, set_id):
+        try:
+            os.utime(self._path(set_id))
+        except OSError:
+            pass
+
+    def _stored_sets(self):
+        """(last used, bytes, set id) of every stored set"""
+        stored = []
+        try:
+            entries = [entry for entry in os.scandir(self.root) if SET_ID_PATTERN.match(entry.name)]
+        except FileNotFoundError:
+            return stored
+        for entry in entries:
+            try:
+                used = entry.stat().st_mtime
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+            except OSError:
+                continue  # removed meanwhile
+            stored.append((used, size, entry.name))
+        return stored
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used sets (never `keep`) until the registry
+        is within max_sets and max_bytes; returns the ids removed
+        """
+        stored = sorted(self._stored_sets())
+        count, total = len(stored), sum(size for _, size, _ in stored)
+        evicted = []
+        for _, size, set_id in stored:
+            if count <= self.max_sets and total <= self.max_bytes:
+                break
+            if set_id == keep:
+                continue
+            # Renamed first, so the set disappears at once for every process
+            doomed = os.path.join(self.root, f'.evicted.{set_id}.{os.getpid()}.{threading.get_ident()}')
+            try:
+                os.rename(self._path(set_id), doomed)
+            except OSError:
+                continue  # evicted by another process
+            shutil.rmtree(doomed, ignore_errors=True)
+            with self._lock:
+                self._open_sets.pop(set_id, None)
+            count -= 1
+            total -= size
+            evicted.append(set_id)
+        return evicted
+
+
+def _facility_strings(facilities):
+    """Names and admin area columns (a value or None per row) of any facility set"""
+    if isinstance(facilities, RegisteredFacilitySet):
+        rows = range(len(facilities))
+        return ([facilities.name_at(i) for i in rows],
+                {column: [values[i] or None for i in rows] for column, values in facilities.admin_columns.items()})
+    if hasattr(facilities, 'name'):
+        return ([str(name) for name in facilities.name],
+                {column: list(values) for column, values in getattr(facilities, 'admin_columns', {}).items()})
+    names = [str(facility.get('name')) for facility in facilities]
+    return names, {column: admin_values([facility.get(column) for facility in facilities]).tolist()
+                   for column in ADMIN_COLUMNS if any(facility.get(column) is not None for facility in facilities)}
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+import metrics
+
+
+class FeedCache:
+    """
+    TTL cache around an upstream feed with conditional GETs.
+
+    - Within `ttl` seconds of the last successful fetch the cached items are
+      served as is ("fresh").
+    - For up to `stale_ttl` more seconds they are still served immediately
+      while a background refresh revalidates them ("stale").
+    - Refreshes send If-None-Match / If-Modified-Since, so an unchanged feed
+      costs a 304 and no parsing.
+    - Concurrent refreshes are coalesced: one thread fetches, the others wait
+      for its result instead of hitting the upstream again.
+    - With `snapshot_path` every successful fetch is written to disk, and a
+      cold process starts from that snapshot.
+
+    `parse` turns the (decoded) response body stream into a list of items;
+    `enrich`, if given, then receives that list and returns the items to cache
+    (e.g. merged with other sources). A 304 keeps the enriched items.
+    """
+
+    def __init__(self, url, parse, ttl=300, stale_ttl=86400, snapshot_path=None,
+                 session=None, timeout=(5, 30), enrich=None):
+        self.url = url
+        self.parse = parse
+        self.enrich = enrich
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.snapshot_path = snapshot_path
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+        self._entry = None
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._snapshot_checked = False
+
+    def get(self):
+        """Return (items, state) where state is 'fresh', 'stale' or 'miss'"""
+        entry = self._current_entry()
+        if entry is not None:
+            age = time.time() - entry['fetchedAt']
+            if age < self.ttl:
+                return entry['items'], 'fresh'
+            if self.stale_ttl is None or age < self.ttl + self.stale_ttl:
+                self.refresh(wait=False)
+                return entry['items'], 'stale'
+
+        entry = self.refresh(wait=True)
+        return (entry['items'] if entry is not None else []), 'miss'
+
+    def refresh(self, wait=True):
+        """
+        Revalidate the feed, joining a refresh already in flight if there is
+        one. With wait=False the refresh runs on a background thread.
+        """
+        with self._lock:
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+
+        if leader:
+            if wait:
+                self._run_refresh(inflight)
+            else:
+                threading.Thread(target=self._run_refresh, args=(inflight,), daemon=True).start()
+        elif wait:
+            inflight.wait()
+
+        return self._entry
+
+    def _run_refresh(self, inflight):
+        try:
+            self._fetch()
+        except Exception as e:
+            print(f"Error refreshing feed {self.url}: {e}")
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.set()
+
+    def _fetch(self):
+        entry = self._entry
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('lastModified'):
+                headers['If-Modified-Since'] = entry['lastModified']
+
+        start = time.perf_counter()
+        with self.session.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and entry is not None:
+                self._entry = dict(entry, fetchedAt=time.time())
+                metrics.record('feed_fetch', time.perf_counter() - start)
+                return
+            response.raise_for_status()
+
+            # Let urllib3 undo any gzip/deflate transfer encoding while streaming
+            response.raw.decode_content = True
+            # Parsing is interleaved with the download; this thread's CPU time
+            # approximates the parsing part of it
+            parse_start = time.thread_time()
+            items = list(self.parse(response.raw))
+            metrics.record('feed_parse', time.thread_time() - parse_start)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        metrics.record('feed_fetch', time.perf_counter() - start)
+        metrics.count('feed_items_parsed', len(items))
+
+        # After the feed connection has gone back to the pool
+        if self.enrich is not None:
+            with metrics.span('feed_enrich'):
+                items = self.enrich(items)
+        metrics.gauge('feed_items', len(items))
+
+        self._entry = {
+            'items': items,
+            'etag': etag,
+            'lastModified': last_modified,
+            'fetchedAt': time.time(),
+        }
+        self._write_snapshot(self._entry)
+
+    def _current_entry(self):
+        if self._entry is None and not self._snapshot_checked:
+            self._snapshot_checked = True
+            self._entry = self._read_snapshot()
+        return self._entry
+
+    def _read_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('url') != self.url:
+                return None
+            return snapshot['entry']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable feed snapshot {self.snapshot_path}: {e}")
+            return None
+
+    def _write_snapshot(self, entry):
+        if not self.snapshot_path:
+            return
+        # Write to a temporary file first so readers never see a partial snapshot
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': self.url, 'entry': entry}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error writing feed snapshot {self.snapshot_path}: {e}")
@@ -1,126 +1,449 @@
-from http.server import BaseHTTPRequestHandler
-import requests
 import xml.etree.ElementTree as ET
 import json
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 
-class handler(BaseHTTPRequestHandler):
+import metrics
+from alert_store import open_store, window_options
+from events import event_key
+from feed_cache import FeedCache
+from geometry import GeometryProcessor
+from http_client import DEFAULT_TIMEOUT, FETCH_WORKERS, SESSION, fetch_concurrently, get_json
+from metrics import InstrumentedHandler
+
+class handler(InstrumentedHandler):
     def do_GET(self):
+        try:
+            history = history_options(self.path)
+            if history is not None:
+                # Past alert versions from the alert store instead of the live feed
+                with metrics.span('history_query'):
+                    disasters = open_store().query(**window_options(history))
+                cache_state = 'history'
+                with metrics.span('feed_serialize'):
+                    body = json.dumps(GEOMETRY.process(disasters, **geometry_options(self.path))).encode()
+            else:
+                # Get disaster data from GDACS CAP feed (cached, see FEED_CACHE)
+                disasters, cache_state = FEED_CACHE.get()
+                metrics.count('feed_cache_misses' if cache_state == 'miss' else 'feed_cache_hits')
+                
+                # Optional polygon post-processing selected by query parameters
+                with metrics.span('feed_serialize'):
+                    body = encoded_feed(disasters, geometry_options(self.path))
+        except ValueError as e:
+            body = json.dumps({
+                'error': str(e)
+            }).encode()
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        self.send_header('X-Cache', cache_state)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
         
-        # Get disaster data from GDACS CAP feed
-        disasters = fetch_gdacs_cap_data()
-        
         # Send the JSON response
-        self.wfile.write(json.dumps(disasters).encode())
+        self.wfile.write(body)
         return
 
-def fetch_gdacs_cap_data():
-    """Fetch and parse GDACS CAP feed data"""
+# GDACS CAP feed URL
+GDACS_CAP_URL = os.getenv('GDACS_CAP_URL', 'https://www.gdacs.org/xml/gdacs_cap.xml')
+
+# Sources merged into the CAP items by event (events.event_key): the RSS feed
+# (alert level, event and episode ids; empty GDACS_RSS_URL disables it) and,
+# with GDACS_FETCH_GEOMETRY=1, each event's GeoJSON geometry. RSS items only
+# enrich events already in the CAP feed unless GDACS_RSS_APPEND=1, which adds
+# the RSS-only events with the CAP item fields
+GDACS_RSS_URL = os.getenv('GDACS_RSS_URL', 'https://www.gdacs.org/xml/rss.xml')
+GDACS_RSS_APPEND = os.getenv('GDACS_RSS_APPEND', '0') == '1'
+GDACS_GEOMETRY_URL = os.getenv('GDACS_GEOMETRY_URL', 'https://www.gdacs.org/gdacsapi/api/polygons/getgeometry')
+GDACS_FETCH_GEOMETRY = os.getenv('GDACS_FETCH_GEOMETRY', '0') == '1'
+
+# With GDACS_ALERT_HISTORY=1 every fetched feed is appended to the alert store
+# (see alert_store.py), which keeps each (event, pubDate) version once
+GDACS_ALERT_HISTORY = os.getenv('GDACS_ALERT_HISTORY', '0') == '1'
+
+# Namespaces in the CAP and RSS feeds, in ElementTree's "{uri}tag" form
+CAP = '{urn:oasis:names:tc:emergency:cap:1.2}'
+GEO = '{http://www.w3.org/2003/01/geo/wgs84_pos#}'
+GDACS = '{http://www.gdacs.org}'
+
+# gdacs:* RSS elements and the disaster fields they provide; RSS values take
+# precedence over the CAP item's, as in the Next.js feed route
+RSS_FIELDS = {
+    'alertlevel': 'alertLevel',
+    'eventid': 'eventId',
+    'episodeid': 'episodeId',
+    'severity': 'severity',
+    'population': 'population',
+    'country': 'country',
+    'iso3': 'iso3',
+}
+
+# Polygon simplification/encoding results, shared by all requests
+GEOMETRY = GeometryProcessor()
+
+# Serialized responses of the current feed, per geometry options
+MAX_ENCODED_FEEDS = 16
+_encoded_feeds = OrderedDict()
+_encoded_feed_lock = threading.Lock()
+
+# Fields read from the first matching descendant of cap:info
+CAP_INFO_FIELDS = ('event', 'severity', 'certainty', 'urgency', 'headline', 'web', 'area')
+
+def geometry_options(path):
+    """
+    GeometryProcessor options from the request query string:
+    ?simplify=<tolerance in degrees>&method=dp|vw&precision=<decimals>&encoding=polyline
+    """
+    query = parse_qs(urlparse(path).query)
     
-    # GDACS CAP feed URL
-    gdacs_url = 'https://www.gdacs.org/xml/gdacs_cap.xml'
+    def param(name):
+        values = query.get(name)
+        return values[-1] if values else None
     
+    options = {}
     try:
-        response = requests.get(gdacs_url)
-        response.raise_for_status()
-        
-        # Parse XML
-        root = ET.fromstring(response.text)
-        
-        # Initialize disasters list
-        disasters = []
-        
-        # Namespaces in the CAP feed
-        namespaces = {
-            'cap': 'urn:oasis:names:tc:emergency:cap:1.2',
-            'geo': 'http://www.w3.org/2003/01/geo/wgs84_pos#',
-            'gdacs': 'http://www.gdacs.org'
-        }
-        
-        # Extract items from the feed
-        for item in root.findall('.//item'):
-            title = item.find('title').text if item.find('title') is not None else ''
-            description = item.find('description').text if item.find('description') is not None else ''
-            pub_date = item.find('pubDate').text if item.find('pubDate') is not None else ''
-            link = item.find('link').text if item.find('link') is not None else ''
-            guid = item.find('guid').text if item.find('guid') is not None else ''
-            
-            # Extract geo information
-            geo_point = item.find('.//geo:Point', namespaces)
-            lat = geo_point.find('./geo:lat', namespaces) if geo_point is not None else None
-            lon = geo_point.find('./geo:long', namespaces) if geo_point is not None else None
+        if param('simplify') is not None:
+            options['tolerance'] = float(param('simplify'))
+        if param('precision') is not None:
+            options['precision'] = int(param('precision'))
+    except ValueError:
+        raise ValueError("simplify must be a number and precision an integer")
+    if options.get('tolerance', 0) < 0 or not 0 <= options.get('precision', 0) <= 10:
+        raise ValueError("simplify must be >= 0 and precision between 0 and 10")
+    if param('method') is not None:
+        options['method'] = param('method')
+    if param('encoding') is not None:
+        options['encoding'] = param('encoding')
+    return options
+
+def history_options(path):
+    """
+    Alert store query from the request query string, or None for the live feed:
+    ?history=1&days=90|start=..&end=..&bbox=lat_min,lon_min,lat_max,lon_max
+    &eventTypes=EQ,TC&alertLevels=Orange,Red&versions=latest|all&limit=N
+    """
+    query = parse_qs(urlparse(path).query)
+    if query.get('history', ['0'])[-1] in ('', '0', 'false'):
+        return None
+    
+    options = {}
+    for name in ('start', 'end', 'days', 'versions', 'limit'):
+        if query.get(name):
+            options[name] = query[name][-1]
+    for name in ('start', 'end'):
+        # Epoch seconds arrive as digit strings
+        if options.get(name, '').isdigit():
+            options[name] = int(options[name])
+    for name in ('bbox', 'eventTypes', 'alertLevels'):
+        if query.get(name):
+            options[name] = [value for value in query[name][-1].split(',') if value]
+    return options
+
+def encoded_feed(disasters, options):
+    """
+    JSON body for the feed items and geometry options. Bodies are reused until
+    the feed cache hands out a new item list, so repeated requests skip both
+    the geometry processing and the serialization.
+    """
+    key = json.dumps(options, sort_keys=True)
+    with _encoded_feed_lock:
+        entry = _encoded_feeds.get(key)
+        if entry is not None and entry[0] is disasters:
+            _encoded_feeds.move_to_end(key)
+            return entry[1]
+    
+    body = json.dumps(GEOMETRY.process(disasters, **options)).encode()
+    with _encoded_feed_lock:
+        # The item list is kept with its body, so its identity stays unique
+        _encoded_feeds[key] = (disasters, body)
+        _encoded_feeds.move_to_end(key)
+        while len(_encoded_feeds) > MAX_ENCODED_FEEDS:
+            _encoded_feeds.popitem(last=False)
+    return body
+
+def fetch_gdacs_cap_data(url=GDACS_CAP_URL):
+    """Fetch and parse GDACS CAP feed data"""
+    
+    try:
+        with SESSION.get(url, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+            response.raise_for_status()
             
-            # Extract CAP information
-            cap_alert = item.find('.//cap:alert', namespaces)
-            cap_info = cap_alert.find('.//cap:info', namespaces) if cap_alert is not None else None
+            # Let urllib3 undo any gzip/deflate transfer encoding while streaming
+            response.raw.decode_content = True
             
-            if cap_info is not None:
-                event = cap_info.find('.//cap:event', namespaces)
-                severity = cap_info.find('.//cap:severity', namespaces)
-                certainty = cap_info.find('.//cap:certainty', namespaces)
-                urgency = cap_info.find('.//cap:urgency', namespaces)
-                headline = cap_info.find('.//cap:headline', namespaces)
-                
-                # Extract polygon data if available
-                cap_area = cap_info.find('.//cap:area', namespaces)
-                polygon = cap_area.find('.//cap:polygon', namespaces) if cap_area is not None else None
-                polygon_coordinates = []
-                
-                if polygon is not None and polygon.text:
-                    # Parse polygon coordinates (format: "lat1,lon1 lat2,lon2 ...")
-                    points = polygon.text.strip().split(' ')
-                    for point in points:
-                        coords = point.split(',')
-                        if len(coords) == 2:
-                            try:
-                                lat_coord = float(coords[0])
-                                lon_coord = float(coords[1])
-                                polygon_coordinates.append([lat_coord, lon_coord])
-                            except ValueError:
-                                continue
-                
-                # Extract parameters
-                parameters = {}
-                for param in cap_info.findall('.//cap:parameter', namespaces):
-                    name = param.find('.//cap:valueName', namespaces)
-                    value = param.find('.//cap:value', namespaces)
-                    if name is not None and value is not None and name.text and value.text:
-                        parameters[name.text] = value.text
-                
-                # Create disaster object
-                # Extract web URL from CAP info if available
-                web_url = cap_info.find('.//cap:web', namespaces)
-                web_link = web_url.text if web_url is not None else link
-                
-                # Find web URL from parameters if not found directly
-                if web_link == link and 'link' in parameters:
-                    web_link = parameters['link']
-                
-                disaster = {
-                    'title': title,
-                    'description': description,
-                    'pubDate': pub_date,
-                    'link': link,  # Original link from RSS
-                    'webUrl': web_link,  # Web URL for viewing in browser
-                    'guid': guid,
-                    'latitude': float(lat.text) if lat is not None and lat.text else None,
-                    'longitude': float(lon.text) if lon is not None and lon.text else None,
-                    'eventType': event.text if event is not None else '',
-                    'severity': severity.text if severity is not None else '',
-                    'certainty': certainty.text if certainty is not None else '',
-                    'urgency': urgency.text if urgency is not None else '',
-                    'headline': headline.text if headline.text is not None else '',
-                    'polygon': polygon_coordinates,
-                    'parameters': parameters
-                }
-                
-                disasters.append(disaster)
-        
-        return disasters
+            return list(iter_gdacs_cap_data(response.raw))
     
     except Exception as e:
         print(f"Error fetching GDACS CAP data: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def fetch_gdacs_rss_data(url=GDACS_RSS_URL):
+    """Fetch and parse the GDACS RSS feed (raises on failure)"""
+    
+    with SESSION.get(url, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return list(iter_gdacs_rss_data(response.raw))
+
+def fetch_event_geometry(event_type, event_id, episode_id=None, url=GDACS_GEOMETRY_URL):
+    """GeoJSON FeatureCollection of one event (tracks, shakemaps, affected areas)"""
+    return get_json(url, params={
+        'eventtype': event_type,
+        'eventid': event_id,
+        'episodeid': episode_id or '1'
+    })
+
+def enrich_gdacs_events(disasters, rss_url=GDACS_RSS_URL, fetch_geometry=GDACS_FETCH_GEOMETRY,
+                        geometry_url=GDACS_GEOMETRY_URL, max_workers=FETCH_WORKERS, append_rss=GDACS_RSS_APPEND):
+    """
+    Merge the RSS feed and, optionally, per-event geometry into CAP disasters.
+    RSS items match on event type + event id, then on guid. The RSS feed and
+    all geometry requests are fetched concurrently over the pooled session; a
+    failed source is logged and skipped. RSS-only events are dropped, or with
+    `append_rss` appended in the CAP item format (see rss_only_event).
+    Disasters sharing an event key are merged into the first one; those
+    without a key are kept as they are, in feed order.
+    """
+    # Event and episode ids are in the CAP parameters, so geometry requests
+    # need not wait for the RSS feed
+    for disaster in disasters:
+        parameters = disaster.get('parameters', {})
+        disaster.setdefault('alertLevel', parameters.get('alertlevel', ''))
+        disaster.setdefault('eventId', parameters.get('eventid', ''))
+        disaster.setdefault('episodeId', parameters.get('currentepisodeid') or parameters.get('episodeid', ''))
+    
+    tasks = {}
+    if rss_url:
+        tasks['rss'] = lambda: fetch_gdacs_rss_data(rss_url)
+    if fetch_geometry:
+        for disaster in disasters:
+            if disaster['eventType'] and disaster['eventId']:
+                tasks[('geometry', event_key(disaster))] = (
+                    lambda d=disaster: fetch_event_geometry(d['eventType'], d['eventId'], d['episodeId'], geometry_url))
+    results = fetch_concurrently(tasks, max_workers=max_workers)
+    
+    failed = [name for name, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        print(f"Error fetching {len(failed)} GDACS sources, e.g. {failed[0]}: {results[failed[0]]}")
+    
+    merged = {}
+    for position, disaster in enumerate(disasters):
+        merged.setdefault(event_key(disaster) or ('pos', position), disaster)
+    if len(merged) < len(disasters):
+        print(f"Merged {len(disasters) - len(merged)} duplicate GDACS events")
+    by_guid = {disaster['guid']: disaster for disaster in disasters if disaster.get('guid')}
+    rss_items = results.get('rss')
+    if isinstance(rss_items, list):
+        for position, item in enumerate(rss_items):
+            disaster = merged.get(event_key(item)) if event_key(item) else None
+            if disaster is None and item.get('guid') in by_guid:
+                # The guid only decides when one side has no event id to compare
+                disaster = by_guid[item['guid']]
+                if disaster.get('eventId') and item.get('eventId'):
+                    disaster = None
+            if disaster is None:
+                if append_rss:
+                    merged.setdefault(event_key(item) or ('rss', position), rss_only_event(item))
+                continue
+            for field in RSS_FIELDS.values():
+                if item.get(field):
+                    disaster[field] = item[field]
+    
+    for disaster in merged.values():
+        geometry = results.get(('geometry', event_key(disaster)))
+        if geometry is not None and not isinstance(geometry, Exception):
+            disaster['geometry'] = geometry
+    return list(merged.values())
+
+def rss_only_event(item):
+    """
+    An RSS item without a CAP counterpart, with the fields of parse_cap_item:
+    no polygon, the gdacs:* values as CAP parameters, and the title as headline
+    """
+    parameters = {tag: item[field] for tag, field in RSS_FIELDS.items() if item.get(field)}
+    return dict(item, **{
+        'webUrl': item.get('link', ''),
+        'severity': item.get('severity', ''),
+        'certainty': '',
+        'urgency': '',
+        'headline': item.get('title', ''),
+        'polygon': [],
+        'parameters': parameters,
+    })
+
+def process_feed(disasters):
+    """Enrich freshly fetched CAP disasters and record them in the alert history"""
+    disasters = enrich_gdacs_events(disasters)
+    if GDACS_ALERT_HISTORY:
+        try:
+            with metrics.span('history_append'):
+                metrics.count('alert_versions_stored', open_store().append(disasters))
+        except Exception as e:
+            print(f"Error recording alert history: {e}")
+    return disasters
+
+def _iter_items(source, parse_item):
+    """
+    Incrementally parse an RSS-style feed from a file-like object (or path),
+    yielding parse_item(<item>) for every item it does not reject (None).
+    
+    Each finished <item> is cleared and detached from its <channel>, so peak
+    memory stays flat no matter how many items the feed has.
+    """
+    channel = None
+    
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'channel' and channel is None:
+                channel = elem
+            continue
+        
+        if elem.tag != 'item':
+            continue
+        
+        disaster = parse_item(elem)
+        if disaster is not None:
+            yield disaster
+        
+        elem.clear()
+        if channel is not None and len(channel) and channel[-1] is elem:
+            del channel[-1]
+
+def iter_gdacs_cap_data(source):
+    """Incrementally parse a CAP feed, yielding one disaster dict per <item>"""
+    return _iter_items(source, parse_cap_item)
+
+def iter_gdacs_rss_data(source):
+    """Incrementally parse the GDACS RSS feed, yielding one event dict per <item>"""
+    return _iter_items(source, parse_rss_item)
+
+def _text(elem):
+    return elem.text if elem is not None else ''
+
+def parse_rss_item(item):
+    """Convert a GDACS RSS <item> element into an event dict"""
+    
+    # Direct children of the item (first occurrence wins)
+    children = {}
+    for child in item:
+        children.setdefault(child.tag, child)
+    
+    lat = next(item.iter(GEO + 'lat'), None)
+    lon = next(item.iter(GEO + 'long'), None)
+    event = {
+        'title': _text(children.get('title')),
+        'description': _text(children.get('description')),
+        'pubDate': _text(children.get('pubDate')),
+        'link': _text(children.get('link')),
+        'guid': _text(children.get('guid')),
+        'latitude': float(lat.text) if lat is not None and lat.text else None,
+        'longitude': float(lon.text) if lon is not None and lon.text else None,
+        'eventType': _text(children.get(GDACS + 'eventtype')),
+    }
+    for tag, field in RSS_FIELDS.items():
+        event[field] = (_text(children.get(GDACS + tag)) or '').strip()
+    return event
+
+def parse_cap_item(item):
+    """Convert a CAP feed <item> element into a disaster dict (None without cap:info)"""
+    
+    # Direct children of the item (first occurrence wins)
+    children = {}
+    for child in item:
+        children.setdefault(child.tag, child)
+    
+    title = _text(children.get('title'))
+    link = _text(children.get('link'))
+    
+    # Extract geo information
+    geo_point = next(item.iter(GEO + 'Point'), None)
+    lat = geo_point.find(GEO + 'lat') if geo_point is not None else None
+    lon = geo_point.find(GEO + 'long') if geo_point is not None else None
+    
+    # Extract CAP information
+    cap_alert = next(item.iter(CAP + 'alert'), None)
+    cap_info = next(cap_alert.iter(CAP + 'info'), None) if cap_alert is not None else None
+    if cap_info is None:
+        return None
+    
+    # Single pass over cap:info instead of one descendant search per field
+    fields = {}
+    parameters = {}
+    for elem in cap_info.iter():
+        tag = elem.tag[len(CAP):] if elem.tag.startswith(CAP) else None
+        if tag in CAP_INFO_FIELDS:
+            fields.setdefault(tag, elem)
+        elif tag == 'parameter':
+            name = next(elem.iter(CAP + 'valueName'), None)
+            value = next(elem.iter(CAP + 'value'), None)
+            if name is not None and value is not None and name.text and value.text:
+                parameters[name.text] = value.text
+    
+    # Extract polygon data if available
+    cap_area = fields.get('area')
+    polygon = next(cap_area.iter(CAP + 'polygon'), None) if cap_area is not None else None
+    polygon_coordinates = []
+    
+    if polygon is not None and polygon.text:
+        # Parse polygon coordinates (format: "lat1,lon1 lat2,lon2 ...")
+        for point in polygon.text.strip().split(' '):
+            coords = point.split(',')
+            if len(coords) == 2:
+                try:
+                    polygon_coordinates.append([float(coords[0]), float(coords[1])])
+                except ValueError:
+                    continue
+    
+    # Extract web URL from CAP info if available
+    web_url = fields.get('web')
+    web_link = web_url.text if web_url is not None else link
+    
+    # Find web URL from parameters if not found directly
+    if web_link == link and 'link' in parameters:
+        web_link = parameters['link']
+    
+    event = fields.get('event')
+    severity = fields.get('severity')
+    certainty = fields.get('certainty')
+    urgency = fields.get('urgency')
+    
+    return {
+        'title': title,
+        'description': _text(children.get('description')),
+        'pubDate': _text(children.get('pubDate')),
+        'link': link,  # Original link from RSS
+        'webUrl': web_link,  # Web URL for viewing in browser
+        'guid': _text(children.get('guid')),
+        'latitude': float(lat.text) if lat is not None and lat.text else None,
+        'longitude': float(lon.text) if lon is not None and lon.text else None,
+        'eventType': event.text if event is not None else '',
+        'severity': severity.text if severity is not None else '',
+        'certainty': certainty.text if certainty is not None else '',
+        'urgency': urgency.text if urgency is not None else '',
+        'headline': _text(fields.get('headline')) or '',
+        'polygon': polygon_coordinates,
+        'parameters': parameters
+    }
+
+# Shared by all requests served by this process. TTLs are in seconds; set
+# GDACS_FEED_SNAPSHOT to a file path to let cold starts answer from disk.
+FEED_CACHE = FeedCache(
+    GDACS_CAP_URL,
+    parse=iter_gdacs_cap_data,
+    ttl=int(os.getenv('GDACS_FEED_TTL', '300')),
+    stale_ttl=int(os.getenv('GDACS_FEED_STALE_TTL', '86400')),
+    snapshot_path=os.getenv('GDACS_FEED_SNAPSHOT') or None,
+    session=SESSION,
+    timeout=DEFAULT_TIMEOUT,
+    enrich=process_feed,
+)
@@ -0,0 +1,261 @@
+import numpy as np
+
+import metrics
+
+# Mean Earth radius (IUGG) used by the spherical haversine mode
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid used by the ellipsoidal mode (same model as geopy.geodesic)
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B_KM = (1 - WGS84_F) * WGS84_A_KM
+
+# Impact radius per disaster type (km). Earthquakes scale with magnitude.
+DISASTER_RADII_KM = {
+    'tc': 300,  # Tropical Cyclone
+    'fl': 100,  # Flood
+    'vo': 100,  # Volcanic activity
+    'dr': 500,  # Drought (usually affects large areas)
+}
+EQ_KM_PER_MAGNITUDE = 50
+DEFAULT_EQ_MAGNITUDE = 6.0
+MAX_IMPACT_RADIUS_KM = 500
+
+# The haversine distance never deviates from the WGS-84 geodesic by more than
+# ~0.56%, so a 1% margin makes the spherical prefilter of the ellipsoidal mode
+# lossless.
+SPHERICAL_PREFILTER_MARGIN = 1.01
+
+# Upper bound on facility x disaster cells materialised at once
+CHUNK_ELEMENTS = 1 << 20
+
+DISTANCE_METHODS = ('ellipsoidal', 'haversine')
+
+
+def parse_magnitude(title):
+    """Extract the earthquake magnitude from a GDACS title ("... M=6.4, ...")"""
+    title = (title or '').lower()
+    if 'm=' in title:
+        try:
+            return float(title.split('m=')[1].split(',')[0])
+        except ValueError:
+            pass
+    return DEFAULT_EQ_MAGNITUDE
+
+
+def impact_radius(disaster):
+    """Impact radius in km for a disaster, based on its type"""
+    event_type = (disaster.get('eventType') or '').lower()
+    if event_type == 'eq':
+        return parse_magnitude(disaster.get('title')) * EQ_KM_PER_MAGNITUDE
+    return DISASTER_RADII_KM.get(event_type, 0)
+
+
+def disaster_profile(disasters):
+    """
+    Build the radius profile of a disaster list once per request.
+
+    Returns (indices, latitudes, longitudes, radii) as arrays, skipping the
+    disasters without usable coordinates. `indices` point back into `disasters`.
+    """
+    indices, lats, lons, radii = [], [], [], []
+    for i, disaster in enumerate(disasters):
+        lat = disaster.get('latitude')
+        lon = disaster.get('longitude')
+        # Same rule as the original loop: falsy coordinates are skipped
+        if not lat or not lon:
+            continue
+        indices.append(i)
+        lats.append(float(lat))
+        lons.append(float(lon))
+        radii.append(impact_radius(disaster))
+
+    return (
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(lats, dtype=np.float64),
+        np.asarray(lons, dtype=np.float64),
+        np.asarray(radii, dtype=np.float64),
+    )
+
+
+def facility_coordinates(facilities):
+    """Latitude/longitude arrays for a list of facility dicts or a columnar set"""
+    if hasattr(facilities, 'latitude') and hasattr(facilities, 'longitude'):
+        return (np.asarray(facilities.latitude, dtype=np.float64),
+                np.asarray(facilities.longitude, dtype=np.float64))
+
+    lats = np.fromiter((f['latitude'] for f in facilities), dtype=np.float64, count=len(facilities))
+    lons = np.fromiter((f['longitude'] for f in facilities), dtype=np.float64, count=len(facilities))
+    return lats, lons
+
+
+def facility_record(facilities, index):
+    """The facility dict reported for row `index`"""
+    if hasattr(facilities, 'record'):
+        return facilities.record(index)
+    return facilities[index]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km on the mean-radius sphere (broadcasts)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def ellipsoidal_km(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """
+    WGS-84 distance in km using Vincenty's inverse formula (broadcasts).
+
+    Agrees with geopy.distance.geodesic to well under a millimetre. Pairs that
+    do not converge (nearly antipodal points, thousands of km beyond any impact
+    radius) fall back to the haversine distance.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64)
+                                                   for v in (lat1, lon1, lat2, lon2)))
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 +
+                                (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # cos2_alpha is zero on equatorial lines
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0,
+                                    cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < tol
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (WGS84_A_KM ** 2 - WGS84_B_KM ** 2) / WGS84_B_KM ** 2
+        A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distance = WGS84_B_KM * A * (sigma - delta_sigma)
+
+    if not converged.all():
+        distance = np.where(converged, distance, haversine_km(lat1, lon1, lat2, lon2))
+    return distance
+
+
+def pair_distances(fac_lat, fac_lon, dis_lat, dis_lon, radii, method='ellipsoidal'):
+    """
+    Distances for aligned facility/disaster pairs (or one disaster broadcast
+    over many facilities), filtered to the pairs inside `radii`.
+
+    Returns (keep_mask, distance_km) where `distance_km` is aligned with the
+    kept pairs only.
+    """
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Unknown distance method '{method}'")
+
+    distance = haversine_km(fac_lat, fac_lon, dis_lat, dis_lon)
+    metrics.count('pairs_evaluated', distance.size)
+    if method == 'haversine':
+        keep = distance <= radii
+        return keep, distance[keep]
+
+    keep = distance <= radii * SPHERICAL_PREFILTER_MARGIN
+    candidates = np.nonzero(keep)
+    exact = ellipsoidal_km(*(np.broadcast_to(v, keep.shape)[candidates]
+                             for v in (fac_lat, fac_lon, dis_lat, dis_lon)))
+    inside = exact <= np.broadcast_to(radii, keep.shape)[candidates]
+    keep[tuple(axis[~inside] for axis in candidates)] = False
+    return keep, exact[inside]
+
+
+def impact_pairs(fac_lat, fac_lon, dis_lat, dis_lon, radii,
+                 method='ellipsoidal', chunk_elements=CHUNK_ELEMENTS):
+    """
+    Find every (facility, disaster) pair within the disaster's impact radius.
+
+    Works on chunks of facilities so that at most `chunk_elements` distances
+    are held in memory. In ellipsoidal mode the haversine distance is used as
+    a prefilter and Vincenty is only evaluated on the surviving pairs.
+
+    Returns (facility_idx, disaster_idx, distance_km) arrays ordered by
+    facility then disaster. Disaster indices refer to positions in the profile.
+    """
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Unknown distance method '{method}'")
+
+    n_fac, n_dis = len(fac_lat), len(dis_lat)
+    if n_fac == 0 or n_dis == 0:
+        return empty_pairs()
+
+    rows_per_chunk = max(1, chunk_elements // n_dis)
+    fac_parts, dis_parts, dist_parts = [], [], []
+
+    for start in range(0, n_fac, rows_per_chunk):
+        stop = min(start + rows_per_chunk, n_fac)
+        keep, pair_distance = pair_distances(fac_lat[start:stop, None], fac_lon[start:stop, None],
+                                             dis_lat[None, :], dis_lon[None, :], radii[None, :],
+                                             method=method)
+        # np.nonzero walks the mask row-major, i.e. in facility then disaster order
+        rows, cols = np.nonzero(keep)
+        if rows.size == 0:
+            continue
+        fac_parts.append(rows + start)
+        dis_parts.append(cols)
+        dist_parts.append(pair_distance)
+
+    return concat_pairs(fac_parts, dis_parts, dist_parts)
+
+
+def empty_pairs():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+
+def concat_pairs(fac_parts, dis_parts, dist_parts):
+    if not fac_parts:
+        return empty_pairs()
+    return np.concatenate(fac_parts), np.concatenate(dis_parts), np.concatenate(dist_parts)
+
+
+def sort_pairs(fac_idx, dis_idx, distances):
+    """Order pairs by facility then disaster, as the response expects"""
+    order = np.lexsort((dis_idx, fac_idx))
+    return fac_idx[order], dis_idx[order], distances[order]
+
+
+def group_impacts(facilities, disasters, fac_idx, dis_idx, distances):
+    """Build the `impactedFacilities` structure from pairs ordered by facility"""
+    impacted = []
+    if len(fac_idx) == 0:
+        return impacted
+
+    # Boundaries between runs of the same facility
+    breaks = np.flatnonzero(np.diff(fac_idx)) + 1
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(fac_idx)]))
+    dis_idx = dis_idx.tolist()
+    distances = distances.tolist()
+
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        impacted.append({
+            'facility': facility_record(facilities, int(fac_idx[start])),
+            'impacts': [
+                {'disaster': disasters[dis_idx[k]], 'distance': round(distances[k], 2)}
+                for k in range(start, stop)
+            ]
+        })
+    return impacted
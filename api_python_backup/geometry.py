@@ -0,0 +1,245 @@
+import heapq
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from events import version_key
+
+SIMPLIFY_METHODS = ('dp', 'vw')
+GEOMETRY_ENCODINGS = ('none', 'polyline')
+
+# Decimal places of the polyline encoding when no precision is requested
+# (1e-5 degrees is about 1 m)
+POLYLINE_PRECISION = 5
+
+# Processed polygons kept per (event version, options)
+GEOMETRY_CACHE_SIZE = 4096
+
+
+def _planar(coords):
+    """[lat, lon] vertices projected so that one unit is about the same distance either way"""
+    lat, lon = coords[:, 0], coords[:, 1]
+    scale = np.cos(np.radians(lat.mean()))
+    return np.column_stack((lon * scale, lat))
+
+
+def _douglas_peucker_keep(points, tolerance):
+    """
+    Boolean mask of the vertices of an open line kept by Douglas-Peucker.
+
+    All open segments are split in the same vectorized pass, one pass per
+    recursion level, instead of one NumPy call per segment.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    candidates = np.arange(1, len(points) - 1)
+    while candidates.size:
+        anchors = np.flatnonzero(keep)
+        segment = np.searchsorted(anchors, candidates) - 1
+        start = points[anchors[segment]]
+        direction = points[anchors[segment + 1]] - start
+        offset = points[candidates] - start
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        cross = np.abs(direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0])
+        distances = np.where(length > 0, cross / np.where(length > 0, length, 1),
+                             np.hypot(offset[:, 0], offset[:, 1]))
+
+        # Candidates are ordered, so each segment's are one contiguous run
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(segment)) + 1))
+        counts = np.diff(np.append(bounds, candidates.size))
+        seg_max = np.maximum.reduceat(distances, bounds)
+        split = seg_max > tolerance
+
+        # First farthest candidate of every segment that must be split
+        farthest = (distances == np.repeat(seg_max, counts)) & np.repeat(split, counts)
+        _, first = np.unique(segment[farthest], return_index=True)
+        keep[candidates[np.flatnonzero(farthest)[first]]] = True
+
+        open_segment = np.repeat(split, counts)
+        candidates = candidates[open_segment & ~keep[candidates]]
+    return keep
+
+
+def _visvalingam_keep(points, tolerance):
+    """
+    Boolean mask of the vertices of an open line kept by Visvalingam-Whyatt:
+    vertices whose triangle with their neighbours is smaller than
+    tolerance**2 are removed, smallest first
+    """
+    n = len(points)
+    keep = np.ones(n, dtype=bool)
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    min_area = tolerance * tolerance
+    xs, ys = points[:, 0].tolist(), points[:, 1].tolist()
+
+    def area(i):
+        a, c = prev[i], nxt[i]
+        return abs((xs[i] - xs[a]) * (ys[c] - ys[a]) - (xs[c] - xs[a]) * (ys[i] - ys[a])) / 2
+
+    heap = [(area(i), i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    areas = {i: a for a, i in heap}
+    while heap:
+        smallest, i = heapq.heappop(heap)
+        if areas[i] != smallest or not keep[i]:
+            continue  # stale heap entry
+        if smallest >= min_area:
+            break
+        keep[i] = False
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # A neighbour's area never drops below the removed one's
+                areas[j] = max(area(j), smallest)
+                heapq.heappush(heap, (areas[j], j))
+    return keep
+
+
+def simplify_polygon(coordinates, tolerance, method='dp'):
+    """
+    Simplify a CAP polygon ([lat, lon] pairs) with Douglas-Peucker ('dp') or
+    Visvalingam-Whyatt ('vw'). `tolerance` is in degrees of latitude: the
+    maximum deviation for 'dp', the square root of the smallest triangle
+    area kept for 'vw'. Closed rings stay closed and keep at least a triangle.
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f"Unknown simplification method '{method}'")
+    coords = np.asarray(coordinates, dtype=np.float64)
+    if len(coords) < 4 or tolerance <= 0:
+        return coords.tolist()
+
+    points = _planar(coords)
+    closed = np.array_equal(coords[0], coords[-1])
+    simplify = _douglas_peucker_keep if method == 'dp' else _visvalingam_keep
+    if closed:
+        # Split the ring at the vertex farthest from its start, so both halves
+        # are open lines with distinct ends
+        far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        keep = np.concatenate((simplify(points[:far + 1], tolerance)[:-1],
+                               simplify(points[far:], tolerance)))
+        if keep.sum() < 4:
+            return coords.tolist()
+    else:
+        keep = simplify(points, tolerance)
+    return coords[keep].tolist()
+
+
+def quantize(coordinates, precision):
+    """Round coordinates to `precision` decimal places, dropping repeated vertices"""
+    coords = np.round(np.asarray(coordinates, dtype=np.float64), precision)
+    if len(coords) > 1:
+        repeated = np.all(coords[1:] == coords[:-1], axis=1)
+        coords = coords[np.concatenate(([True], ~repeated))]
+    return coords.tolist()
+
+
+def encode_polyline(coordinates, precision=POLYLINE_PRECISION):
+    """
+    Encode [lat, lon] pairs in the Encoded Polyline format: coordinates are
+    scaled to integers, delta-encoded against the previous vertex, and each
+    delta written as a zigzag varint of 5-bit groups in printable ASCII
+    """
+    if not len(coordinates):
+        return ''
+    scaled = np.round(np.asarray(coordinates, dtype=np.float64) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+
+    chars = []
+    for value in zigzag:
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """[lat, lon] pairs of an Encoded Polyline string"""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return (coords / 10 ** precision).tolist()
+
+
+def polygon_coordinates(disaster):
+    """A disaster's polygon as [lat, lon] pairs, whether plain or polyline-encoded"""
+    if disaster.get('polygon'):
+        return disaster['polygon']
+    if disaster.get('polygonEncoded'):
+        return decode_polyline(disaster['polygonEncoded'], disaster.get('polygonPrecision', POLYLINE_PRECISION))
+    return []
+
+
+class GeometryProcessor:
+    """
+    Applies simplification, quantization and encoding to the polygons of feed
+    disasters. Results are cached per event version (events.version_key) and
+    options, so each polygon is processed once however many requests ask.
+    Polygons of events without a key are processed every time.
+    """
+
+    def __init__(self, max_entries=GEOMETRY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def process(self, disasters, tolerance=0, method='dp', precision=None, encoding='none'):
+        """
+        Copies of `disasters` with processed polygons. With encoding='polyline'
+        the 'polygon' list is replaced by 'polygonEncoded' / 'polygonPrecision'.
+        """
+        if method not in SIMPLIFY_METHODS:
+            raise ValueError(f"Unknown simplification method '{method}'")
+        if encoding not in GEOMETRY_ENCODINGS:
+            raise ValueError(f"Unknown geometry encoding '{encoding}'")
+        if not tolerance and precision is None and encoding == 'none':
+            return disasters
+
+        options = (tolerance, method if tolerance else None, precision, encoding)
+        processed = []
+        for disaster in disasters:
+            polygon = disaster.get('polygon') or []
+            if not polygon:
+                processed.append(disaster)
+                continue
+            version = version_key(disaster)
+            key = (version, len(polygon), options)
+            with self._lock:
+                fields = self._cache.get(key) if version is not None else None
+                if fields is not None:
+                    self._cache.move_to_end(key)
+            if fields is None:
+                fields = self._process_polygon(polygon, tolerance, method, precision, encoding)
+                if version is not None:
+                    with self._lock:
+                        self._cache[key] = fields
+                        while len(self._cache) > self.max_entries:
+                            self._cache.popitem(last=False)
+
+            disaster = dict(disaster)
+            if encoding == 'polyline':
+                del disaster['polygon']
+            disaster.update(fields)
+            processed.append(disaster)
+        return processed
+
+    @staticmethod
+    def _process_polygon(polygon, tolerance, method, precision, encoding):
+        coords = simplify_polygon(polygon, tolerance, method) if tolerance else polygon
+        if encoding == 'polyline':
+            precision = POLYLINE_PRECISION if precision is None else precision
+            return {'polygonEncoded': encode_polyline(coords, precision), 'polygonPrecision': precision}
+        if precision is not None:
+            coords = quantize(coords, precision)
+        return {'polygon': coords}
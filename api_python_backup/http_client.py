@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Seconds to establish a connection / to wait between bytes of a response.
+# Without a read timeout one stalled upstream can hold a worker forever.
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Keep-alive connections kept per upstream host, and concurrent fetches
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+FETCH_WORKERS = int(os.getenv('HTTP_FETCH_WORKERS', '8'))
+
+USER_AGENT = 'GDACS-Facilities-Impact-Tool'
+
+
+def make_session(pool_size=POOL_SIZE, retries=2):
+    """
+    requests.Session with pooled keep-alive connections, compressed transfer
+    and retries (with backoff) of failed connects and 502/503/504 answers
+    to idempotent requests
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate'})
+    return session
+
+
+# Shared by every upstream call made by this process
+SESSION = make_session()
+
+
+def get_json(url, params=None, timeout=DEFAULT_TIMEOUT, session=None):
+    response = (session or SESSION).get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_concurrently(tasks, max_workers=FETCH_WORKERS):
+    """
+    Run {name: callable} on a thread pool and return {name: result}. A task
+    that raised maps to its exception instead, so one failed upstream does
+    not lose the others' results.
+    """
+    results = {}
+    if not tasks:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as pool:
+        futures = {name: pool.submit(task) for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+    return results
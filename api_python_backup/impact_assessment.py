@@ -1,11 +1,41 @@
-from http.server import BaseHTTPRequestHandler
 import json
 import os
-from geopy.distance import geodesic
-import pandas as pd
-from io import StringIO
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
 
-class handler(BaseHTTPRequestHandler):
+import metrics
+from alert_store import open_store, window_options
+from facility_ingest import read_facilities
+from facility_registry import FacilityRegistry
+from impact_format import RESPONSE_FORMATS, compact_from_grouped, compact_impacts
+from metrics import InstrumentedHandler
+from geo_engine import (
+    concat_pairs,
+    disaster_profile,
+    facility_coordinates,
+    group_impacts,
+    impact_pairs,
+    sort_pairs,
+)
+from parallel_impact import PARALLEL_MIN_FACILITIES, default_workers, parallel_impact_pairs
+from polygon_index import disaster_polygons, polygon_impact_pairs
+from spatial_index import INDEX_MIN_PAIRS, FacilityGrid, indexed_impact_pairs
+
+IMPACT_MODES = ('radius', 'polygon')
+
+# Incremental assessors kept warm between requests, most recently used last
+MAX_INCREMENTAL_ASSESSORS = 8
+_incremental_assessors = OrderedDict()
+_incremental_lock = threading.Lock()
+
+# Facility sets uploaded once with registerFacilities and referenced later by
+# facilitySetId. Point FACILITY_REGISTRY_DIR at storage shared by all workers.
+FACILITY_REGISTRY = FacilityRegistry(os.getenv(
+    'FACILITY_REGISTRY_DIR', os.path.join(tempfile.gettempdir(), 'gdacs_facility_registry')))
+
+class handler(InstrumentedHandler):
     def do_POST(self):
         # Get content length
         content_length = int(self.headers['Content-Length'])
@@ -13,45 +43,73 @@ class handler(BaseHTTPRequestHandler):
         
         try:
             # Parse the JSON data
-            data = json.loads(post_data)
+            with metrics.span('request_parse'):
+                data = json.loads(post_data)
             facilities_csv = data.get('facilities', '')
             disasters = data.get('disasters', [])
+            impact_mode = data.get('impactMode', 'radius')
+            incremental = data.get('incremental', False)
+            response_format = data.get('format', 'full')
+            if response_format not in RESPONSE_FORMATS:
+                raise ValueError(f"Unknown response format '{response_format}'")
             
-            # Process the CSV data
+            # Process the CSV (or base64 Parquet/Arrow) data into columns, or
+            # reuse a facility set registered by an earlier request
             facilities = []
-            if facilities_csv:
-                csv_io = StringIO(facilities_csv)
-                df = pd.read_csv(csv_io)
-                
-                for _, row in df.iterrows():
-                    facilities.append({
-                        'name': row['name'],
-                        'latitude': row['latitude'],
-                        'longitude': row['longitude']
-                    })
+            with metrics.span('facility_parse'):
+                if data.get('facilitySetId'):
+                    facilities = FACILITY_REGISTRY.open(data['facilitySetId'])
+                elif facilities_csv:
+                    facilities = read_facilities(facilities_csv, data.get('facilitiesFormat', 'csv'))
+            metrics.count('facilities', len(facilities))
+            
+            response = {}
+            if data.get('registerFacilities'):
+                response['facilitySetId'] = FACILITY_REGISTRY.register(facilities)
+            
+            # Assess against a window of the alert history instead of the
+            # disasters sent with the request
+            if data.get('history') is not None:
+                with metrics.span('history_query'):
+                    disasters = open_store().query(**window_options(data['history']))
+                response['historyEvents'] = len(disasters)
             
             # Assess impact
-            impacted_facilities = assess_impact(facilities, disasters)
+            if incremental:
+                assessor = incremental_assessor(facilities, mode=impact_mode, session=data.get('sessionId'))
+                with metrics.span('distance'):
+                    response['impactedFacilities'], response['delta'] = assessor.update(disasters)
+                if response_format == 'compact':
+                    response['impactedFacilities'] = compact_from_grouped(response['impactedFacilities'])
+            else:
+                response['impactedFacilities'] = assess_impact(facilities, disasters, mode=impact_mode,
+                                                               response_format=response_format)
+            if response_format != 'full':
+                response['format'] = response_format
             
             # Send response
+            with metrics.span('response_serialize'):
+                body = json.dumps(response).encode()
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'impactedFacilities': impacted_facilities
-            }).encode())
+            self.wfile.write(body)
             
         except Exception as e:
+            body = json.dumps({
+                'error': str(e)
+            }).encode()
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'error': str(e)
-            }).encode())
+            self.wfile.write(body)
             
         return
 
-def assess_impact(facilities, disasters):
+def assess_impact(facilities, disasters, method='ellipsoidal', use_index=None, mode='radius', workers=None,
+                  response_format='full'):
     """
     Assess which facilities are impacted by disasters
     
@@ -61,60 +119,106 @@ def assess_impact(facilities, disasters):
     - Flood: medium radius (100km)
     - Volcanic Activity: medium radius (100km)
     - Drought: large radius (regional/no distance check)
+    
+    With mode='polygon', disasters that carry a CAP area polygon impact the
+    facilities inside the polygon instead; the radius model remains the
+    fallback for disasters without one.
+    
+    Distances are computed for all pairs at once with NumPy (see geo_engine).
+    `method` selects the distance model:
+    - 'ellipsoidal' (default): WGS-84 geodesic, matches geopy.geodesic to
+      well under 1 m, so reported distances are identical after rounding
+    - 'haversine': spherical approximation, faster, within ~0.5% of geodesic
+    
+    With `use_index` the facilities are bucketed in a lat/lon grid and only
+    those near each disaster are measured. By default the grid is used once
+    the number of facility x disaster pairs makes it worthwhile.
+    
+    With `workers` > 1 (default: IMPACT_WORKERS) large facility sets are
+    sharded across a process pool, see parallel_impact.
+    
+    response_format='compact' returns the columnar structure described in
+    impact_format.compact_impacts instead of the list of facility entries.
     """
-    impacted = []
+    group = compact_impacts if response_format == 'compact' else group_impacts
+    fac_lat, fac_lon = facility_coordinates(facilities)
     
-    for facility in facilities:
-        facility_location = (facility['latitude'], facility['longitude'])
-        facility_impacts = []
-        
-        for disaster in disasters:
-            if not disaster['latitude'] or not disaster['longitude']:
-                continue
-                
-            disaster_location = (disaster['latitude'], disaster['longitude'])
-            distance = geodesic(facility_location, disaster_location).kilometers
-            
-            # Determine impact radius based on disaster type
-            impact_radius = 0
-            
-            if disaster['eventType'].lower() == 'eq':  # Earthquake
-                # Extract magnitude from title or description
-                magnitude = 6.0  # Default magnitude if not found
-                title = disaster['title'].lower()
-                if 'm=' in title:
-                    try:
-                        magnitude = float(title.split('m=')[1].split(',')[0])
-                    except:
-                        pass
-                
-                # Adjust radius based on magnitude (approximation)
-                impact_radius = magnitude * 50  # km
-                
-            elif disaster['eventType'].lower() == 'tc':  # Tropical Cyclone
-                impact_radius = 300  # km
-                
-            elif disaster['eventType'].lower() == 'fl':  # Flood
-                impact_radius = 100  # km
-                
-            elif disaster['eventType'].lower() == 'vo':  # Volcanic activity
-                impact_radius = 100  # km
-                
-            elif disaster['eventType'].lower() == 'dr':  # Drought
-                impact_radius = 500  # km (drought usually affects large areas)
-            
-            # Check if facility is within impact radius
-            if distance <= impact_radius:
-                facility_impacts.append({
-                    'disaster': disaster,
-                    'distance': round(distance, 2)
-                })
-        
-        # If facility has impacts, add to the impacted list
-        if facility_impacts:
-            impacted.append({
-                'facility': facility,
-                'impacts': facility_impacts
-            })
+    if workers is None:
+        workers = default_workers()
+    with metrics.span('distance'):
+        if workers > 1 and len(fac_lat) >= PARALLEL_MIN_FACILITIES:
+            fac_idx, dis_idx, distances = parallel_impact_pairs(fac_lat, fac_lon, disasters, workers,
+                                                                method=method, mode=mode)
+        else:
+            # Registered facility sets carry a prebuilt grid
+            grid = facilities.grid() if hasattr(facilities, 'grid') and use_index is not False else None
+            fac_idx, dis_idx, distances = impact_pairs_for(fac_lat, fac_lon, disasters, method=method,
+                                                           use_index=use_index, mode=mode, grid=grid)
+    metrics.count('impacts', len(fac_idx))
+    
+    with metrics.span('response_build'):
+        return group(facilities, disasters, fac_idx, dis_idx, distances)
+
+def assess_history(facilities, store=None, start=None, end=None, bbox=None, event_types=None, alert_levels=None,
+                   **kwargs):
+    """
+    assess_impact() against the alerts stored for a time window (epoch
+    seconds), optionally limited to a bbox, event types and alert levels;
+    each event is assessed with its latest version in the window.
+    """
+    store = store if store is not None else open_store()
+    disasters = store.query(start=start, end=end, bbox=bbox, event_types=event_types, alert_levels=alert_levels)
+    return assess_impact(facilities, disasters, **kwargs)
+
+def incremental_assessor(facilities, method='ellipsoidal', mode='radius', session=None):
+    """
+    The IncrementalImpactAssessor for this facility set, reused across
+    requests from the same process so only feed changes are recomputed.
+    Clients that pass their own `session` get deltas against their own
+    previous feed; without one, clients of the same facility set share it.
+    """
+    from incremental_impact import IncrementalImpactAssessor, facility_set_key
+    
+    key = (facility_set_key(facilities), method, mode, session)
+    with _incremental_lock:
+        assessor = _incremental_assessors.pop(key, None)
+        if assessor is None:
+            assessor = IncrementalImpactAssessor(facilities, method=method, mode=mode)
+        _incremental_assessors[key] = assessor
+        while len(_incremental_assessors) > MAX_INCREMENTAL_ASSESSORS:
+            _incremental_assessors.popitem(last=False)
+    return assessor
+
+def impact_pairs_for(fac_lat, fac_lon, disasters, method='ellipsoidal', use_index=None, mode='radius', grid=None):
+    """
+    (facility_idx, disaster_idx, distance_km) arrays of every impact, ordered
+    by facility then disaster. Indices point into the facility arrays and into
+    `disasters`. A prebuilt `grid` over the facilities may be passed in.
+    """
+    if mode not in IMPACT_MODES:
+        raise ValueError(f"Unknown impact mode '{mode}'")
+    
+    dis_indices, dis_lat, dis_lon, radii = disaster_profile(disasters)
+    
+    polygons = disaster_polygons(disasters) if mode == 'polygon' else {}
+    if polygons:
+        radius_only = ~np.isin(dis_indices, list(polygons))
+        dis_indices, dis_lat, dis_lon, radii = (a[radius_only] for a in (dis_indices, dis_lat, dis_lon, radii))
+    
+    if grid is None:
+        if use_index is None:
+            use_index = len(fac_lat) * (len(dis_lat) + len(polygons)) >= INDEX_MIN_PAIRS
+        grid = FacilityGrid(fac_lat, fac_lon) if use_index else None
+    
+    if grid is not None:
+        fac_idx, profile_idx, distances = indexed_impact_pairs(grid, dis_lat, dis_lon, radii, method=method)
+    else:
+        fac_idx, profile_idx, distances = impact_pairs(fac_lat, fac_lon, dis_lat, dis_lon, radii, method=method)
+    dis_idx = dis_indices[profile_idx]
+    
+    if polygons:
+        polygon_pairs = polygon_impact_pairs(fac_lat, fac_lon, disasters, polygons, grid=grid, method=method)
+        fac_idx, dis_idx, distances = sort_pairs(*concat_pairs(
+            [fac_idx, polygon_pairs[0]], [dis_idx, polygon_pairs[1]], [distances, polygon_pairs[2]]))
     
-    return impacted
\ No newline at end of file
+    return fac_idx, dis_idx, distances
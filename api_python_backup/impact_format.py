@@ -0,0 +1,103 @@
+import numpy as np
+
+from events import version_key
+from geo_engine import facility_record
+
+# 'full' embeds facility and disaster dicts in every entry; 'compact' is columnar
+RESPONSE_FORMATS = ('full', 'compact')
+
+
+def _table_key(disaster, fallback):
+    # Versions of one event (history queries with versions=all) stay distinct rows
+    return version_key(disaster) or fallback
+
+
+def _facility_columns(records):
+    """Column per facility field (union of keys, first-seen order), None where missing"""
+    keys = {}
+    for record in records:
+        for key in record:
+            keys.setdefault(key, None)
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def compact_impacts(facilities, disasters, fac_idx, dis_idx, distances):
+    """
+    Compact `impactedFacilities` from impact pairs ordered by facility:
+
+        {
+            'disasters': [disaster, ...],             # each version once, deduplicated by event + pubDate
+            'facilities': {'name': [...], ...},       # one column per facility field
+            'impacts': {
+                'facility': [...], 'disaster': [...],  # row indexes into the two tables
+                'distance': [...]
+            }
+        }
+
+    Only disasters and facilities that take part in an impact are included.
+    """
+    if len(fac_idx) == 0:
+        return {'disasters': [], 'facilities': {}, 'impacts': {'facility': [], 'disaster': [], 'distance': []}}
+
+    # Disaster table: referenced disasters in order of first reference, one row per event version
+    referenced, first = np.unique(dis_idx, return_index=True)
+    table, rows = [], {}
+    lookup = np.empty(len(disasters), dtype=np.int64)
+    for i in referenced[np.argsort(first, kind='stable')].tolist():
+        key = _table_key(disasters[i], i)
+        if key not in rows:
+            rows[key] = len(table)
+            table.append(disasters[i])
+        lookup[i] = rows[key]
+
+    # fac_idx is sorted, so its unique values are the facility rows in order
+    fac_rows, fac_pos = np.unique(fac_idx, return_inverse=True)
+    records = [facility_record(facilities, i) for i in fac_rows.tolist()]
+
+    return {
+        'disasters': table,
+        'facilities': _facility_columns(records),
+        'impacts': {
+            'facility': fac_pos.tolist(),
+            'disaster': lookup[dis_idx].tolist(),
+            'distance': [round(d, 2) for d in distances.tolist()],
+        }
+    }
+
+
+def compact_from_grouped(impacted_facilities):
+    """The compact format for an existing full-format `impactedFacilities` list"""
+    table, rows, records = [], {}, []
+    impact_fac, impact_dis, impact_dist = [], [], []
+    for impact in impacted_facilities:
+        row = len(records)
+        records.append(impact['facility'])
+        for disaster_impact in impact['impacts']:
+            disaster = disaster_impact['disaster']
+            key = _table_key(disaster, id(disaster))
+            if key not in rows:
+                rows[key] = len(table)
+                table.append(disaster)
+            impact_fac.append(row)
+            impact_dis.append(rows[key])
+            impact_dist.append(disaster_impact['distance'])
+
+    return {
+        'disasters': table,
+        'facilities': _facility_columns(records),
+        'impacts': {'facility': impact_fac, 'disaster': impact_dis, 'distance': impact_dist}
+    }
+
+
+def expand_compact(compact):
+    """Full-format `impactedFacilities` from the compact format, for Python clients"""
+    columns = compact['facilities']
+    keys = list(columns)
+    impacted = []
+    impacts = compact['impacts']
+    for fac_row, dis_row, distance in zip(impacts['facility'], impacts['disaster'], impacts['distance']):
+        if not impacted or impacted[-1][0] != fac_row:
+            facility = {key: columns[key][fac_row] for key in keys if columns[key][fac_row] is not None}
+            impacted.append((fac_row, {'facility': facility, 'impacts': []}))
+        impacted[-1][1]['impacts'].append({'disaster': compact['disasters'][dis_row], 'distance': distance})
+    return [entry for _, entry in impacted]
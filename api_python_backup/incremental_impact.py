@@ -0,0 +1,140 @@
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+from events import event_key
+from geo_engine import facility_coordinates, facility_record, group_impacts, sort_pairs
+from impact_assessment import impact_pairs_for
+from parallel_impact import PARALLEL_MIN_FACILITIES, default_workers, parallel_impact_pairs
+from spatial_index import INDEX_MIN_PAIRS, FacilityGrid
+
+# Disaster fields that influence which facilities an event impacts
+VERSION_FIELDS = ('pubDate', 'eventType', 'title', 'latitude', 'longitude', 'polygon', 'polygonEncoded')
+
+
+def disaster_version(disaster):
+    """Fingerprint that changes whenever the event's impact footprint may change"""
+    payload = json.dumps([disaster.get(field) for field in VERSION_FIELDS], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def facility_set_key(facilities):
+    """Identity of a facility set: the names and coordinates of all its rows"""
+    if hasattr(facilities, 'set_id'):
+        return facilities.set_id
+    lat, lon = facility_coordinates(facilities)
+    digest = hashlib.sha1(lat.tobytes())
+    digest.update(lon.tobytes())
+    if hasattr(facilities, 'name'):
+        names = facilities.name
+    else:
+        names = (facility.get('name') for facility in facilities)
+    for name in names:
+        digest.update(str(name).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class IncrementalImpactAssessor:
+    """
+    Keeps the impacts of the last feed, indexed by disaster guid, for a fixed
+    facility set. `update` only computes impacts for events that were added
+    or changed since the previous call and drops the removed ones, so refresh
+    cost follows feed churn rather than feed size. Concurrent updates are
+    applied one at a time.
+    """
+
+    def __init__(self, facilities, method='ellipsoidal', mode='radius', workers=None):
+        self.facilities = facilities
+        self.method = method
+        self.mode = mode
+        self.workers = default_workers() if workers is None else workers
+        self.fac_lat, self.fac_lon = facility_coordinates(facilities)
+        self._grid = None
+        # disaster key -> {'version', 'facilities', 'distances'}
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def _grid_for(self, n_disasters):
+        # Registered facility sets carry a prebuilt grid, shared with assess_impact
+        if hasattr(self.facilities, 'grid'):
+            return self.facilities.grid()
+        if self._grid is None and len(self.fac_lat) * n_disasters >= INDEX_MIN_PAIRS:
+            self._grid = FacilityGrid(self.fac_lat, self.fac_lon)
+        return self._grid
+
+    def _impact_pairs(self, disasters):
+        if self.workers > 1 and len(self.fac_lat) >= PARALLEL_MIN_FACILITIES:
+            return parallel_impact_pairs(self.fac_lat, self.fac_lon, disasters, self.workers,
+                                         method=self.method, mode=self.mode)
+        return impact_pairs_for(self.fac_lat, self.fac_lon, disasters, method=self.method, mode=self.mode,
+                                grid=self._grid_for(len(disasters)))
+
+    def update(self, disasters):
+        """
+        Apply a new feed snapshot. Returns the merged `impactedFacilities`
+        (same structure as assess_impact) and a delta describing what changed.
+        """
+        with self._lock:
+            return self._update(disasters)
+
+    def _update(self, disasters):
+        # Last occurrence wins when the feed repeats an event
+        current = {}
+        for i, disaster in enumerate(disasters):
+            current[event_key(disaster) or f'#{i}'] = i
+
+        changed = [key for key, i in current.items()
+                   if self._events.get(key, {}).get('version') != disaster_version(disasters[i])]
+        removed = [key for key in self._events if key not in current]
+        previously_impacted = self._impacted_facilities()
+
+        for key in removed:
+            del self._events[key]
+
+        if changed:
+            changed_disasters = [disasters[current[key]] for key in changed]
+            fac_idx, dis_idx, distances = self._impact_pairs(changed_disasters)
+            # Regroup the facility-ordered pairs by event
+            order = np.argsort(dis_idx, kind='stable')
+            fac_idx, dis_idx, distances = fac_idx[order], dis_idx[order], distances[order]
+            bounds = np.searchsorted(dis_idx, np.arange(len(changed) + 1))
+            for j, key in enumerate(changed):
+                self._events[key] = {
+                    'version': disaster_version(changed_disasters[j]),
+                    'facilities': fac_idx[bounds[j]:bounds[j + 1]],
+                    'distances': distances[bounds[j]:bounds[j + 1]],
+                }
+
+        impacted_now = self._impacted_facilities()
+        delta = {
+            'addedDisasters': [key for key in changed if key not in previously_impacted['keys']],
+            'updatedDisasters': [key for key in changed if key in previously_impacted['keys']],
+            'removedDisasters': removed,
+            'newlyImpacted': [facility_record(self.facilities, i)
+                              for i in sorted(impacted_now['facilities'] - previously_impacted['facilities'])],
+            'noLongerImpacted': [facility_record(self.facilities, i)
+                                 for i in sorted(previously_impacted['facilities'] - impacted_now['facilities'])],
+        }
+        return self._merged(disasters, current), delta
+
+    def _impacted_facilities(self):
+        facilities = set()
+        for event in self._events.values():
+            facilities.update(event['facilities'].tolist())
+        return {'keys': set(self._events), 'facilities': facilities}
+
+    def _merged(self, disasters, current):
+        fac_parts, dis_parts, dist_parts = [], [], []
+        for key, i in current.items():
+            event = self._events[key]
+            fac_parts.append(event['facilities'])
+            dis_parts.append(np.full(len(event['facilities']), i, dtype=np.int64))
+            dist_parts.append(event['distances'])
+        if not fac_parts:
+            return []
+        fac_idx, dis_idx, distances = sort_pairs(np.concatenate(fac_parts), np.concatenate(dis_parts),
+                                                 np.concatenate(dist_parts))
+        return group_impacts(self.facilities, disasters, fac_idx, dis_idx, distances)
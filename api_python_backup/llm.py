@@ -0,0 +1,218 @@
+import os
+import random
+import threading
+import time
+
+import metrics
+from llm_cache import ResponseCache, cache_key
+
+
+def load_env():
+    """
+    Load the nearest .env file above this module into os.environ, like
+    dotenv.load_dotenv(). python-dotenv is only imported when there is one.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+
+# Load environment variables
+load_env()
+
+_openai_module = None
+
+
+def _openai():
+    """
+    The openai package, imported on first use: it takes longer to import
+    than everything else a cold handler loads. OPENAI_API_BASE (read by the
+    openai package) can point the client at a local stub server.
+    """
+    global _openai_module
+    if _openai_module is None:
+        import openai
+        # Set up OpenAI API key unless the caller already configured one
+        if not openai.api_key:
+            openai.api_key = os.getenv("OPENAI_API_KEY")
+        _openai_module = openai
+    return _openai_module
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Completions keyed on the normalized prompt, model, sampling settings and the
+# versions of the GDACS events involved. LLM_CACHE_DIR adds a disk tier, capped
+# at LLM_CACHE_DISK_MAX_BYTES (default: the memory tier's LLM_CACHE_MAX_BYTES).
+RESPONSE_CACHE = ResponseCache(
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=int(os.getenv("LLM_CACHE_TTL", str(6 * 3600))),
+    disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", "0")) or None,
+)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+metrics.REGISTRY.register_collector(lambda: {
+    f'llm_cache_{name}': value for name, value in RESPONSE_CACHE.stats().items() if name in ('entries', 'bytes')
+})
+
+# Errors worth retrying: throttling, timeouts and upstream/server failures
+RETRYABLE_ERRORS = {
+    'RateLimitError', 'Timeout', 'APITimeoutError', 'APIConnectionError',
+    'ServiceUnavailableError', 'APIError', 'InternalServerError', 'TryAgain',
+}
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second (bursts up to `burst`)"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def estimate_prompt_tokens(messages):
+    """Rough prompt size (~4 characters per token) for when the API reports no usage"""
+    return sum(len(message.get('content') or '') for message in messages) // 4 + 1
+
+
+def chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=1000,
+                    retries=3, backoff=1.0, rate_limiter=None, cache_events=None):
+    """
+    Text of a chat completion, retried with exponential backoff (plus jitter)
+    on throttling and transient upstream errors.
+    
+    Answers are served from RESPONSE_CACHE when an identical request was made
+    for the same versions of `cache_events` (the disasters in the prompt).
+    """
+    key = None
+    if LLM_CACHE_ENABLED:
+        key = cache_key(messages, model, temperature, max_tokens, cache_events)
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            metrics.count('llm_cache_hits')
+            return cached
+        metrics.count('llm_cache_misses')
+    
+    text = _create_completion(messages, model, temperature, max_tokens, retries, backoff, rate_limiter)
+    if key is not None:
+        RESPONSE_CACHE.put(key, text)
+    return text
+
+
+def _create_completion(messages, model, temperature, max_tokens, retries, backoff, rate_limiter):
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        metrics.count('llm_calls')
+        try:
+            with metrics.span('llm_completion'):
+                response = _openai().ChatCompletion.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            usage = response.get('usage') or {}
+            metrics.count('prompt_tokens', usage.get('prompt_tokens') or estimate_prompt_tokens(messages))
+            metrics.count('completion_tokens', usage.get('completion_tokens', 0))
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay / 2))
+
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=1000,
+                           retries=3, backoff=1.0, rate_limiter=None, cache_events=None):
+    """
+    Generator of a chat completion's text as it is produced. Only opening the
+    stream is retried; once tokens have been yielded an error is raised to
+    the caller. A cached answer is yielded whole, and a completed stream is
+    cached like chat_completion's result. Closing the generator early closes
+    the upstream connection.
+    """
+    key = None
+    if LLM_CACHE_ENABLED:
+        key = cache_key(messages, model, temperature, max_tokens, cache_events)
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            metrics.count('llm_cache_hits')
+            yield cached
+            return
+        metrics.count('llm_cache_misses')
+    
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        metrics.count('llm_calls')
+        start = time.perf_counter()
+        try:
+            response = _openai().ChatCompletion.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            break
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay / 2))
+    
+    parts = []
+    try:
+        for chunk in response:
+            text = chunk.choices[0].delta.get('content') if chunk.choices else None
+            if text:
+                # The buffered API strips the answer; drop leading whitespace to match
+                if not parts:
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                if not parts:
+                    metrics.record('llm_first_token', time.perf_counter() - start)
+                parts.append(text)
+                yield text
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    
+    # Streamed chunks carry no usage; each content chunk is about one token
+    metrics.record('llm_stream', time.perf_counter() - start)
+    metrics.count('prompt_tokens', estimate_prompt_tokens(messages))
+    metrics.count('completion_tokens', len(parts))
+    
+    if key is not None:
+        RESPONSE_CACHE.put(key, ''.join(parts).strip())
@@ -0,0 +1,188 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from events import version_key
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(text):
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+def event_versions(disasters):
+    """Sorted version keys (see events.version_key) of the events a prompt was built from"""
+    return sorted({key for key in map(version_key, disasters or []) if key is not None})
+
+
+def cache_key(messages, model, temperature, max_tokens, events=None):
+    """
+    Content address of a completion request. The versions of the underlying
+    GDACS events are part of the key, so a new pubDate for any of them misses.
+    """
+    payload = json.dumps({
+        'messages': [[m.get('role'), normalize_prompt(m.get('content'))] for m in messages],
+        'model': model,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'events': event_versions(events),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of LLM responses: an in-process LRU bounded by the total
+    size of the cached text, backed by an optional on-disk tier shared by
+    every process pointing at the same directory. Entries expire after `ttl`
+    seconds. The disk tier is bounded by `disk_max_bytes` (by default the
+    same as the memory tier): once this process has written past it, the
+    oldest entries are swept away.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=6 * 3600, disk_dir=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = max_bytes if disk_max_bytes is None else disk_max_bytes
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        # Bytes on disk as of the last sweep plus this process's writes since;
+        # unknown until the first write sweeps
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._stats = {'hits': 0, 'diskHits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                       'diskEvictions': 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[0]
+                self._remove(key)
+                self._stats['expirations'] += 1
+
+        value, expires_at = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['diskHits'] += 1
+            self._store(key, value, expires_at)
+        return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        self._write_disk(key, value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None, None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        if entry.get('expiresAt', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None, None
+        return entry.get('value'), entry['expiresAt']
+
+    def _write_disk(self, key, value, expires_at):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'value': value, 'expiresAt': expires_at}, f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Error writing LLM cache entry: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            sweep = self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes
+        if sweep:
+            self.sweep_disk()
+
+    def sweep_disk(self):
+        """
+        Delete the oldest disk entries (expired ones are always the oldest,
+        the TTL being fixed) until the tier is at most 3/4 of disk_max_bytes,
+        so sweeps are not repeated on every write. Returns the number deleted.
+        """
+        if not self.disk_dir or not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            entries = []
+            for path in glob.glob(os.path.join(self.disk_dir, '*', '*.json')):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            if total > self.disk_max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.disk_max_bytes * 3 // 4:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    removed += 1
+            with self._lock:
+                self._disk_bytes = total
+                self._stats['diskEvictions'] += removed
+            return removed
+        finally:
+            self._sweep_lock.release()
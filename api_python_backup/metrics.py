@@ -0,0 +1,272 @@
+"""
+Per-stage timing spans and counters, exported in the Prometheus text format
+and, optionally, as one structured log line per request.
+
+Instrumentation is off unless GDACS_METRICS=1. Disabled, span() returns a
+shared no-op context manager and count() returns immediately, so the calls
+can stay in the request path. GDACS_METRICS_LOG=1 additionally prints a JSON
+line per request with its route, status, duration, stage timings and
+counters.
+"""
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+ENABLED = os.getenv('GDACS_METRICS', '0') == '1'
+LOG_REQUESTS = os.getenv('GDACS_METRICS_LOG', '0') == '1'
+
+PREFIX = 'gdacs_'
+
+# Histogram bucket bounds in seconds, from a cached feed hit to an LLM call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Help text of the metrics the handlers record; others are exported without
+HELP = {
+    'stage_duration_seconds': 'Time spent in each request stage',
+    'request_duration_seconds': 'Time to serve a request, by route',
+    'requests_total': 'Requests served, by route and status',
+    'feed_items': 'Items in the cached GDACS feed',
+    'feed_items_parsed_total': 'Items parsed from upstream GDACS feeds',
+    'feed_cache_hits_total': 'Feed requests answered from the feed cache (fresh or stale)',
+    'feed_cache_misses_total': 'Feed requests that waited for an upstream fetch',
+    'facilities_total': 'Facilities received by impact assessments',
+    'pairs_evaluated_total': 'Facility x disaster pairs whose distance or containment was computed in-process',
+    'impacts_total': 'Facility x disaster impacts found',
+    'prompt_tokens_total': 'Prompt tokens sent to the LLM (estimated for streamed completions)',
+    'completion_tokens_total': 'Completion tokens returned by the LLM',
+    'llm_calls_total': 'LLM completion requests, retries included',
+    'llm_cache_hits_total': 'LLM completions answered from the response cache',
+    'llm_cache_misses_total': 'LLM completions not found in the response cache',
+    'alert_versions_stored_total': 'Alert versions appended to the alert history store',
+}
+
+
+class Registry:
+    """Thread-safe counters, gauges and histograms keyed by name and labels"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, labels=()):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def register_collector(self, collect):
+        """`collect()` returns {gauge name: value}, read at every export"""
+        self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+        for collect in self._collectors:
+            try:
+                gauges.update(((name, ()), value) for name, value in collect().items())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+
+        lines = []
+        for kind, samples in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in samples}):
+                _header(lines, name, kind)
+                for (sample_name, labels), value in sorted(samples.items()):
+                    if sample_name == name:
+                        lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+
+        for name in sorted({name for name, _ in histograms}):
+            _header(lines, name, 'histogram')
+            for (sample_name, labels), (counts, total, count) in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+
+# Request being served by the current thread (see InstrumentedHandler)
+_local = threading.local()
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def configure(enabled=None, log_requests=None):
+    """Switch instrumentation and request logs on or off at run time"""
+    global ENABLED, LOG_REQUESTS
+    if enabled is not None:
+        ENABLED = enabled
+    if log_requests is not None:
+        LOG_REQUESTS = log_requests
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def span(stage):
+    """Context manager timing one stage: `with metrics.span('csv_parse'): ...`"""
+    if not ENABLED:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+def record(stage, seconds):
+    """Add an externally measured duration to `stage`"""
+    if not ENABLED:
+        return
+    REGISTRY.observe('stage_duration_seconds', seconds, (('stage', stage),))
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        stages = request['stages']
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def count(name, value=1):
+    """Increase counter `name` (exported as gdacs_<name>_total)"""
+    if not ENABLED:
+        return
+    REGISTRY.inc(name + '_total', value)
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        counters = request['counters']
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextlib.contextmanager
+def collect_counters():
+    """
+    Counters recorded on this thread inside the block, as a dict. Used where
+    the work runs in another process (see parallel_impact): the worker
+    returns the dict and the parent adds it with count().
+    """
+    previous = getattr(_local, 'request', None)
+    _local.request = {'start': time.perf_counter(), 'status': None, 'stages': {}, 'counters': {}}
+    try:
+        yield _local.request['counters']
+    finally:
+        _local.request = previous
+
+
+def gauge(name, value):
+    if ENABLED:
+        REGISTRY.set(name, value)
+
+
+class InstrumentedHandler(BaseHTTPRequestHandler):
+    """
+    BaseHTTPRequestHandler that times every request and labels it with its
+    route and status. Spans and counters recorded on the serving thread are
+    attributed to the request in its structured log line.
+    """
+
+    def metrics_route(self):
+        """Route label of the current request; override to bound its values"""
+        return urlparse(self.path).path
+
+    def parse_request(self):
+        # Starts the clock once the request line and headers are read, so
+        # idle keep-alive time is not counted
+        parsed = super().parse_request()
+        if parsed and ENABLED:
+            _local.request = {'start': time.perf_counter(), 'status': None, 'stages': {}, 'counters': {}}
+        return parsed
+
+    def send_response(self, code, message=None):
+        request = getattr(_local, 'request', None)
+        if request is not None and request['status'] is None:
+            request['status'] = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        finally:
+            request = getattr(_local, 'request', None)
+            if request is not None:
+                _local.request = None
+                self._finish_request(request)
+
+    def _finish_request(self, request):
+        duration = time.perf_counter() - request['start']
+        route = self.metrics_route()
+        status = str(request['status'] or 0)
+        REGISTRY.observe('request_duration_seconds', duration, (('route', route),))
+        REGISTRY.inc('requests_total', 1, (('route', route), ('status', status)))
+        if LOG_REQUESTS:
+            print(json.dumps({
+                'route': route,
+                'method': self.command,
+                'status': request['status'],
+                'durationMs': round(duration * 1000, 3),
+                'stagesMs': {stage: round(seconds * 1000, 3) for stage, seconds in request['stages'].items()},
+                'counters': request['counters'],
+            }), flush=True)
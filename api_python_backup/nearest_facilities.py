@@ -0,0 +1,106 @@
+import json
+import os
+
+import metrics
+from facility_ingest import read_facilities
+from geo_engine import disaster_profile, facility_coordinates, facility_record
+from impact_assessment import FACILITY_REGISTRY
+from metrics import InstrumentedHandler
+from spatial_index import FacilityGrid, nearest_in_grid
+
+DEFAULT_K = 10
+MAX_K = int(os.getenv('NEAREST_MAX_K', '1000'))
+
+class handler(InstrumentedHandler):
+    def do_POST(self):
+        # Get content length
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        
+        try:
+            # Parse the JSON data
+            with metrics.span('request_parse'):
+                data = json.loads(post_data)
+            k = data.get('k', DEFAULT_K)
+            if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+                raise ValueError(f"k must be an integer between 1 and {MAX_K}")
+            max_distance = data.get('maxDistanceKm')
+            
+            # Facilities from a registered set (grid prebuilt) or the request
+            with metrics.span('facility_parse'):
+                if data.get('facilitySetId'):
+                    facilities = FACILITY_REGISTRY.open(data['facilitySetId'])
+                else:
+                    facilities = read_facilities(data.get('facilities', ''), data.get('facilitiesFormat', 'csv'))
+            metrics.count('facilities', len(facilities))
+            
+            # Events sent with the request, or looked up in the current feed
+            response = {}
+            disasters = data.get('disasters', [])
+            if data.get('guids'):
+                resolved, response['unresolvedGuids'] = disasters_by_guid(data['guids'])
+                disasters = disasters + resolved
+            
+            response['nearestFacilities'] = nearest_facilities(
+                facilities, disasters, k=k, method=data.get('method', 'ellipsoidal'),
+                max_distance_km=float(max_distance) if max_distance is not None else None)
+            
+            # Send response
+            with metrics.span('response_serialize'):
+                body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        except Exception as e:
+            body = json.dumps({
+                'error': str(e)
+            }).encode()
+            self.send_response(500)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        return
+
+def disasters_by_guid(guids):
+    """Disasters of the cached GDACS feed with the given guids, and the guids not in it"""
+    # The feed handler (and its HTTP stack) is only loaded when guids are used
+    from gdacs import FEED_CACHE
+    feed, _ = FEED_CACHE.get()
+    by_guid = {disaster.get('guid'): disaster for disaster in feed}
+    found = [by_guid[guid] for guid in guids if guid in by_guid]
+    return found, [guid for guid in guids if guid not in by_guid]
+
+def nearest_facilities(facilities, disasters, k=DEFAULT_K, method='ellipsoidal', max_distance_km=None):
+    """
+    The `k` facilities nearest to each disaster, closest first:
+    
+        [{'disaster': {...}, 'facilities': [{'facility': {...}, 'distance': km}, ...]}, ...]
+    
+    Unlike assess_impact there is no impact radius; `max_distance_km`
+    optionally drops facilities further away. Disasters without coordinates
+    get an empty list. Registered facility sets reuse their stored grid, so
+    each disaster costs a few grid cells of distance computations.
+    """
+    if hasattr(facilities, 'grid'):
+        grid = facilities.grid()
+    else:
+        with metrics.span('grid_build'):
+            grid = FacilityGrid(*facility_coordinates(facilities))
+    
+    indices, dis_lat, dis_lon, _ = disaster_profile(disasters)
+    with metrics.span('knn_search'):
+        found = nearest_in_grid(grid, dis_lat, dis_lon, k, method=method, max_km=max_distance_km)
+    
+    with metrics.span('response_build'):
+        nearest = [{'disaster': disaster, 'facilities': []} for disaster in disasters]
+        for j, (fac_idx, distances) in zip(indices.tolist(), found):
+            nearest[j]['facilities'] = [
+                {'facility': facility_record(facilities, i), 'distance': round(d, 2)}
+                for i, d in zip(fac_idx.tolist(), distances.tolist())
+            ]
+    return nearest
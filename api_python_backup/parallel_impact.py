@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from geo_engine import empty_pairs
+
+# Below this many facilities process start-up costs more than it saves
+PARALLEL_MIN_FACILITIES = 50_000
+
+# Shards per worker; a few more than one keeps workers busy when shards are uneven
+SHARDS_PER_WORKER = 4
+
+# Requests whose facility segment and disasters a worker keeps attached
+WORKER_REQUESTS = 4
+
+# The shared pool and its worker count (see worker_pool)
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Per worker process: attached segments and unpickled disasters by request token
+_worker_requests = OrderedDict()
+
+
+def default_workers():
+    """Worker count from IMPACT_WORKERS (defaults to 1, i.e. no pool)"""
+    return max(1, int(os.getenv('IMPACT_WORKERS', '1')))
+
+
+def _context():
+    # The server forks from a process running worker and cache threads; a
+    # forked child could inherit one of their locks held. forkserver (or
+    # spawn) children start from a clean single-threaded process.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _init_worker():
+    # Counters are returned with each shard's result and added in the parent
+    metrics.configure(enabled=True)
+
+
+def worker_pool(workers):
+    """
+    The process pool shared by all requests, started on first use (the
+    server starts it while warming up) and replaced only if the worker count
+    changes or a worker dies
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_context(), initializer=_init_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _request_state(token, shm_name, n_facilities, disasters_blob):
+    state = _worker_requests.get(token)
+    if state is None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        coords = np.ndarray((2, n_facilities), dtype=np.float64, buffer=shm.buf)
+        state = _worker_requests[token] = {'shm': shm, 'coords': coords, 'disasters': pickle.loads(disasters_blob)}
+        while len(_worker_requests) > WORKER_REQUESTS:
+            _, old = _worker_requests.popitem(last=False)
+            del old['coords']
+            old['shm'].close()
+    return state
+
+
+def _run_shard(task):
+    from impact_assessment import impact_pairs_for
+
+    token, shm_name, n_facilities, disasters_blob, options, start, stop = task
+    state = _request_state(token, shm_name, n_facilities, disasters_blob)
+    coords = state['coords']
+    with metrics.collect_counters() as counters:
+        fac_idx, dis_idx, distances = impact_pairs_for(
+            coords[0][start:stop], coords[1][start:stop], state['disasters'], **options)
+    return (fac_idx + start, dis_idx, distances), dict(counters)
+
+
+def parallel_impact_pairs(fac_lat, fac_lon, disasters, workers, method='ellipsoidal', mode='radius'):
+    """
+    impact_pairs_for sharded over the shared process pool.
+
+    Facility coordinates are copied once into a shared memory segment that
+    every worker maps, instead of being pickled per task; the disaster list
+    is pickled once per request and each shard's (usually small) result and
+    counters come back. Shards are contiguous facility ranges merged in shard
+    order, so the output is identical to the single-process path regardless
+    of completion order.
+    """
+    n = len(fac_lat)
+    if n == 0:
+        return empty_pairs()
+
+    shm = shared_memory.SharedMemory(create=True, size=2 * n * 8)
+    coords = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+    try:
+        coords[0] = fac_lat
+        coords[1] = fac_lon
+
+        n_shards = min(n, workers * SHARDS_PER_WORKER)
+        edges = np.linspace(0, n, n_shards + 1).astype(np.int64).tolist()
+        token = uuid.uuid4().hex
+        disasters_blob = pickle.dumps(disasters, protocol=pickle.HIGHEST_PROTOCOL)
+        options = {'method': method, 'mode': mode}
+        tasks = [(token, shm.name, n, disasters_blob, options, start, stop)
+                 for start, stop in zip(edges[:-1], edges[1:])]
+
+        pool = worker_pool(workers)
+        try:
+            results = list(pool.map(_run_shard, tasks))
+        except BrokenProcessPool:
+            # A worker died; the next request starts a fresh pool
+            _discard_pool(pool)
+            raise
+    finally:
+        # The view must be released before the segment can be closed
+        del coords
+        shm.close()
+        shm.unlink()
+
+    for _, counters in results:
+        for name, value in counters.items():
+            metrics.count(name, value)
+    return tuple(np.concatenate(parts) for parts in zip(*(pairs for pairs, _ in results)))
@@ -0,0 +1,159 @@
+import numpy as np
+
+import metrics
+from geo_engine import concat_pairs, ellipsoidal_km, haversine_km
+from geometry import polygon_coordinates
+
+# Points x edges evaluated at once inside one latitude slab
+CHUNK_ELEMENTS = 1 << 20
+
+
+class PolygonIndex:
+    """
+    Point-in-polygon tester for one CAP area polygon.
+
+    Coordinates come in CAP order ([lat, lon] pairs). The polygon's edges are
+    bucketed into horizontal (latitude) slabs, so a point is only tested
+    against the few edges that span its slab instead of every vertex pair.
+    Polygons crossing the antimeridian are unwrapped to 0..360 longitudes.
+    """
+
+    def __init__(self, coordinates):
+        coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        lat, lon = coords[:, 0], coords[:, 1].copy()
+
+        self.wraps = lon.max() - lon.min() > 180
+        if self.wraps:
+            lon[lon < 0] += 360
+
+        self.lat_min, self.lat_max = lat.min(), lat.max()
+        self.lon_min, self.lon_max = lon.min(), lon.max()
+        # Averaged over the unwrapped longitudes, then put back in [-180, 180)
+        self.centroid = (float(lat.mean()), float((lon.mean() + 180) % 360 - 180))
+
+        # Edges from each vertex to the next, closing the ring
+        x1, y1 = lon, lat
+        x2, y2 = np.roll(lon, -1), np.roll(lat, -1)
+        horizontal = y1 == y2  # never crossed by a horizontal ray
+        self.x1, self.y1 = x1[~horizontal], y1[~horizontal]
+        self.x2, self.y2 = x2[~horizontal], y2[~horizontal]
+        self._build_slabs()
+
+    def __len__(self):
+        return len(self.x1)
+
+    def _build_slabs(self):
+        n_edges = len(self.x1)
+        self.n_slabs = max(1, n_edges // 8)  # ~8 edges per slab on average
+        span = self.lat_max - self.lat_min
+        self.slab_height = span / self.n_slabs if span > 0 else 1.0
+
+        edge_lo = self._slab(np.minimum(self.y1, self.y2))
+        edge_hi = self._slab(np.maximum(self.y1, self.y2))
+        counts = edge_hi - edge_lo + 1
+
+        # CSR layout: slab s owns slab_edges[slab_offsets[s]:slab_offsets[s + 1]]
+        edge_ids = np.repeat(np.arange(n_edges), counts)
+        slab_ids = np.repeat(edge_lo, counts) + (np.arange(counts.sum()) -
+                                                 np.repeat(np.cumsum(counts) - counts, counts))
+        order = np.argsort(slab_ids, kind='stable')
+        self.slab_edges = edge_ids[order]
+        self.slab_offsets = np.concatenate(([0], np.cumsum(np.bincount(slab_ids, minlength=self.n_slabs))))
+
+    def _slab(self, lat):
+        return np.clip(((lat - self.lat_min) / self.slab_height).astype(np.int64), 0, self.n_slabs - 1)
+
+    def _unwrap(self, lon):
+        if self.wraps:
+            return np.where(lon < 0, lon + 360, lon)
+        return lon
+
+    def bbox_mask(self, lat, lon):
+        """Points inside the polygon's bounding box"""
+        lon = self._unwrap(lon)
+        return ((lat >= self.lat_min) & (lat <= self.lat_max) &
+                (lon >= self.lon_min) & (lon <= self.lon_max))
+
+    def contains(self, lat, lon):
+        """Even-odd point-in-polygon test for arrays of points"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = self._unwrap(np.asarray(lon, dtype=np.float64))
+        inside = np.zeros(lat.shape, dtype=bool)
+
+        candidates = np.flatnonzero(self.bbox_mask(lat, lon))
+        if candidates.size == 0 or len(self) == 0:
+            return inside
+
+        slabs = self._slab(lat[candidates])
+        order = np.argsort(slabs, kind='stable')
+        candidates, slabs = candidates[order], slabs[order]
+        bounds = np.flatnonzero(np.diff(slabs)) + 1
+
+        for group in np.split(np.arange(candidates.size), bounds):
+            slab = slabs[group[0]]
+            edges = self.slab_edges[self.slab_offsets[slab]:self.slab_offsets[slab + 1]]
+            if edges.size == 0:
+                continue
+            x1, y1 = self.x1[edges], self.y1[edges]
+            x2, y2 = self.x2[edges], self.y2[edges]
+            rows_per_chunk = max(1, CHUNK_ELEMENTS // edges.size)
+
+            for start in range(0, group.size, rows_per_chunk):
+                points = candidates[group[start:start + rows_per_chunk]]
+                py, px = lat[points, None], lon[points, None]
+                spans = (y1 > py) != (y2 > py)
+                x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+                crossings = np.count_nonzero(spans & (px < x_cross), axis=1)
+                inside[points] = crossings % 2 == 1
+
+        return inside
+
+
+def disaster_polygons(disasters, min_vertices=3):
+    """PolygonIndex per disaster index, for disasters that carry a CAP polygon (plain or encoded)"""
+    polygons = {}
+    for i, disaster in enumerate(disasters):
+        coordinates = polygon_coordinates(disaster)
+        if len(coordinates) >= min_vertices:
+            polygons[i] = PolygonIndex(coordinates)
+    return polygons
+
+
+def polygon_impact_pairs(fac_lat, fac_lon, disasters, polygons, grid=None, method='ellipsoidal'):
+    """
+    Facilities inside each disaster polygon.
+
+    Candidates come from the grid bounding-box query when a grid is given,
+    otherwise from a vectorized bbox mask inside PolygonIndex.contains. The
+    reported distance is measured to the event point, or to the polygon's
+    vertex centroid when the event has no point.
+
+    Returns (facility_idx, disaster_idx, distance_km) grouped by disaster.
+    """
+    fac_parts, dis_parts, dist_parts = [], [], []
+
+    for i, polygon in polygons.items():
+        if grid is not None:
+            lon_min, lon_max = polygon.lon_min, polygon.lon_max
+            if polygon.wraps:
+                lon_min, lon_max = (lon_min + 180) % 360 - 180, (lon_max + 180) % 360 - 180
+            candidates = grid.query_bbox(polygon.lat_min, lon_min, polygon.lat_max, lon_max)
+            hits = candidates[polygon.contains(fac_lat[candidates], fac_lon[candidates])]
+            metrics.count('pairs_evaluated', candidates.size)
+        else:
+            hits = np.flatnonzero(polygon.contains(fac_lat, fac_lon))
+            metrics.count('pairs_evaluated', len(fac_lat))
+        if hits.size == 0:
+            continue
+
+        disaster = disasters[i]
+        lat, lon = disaster.get('latitude'), disaster.get('longitude')
+        if not lat or not lon:
+            lat, lon = polygon.centroid
+        distance_fn = ellipsoidal_km if method == 'ellipsoidal' else haversine_km
+
+        fac_parts.append(hits)
+        dis_parts.append(np.full(hits.size, i, dtype=np.int64))
+        dist_parts.append(distance_fn(fac_lat[hits], fac_lon[hits], float(lat), float(lon)))
+
+    return concat_pairs(fac_parts, dis_parts, dist_parts)
@@ -1,16 +1,18 @@
-from http.server import BaseHTTPRequestHandler
 import json
 import os
-import openai
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Load environment variables
-load_dotenv()
+import metrics
+from llm import RateLimiter, chat_completion
+from metrics import InstrumentedHandler
 
-# Set up OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Batch requests: maximum LLM calls in flight, and an optional cap on calls
+# per second across the whole batch (0 = no cap)
+RECOMMENDATIONS_CONCURRENCY = int(os.getenv("RECOMMENDATIONS_CONCURRENCY", "8"))
+RECOMMENDATIONS_RATE_LIMIT = float(os.getenv("RECOMMENDATIONS_RATE_LIMIT", "0"))
 
-class handler(BaseHTTPRequestHandler):
+class handler(InstrumentedHandler):
     def do_POST(self):
         # Get content length
         content_length = int(self.headers['Content-Length'])
@@ -18,7 +20,14 @@ class handler(BaseHTTPRequestHandler):
         
         try:
             # Parse the JSON data
-            data = json.loads(post_data)
+            with metrics.span('request_parse'):
+                data = json.loads(post_data)
+            
+            # Many facility/impacts pairs: stream results as they complete
+            if 'items' in data:
+                self.stream_batch(data)
+                return
+            
             facility = data.get('facility', {})
             impacts = data.get('impacts', [])
             
@@ -29,27 +38,120 @@ class handler(BaseHTTPRequestHandler):
             recommendations = generate_recommendations(facility, impacts)
             
             # Send response
+            body = json.dumps({
+                'recommendations': recommendations
+            }).encode()
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'recommendations': recommendations
-            }).encode())
+            self.wfile.write(body)
             
         except Exception as e:
+            body = json.dumps({
+                'error': str(e)
+            }).encode()
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'error': str(e)
-            }).encode())
+            self.wfile.write(body)
             
         return
+    
+    def stream_batch(self, data):
+        """
+        Write one JSON line per facility ({"index", "facility", "recommendations"})
+        as soon as its recommendations are ready; the order is completion order.
+        
+        The whole batch is validated before the 200 is sent. Once it has been,
+        a failed item is written as {"index", "facility", "error"} and a failure
+        of the batch itself as a last {"error"} line.
+        """
+        items, concurrency = batch_request(data)
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        # The stream has no length; its end is marked by closing the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+        
+        results = generate_recommendations_batch(items, concurrency=concurrency)
+        try:
+            for index, recommendations in results:
+                record = {'index': index, 'facility': items[index]['facility']}
+                if isinstance(recommendations, Exception):
+                    record['error'] = str(recommendations)
+                else:
+                    record['recommendations'] = recommendations
+                self.wfile.write(json.dumps(record).encode() + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected during batch recommendations")
+        except Exception as e:
+            # The status line has been sent, so the error goes into the stream
+            print(f"Error in batch recommendations: {e}")
+            try:
+                self.wfile.write(json.dumps({'error': str(e)}).encode() + b'\n')
+            except OSError:
+                pass
+        finally:
+            results.close()
+
+def batch_request(data):
+    """Validated (items, concurrency) of a batch request; raises ValueError"""
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("Missing items for batch recommendations")
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('facility') or not item.get('impacts'):
+            raise ValueError(f"Missing facility or impacts data in item {index}")
+        if not isinstance(item['facility'], dict) or not isinstance(item['impacts'], list) \
+                or not all(isinstance(impact, dict) for impact in item['impacts']):
+            raise ValueError(f"Item {index} needs a facility object and a list of impact objects")
+    
+    try:
+        concurrency = int(data.get('concurrency', RECOMMENDATIONS_CONCURRENCY))
+    except (TypeError, ValueError):
+        concurrency = 0
+    if concurrency < 1:
+        raise ValueError("concurrency must be a positive integer")
+    return items, min(concurrency, RECOMMENDATIONS_CONCURRENCY)
+
+def generate_recommendations_batch(items, concurrency=RECOMMENDATIONS_CONCURRENCY, rate_limit=RECOMMENDATIONS_RATE_LIMIT):
+    """
+    Generate recommendations for many {facility, impacts} items concurrently.
+    
+    At most `concurrency` LLM calls are in flight, and `rate_limit` (calls per
+    second, 0 for none) is shared by all of them. Yields (index, recommendations)
+    in completion order, so callers can forward each result immediately; an
+    item that failed yields its exception instead.
+    """
+    rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {
+            pool.submit(generate_recommendations, item.get('facility', {}), item.get('impacts', []), rate_limiter): index
+            for index, item in enumerate(items)
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield futures[future], result
+        finally:
+            # The consumer went away (e.g. client disconnect): drop queued calls
+            for future in futures:
+                future.cancel()
 
-def generate_recommendations(facility, impacts):
+def generate_recommendations(facility, impacts, rate_limiter=None):
     """Generate AI-powered recommendations for impacted facility"""
     try:
         # Prepare prompts for OpenAI
+        prompt_start = time.perf_counter()
         situation_summary = create_situation_summary(facility, impacts)
         
         # Create prompt for GPT
@@ -73,20 +175,20 @@ Keep recommendations concise, practical, and specific to the facility and disast
 Do not use curly braces, brackets, or other JSON formatting symbols within the text content itself - provide clean, readable text for each recommendation.
 """
 
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+        metrics.record('prompt_build', time.perf_counter() - prompt_start)
+        
+        # Call OpenAI API (retried with backoff on transient errors)
+        recommendation_text = chat_completion(
             messages=[
                 {"role": "system", "content": "You are a disaster response and humanitarian aid expert providing actionable recommendations. Avoid using JSON symbols like {}, [], or quotes within your text content. Provide clean, readable text for humans."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.5,
-            max_tokens=1000
+            max_tokens=1000,
+            rate_limiter=rate_limiter,
+            cache_events=[impact.get('disaster', {}) for impact in impacts]
         )
         
-        # Extract the response
-        recommendation_text = response.choices[0].message.content.strip()
-        
         # Try to parse the JSON response
         try:
             # First try to parse directly
@@ -0,0 +1,301 @@
+"""
+Self-hosted entry point serving all Python API handlers from one process.
+
+    python server.py [--host 0.0.0.0] [--port 8000] [--workers 16]
+
+Routes mirror the serverless functions: /api/gdacs, /api/impact_assessment,
+/api/nearest_facilities, /api/recommendations and /api/sitrep; GET /metrics exports Prometheus
+metrics (recorded with GDACS_METRICS=1, see metrics.py). Module-level state - the feed cache,
+facility registry, LLM response cache and geometry cache - stays warm across
+requests because every request is served by the same process.
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+from urllib.parse import urlparse
+
+import gdacs
+import impact_assessment
+import llm
+import metrics
+import nearest_facilities
+import parallel_impact
+import recommendations
+import sitrep
+
+ROUTES = {
+    '/api/gdacs': gdacs.handler,
+    '/api/impact_assessment': impact_assessment.handler,
+    '/api/nearest_facilities': nearest_facilities.handler,
+    '/api/recommendations': recommendations.handler,
+    '/api/sitrep': sitrep.handler,
+}
+
+# Largest accepted request body; facility CSVs are the big ones
+MAX_BODY_BYTES = int(os.getenv('SERVER_MAX_BODY_BYTES', str(64 * 1024 * 1024)))
+
+# Idle seconds before a keep-alive connection is closed; also how long a
+# worker waits for the rest of a request that has started to arrive
+KEEPALIVE_TIMEOUT = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', '5'))
+
+# Idle keep-alive connections held open at once (they hold no worker, only a socket)
+MAX_IDLE_CONNECTIONS = int(os.getenv('SERVER_MAX_IDLE_CONNECTIONS', '1024'))
+
+DEFAULT_WORKERS = int(os.getenv('SERVER_WORKERS', '16'))
+
+METRICS_PATH = '/metrics'
+
+
+class RouterHandler(gdacs.handler, impact_assessment.handler, recommendations.handler, sitrep.handler):
+    """
+    Dispatches each request to the do_GET / do_POST of the handler for its
+    path. Inheriting from all of them provides the helpers they call on
+    self (stream_batch, stream_sitrep, ...). Speaks HTTP/1.1, so connections
+    are kept alive between requests unless a handler streams its response.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle(self):
+        """
+        Serve the request, and any the client has already pipelined behind
+        it. A connection kept alive is then marked `idle` for the server to
+        wait on (see PooledHTTPServer.park) instead of blocking this worker.
+        """
+        if not hasattr(self.server, 'park'):
+            super().handle()
+            return
+        self.handle_one_request()
+        while not self.close_connection and self.request_pending():
+            self.handle_one_request()
+        self.idle = not self.close_connection
+
+    def request_pending(self):
+        """Whether the next request has started to arrive, without waiting for it"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        path = urlparse(self.path).path.rstrip('/')
+        if path == METRICS_PATH and method == 'GET':
+            self.send_metrics()
+            return
+        # A body left unread would be parsed as the next request on the connection
+        unread_body = self.headers.get('Content-Length', '0') != '0' or 'Transfer-Encoding' in self.headers
+        route = ROUTES.get(path)
+        if route is None:
+            self.send_error_json(404, f"No route for {urlparse(self.path).path}", close=unread_body)
+            return
+        target = getattr(route, f'do_{method}', None)
+        if target is None:
+            self.send_error_json(405, f"{method} not allowed", close=unread_body)
+            return
+        if method == 'POST':
+            length = self.headers.get('Content-Length')
+            if length is None or not length.isdigit():
+                self.send_error_json(411, "Content-Length required")
+                return
+            if int(length) > MAX_BODY_BYTES:
+                # The body is left unread, so the connection cannot be reused
+                self.send_error_json(413, f"Request body exceeds {MAX_BODY_BYTES} bytes", close=True)
+                return
+        target(self)
+
+    def metrics_route(self):
+        # Unknown paths share one label, so scans cannot add label values
+        path = urlparse(self.path).path.rstrip('/')
+        return path if path in ROUTES or path == METRICS_PATH else 'other'
+
+    def send_metrics(self):
+        body = metrics.REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, close=False):
+        body = json.dumps({
+            'error': message
+        }).encode()
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that serves requests on a fixed-size thread pool. Between
+    requests a keep-alive connection is watched by one selector thread
+    rather than a worker, so idle clients cannot exhaust the pool; it is
+    handed back to the pool when its next request arrives and closed after
+    KEEPALIVE_TIMEOUT idle seconds.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self._idle = selectors.DefaultSelector()
+        self._parked = []  # connections waiting to be registered with the selector
+        self._n_idle = 0
+        self._idle_lock = threading.Lock()
+        self._closing = False
+        # Wakes the selector when a connection is parked or the server closes
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._idle.register(self._wake_r, selectors.EVENT_READ)
+        threading.Thread(target=self._watch_idle, name='http-idle', daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        if not (getattr(handler, 'idle', False) and self.park(request, client_address)):
+            self.shutdown_request(request)
+
+    def park(self, request, client_address):
+        """Wait for the connection's next request off the pool; False when too many are idle"""
+        with self._idle_lock:
+            if self._closing or self._n_idle >= MAX_IDLE_CONNECTIONS:
+                return False
+            self._n_idle += 1
+            self._parked.append((request, client_address))
+        self._wake_w.send(b'\0')
+        return True
+
+    def idle_connections(self):
+        with self._idle_lock:
+            return self._n_idle
+
+    def _watch_idle(self):
+        while True:
+            now = time.monotonic()
+            deadlines = [key.data[1] for key in self._idle.get_map().values() if key.data]
+            timeout = max(0.0, min(deadlines) - now) if deadlines else None
+            for key, _ in self._idle.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                # The next request (or the client's close) has arrived
+                self._idle.unregister(key.fileobj)
+                self._release_idle(key.fileobj, key.data[0], resume=True)
+
+            with self._idle_lock:
+                parked, self._parked = self._parked, []
+                closing = self._closing
+            now = time.monotonic()
+            for request, client_address in parked:
+                self._idle.register(request, selectors.EVENT_READ, (client_address, now + KEEPALIVE_TIMEOUT))
+            for key in list(self._idle.get_map().values()):
+                if key.data and (closing or key.data[1] <= now):
+                    self._idle.unregister(key.fileobj)
+                    self._release_idle(key.fileobj, key.data[0], resume=False)
+            if closing:
+                self._idle.close()
+                self._wake_r.close()
+                self._wake_w.close()
+                return
+
+    def _release_idle(self, request, client_address, resume):
+        with self._idle_lock:
+            self._n_idle -= 1
+        if resume:
+            try:
+                self.pool.submit(self.process_request_thread, request, client_address)
+                return
+            except RuntimeError:  # the pool has been shut down
+                pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        with self._idle_lock:
+            self._closing = True
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def preload_dependencies():
+    """
+    Import the dependencies the handlers load lazily (pandas for CSV uploads,
+    openai for LLM calls) and start the impact worker pool when
+    IMPACT_WORKERS > 1, so that a long-running server's first requests do
+    not pay for them
+    """
+    import pandas  # noqa: F401
+    llm._openai()
+    if parallel_impact.default_workers() > 1:
+        parallel_impact.worker_pool(parallel_impact.default_workers())
+
+
+def make_server(host='127.0.0.1', port=8000, workers=DEFAULT_WORKERS, warm=True):
+    """
+    Create (but do not start) the server; with `warm` the feed is fetched and
+    lazily loaded dependencies imported in the background
+    """
+    server = PooledHTTPServer((host, port), RouterHandler, workers=workers)
+    if warm:
+        gdacs.FEED_CACHE.refresh(wait=False)
+        threading.Thread(target=preload_dependencies, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default=os.getenv('SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.workers)
+    print(f"Serving {', '.join(ROUTES)} on http://{args.host}:{server.server_port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        parallel_impact.shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,24 @@
-from http.server import BaseHTTPRequestHandler
 import json
 import os
-import openai
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables
-load_dotenv()
+import metrics
+from llm import chat_completion, is_retryable, stream_chat_completion
+from metrics import InstrumentedHandler
+from situation_overview import (CHARS_PER_TOKEN, budgeted_overview, disaster_type_name, estimate_tokens,
+                                overview_line_count)
 
-# Set up OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Upper bound on the size of the situation overview put in the prompt
+SITREP_OVERVIEW_TOKENS = int(os.getenv("SITREP_OVERVIEW_TOKENS", "3000"))
 
-class handler(BaseHTTPRequestHandler):
+# Lower bound on a requested overview budget: room for the header and a few headlines
+SITREP_MIN_OVERVIEW_TOKENS = 200
+
+# Map-reduce SitReps: concurrent per-event-type summaries and their length
+SITREP_MAP_CONCURRENCY = int(os.getenv("SITREP_MAP_CONCURRENCY", "4"))
+SITREP_MAP_SUMMARY_TOKENS = 400
+
+class handler(InstrumentedHandler):
     def do_POST(self):
         # Get content length
         content_length = int(self.headers['Content-Length'])
@@ -18,43 +26,141 @@ class handler(BaseHTTPRequestHandler):
         
         try:
             # Parse the JSON data
-            data = json.loads(post_data)
+            with metrics.span('request_parse'):
+                data = json.loads(post_data)
             impacted_facilities = data.get('impactedFacilities', [])
             disasters = data.get('disasters', [])
             
             if not impacted_facilities and not disasters:
                 raise ValueError("Missing impacted facilities or disasters data")
             
+            # Overview size limit (may only be lowered, down to the minimum) and optional per-type summaries
+            token_budget = int(data.get('tokenBudget', SITREP_OVERVIEW_TOKENS))
+            options = {
+                'token_budget': max(SITREP_MIN_OVERVIEW_TOKENS, min(token_budget, SITREP_OVERVIEW_TOKENS)),
+                'map_reduce': bool(data.get('mapReduce', False))
+            }
+            
+            # Forward the report token by token as Server-Sent Events
+            if data.get('stream') or 'text/event-stream' in (self.headers.get('Accept') or ''):
+                self.stream_sitrep(impacted_facilities, disasters, **options)
+                return
+            
             # Generate situation report
-            sitrep = generate_sitrep(impacted_facilities, disasters)
+            sitrep = generate_sitrep(impacted_facilities, disasters, **options)
             
             # Send response
+            body = json.dumps({
+                'sitrep': sitrep
+            }).encode()
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'sitrep': sitrep
-            }).encode())
+            self.wfile.write(body)
             
         except Exception as e:
+            body = json.dumps({
+                'error': str(e)
+            }).encode()
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({
-                'error': str(e)
-            }).encode())
+            self.wfile.write(body)
             
         return
+    
+    def stream_sitrep(self, impacted_facilities, disasters, **options):
+        """
+        Send the SitRep as Server-Sent Events: `token` events carrying
+        {"text": ...} as the model produces it, then one `done` event with the
+        full {"sitrep": ...}. If the stream fails before its first token, the
+        buffered JSON response is sent instead: one buffered attempt, since
+        opening the stream already used up the retries, or none at all when
+        the request was refused (a 4xx other than 429 would be refused again).
+        """
+        tokens = stream_chat_completion(**sitrep_completion_request(impacted_facilities, disasters, **options))
+        try:
+            # Wait for the first token before committing to a streamed response
+            first = next(tokens, '')
+        except Exception as e:
+            if is_retryable(e):
+                print(f"Error streaming SitRep, falling back to buffered response: {e}")
+                sitrep = generate_sitrep(impacted_facilities, disasters, retries=0, **options)
+            else:
+                print(f"Error generating SitRep: {e}")
+                sitrep = f"Error generating Situation Report: {str(e)}"
+            body = json.dumps({
+                'sitrep': sitrep
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        # The stream has no length; its end is marked by closing the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+        
+        parts = []
+        try:
+            text = first
+            while text is not None:
+                if text:
+                    parts.append(text)
+                    self.send_event('token', {'text': text})
+                text = next(tokens, None)
+            self.send_event('done', {'sitrep': ''.join(parts).strip()})
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected during SitRep stream")
+        except Exception as e:
+            print(f"Error streaming SitRep: {e}")
+            try:
+                self.send_event('error', {'error': str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        finally:
+            # Stops the upstream completion when the client has gone away
+            tokens.close()
+    
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
 
-def generate_sitrep(impacted_facilities, disasters):
+def generate_sitrep(impacted_facilities, disasters, token_budget=SITREP_OVERVIEW_TOKENS, map_reduce=False, retries=3):
     """Generate situation report for all impacted facilities"""
     
     try:
-        # Create a comprehensive overview of the situation
-        situation_overview = create_situation_overview(impacted_facilities, disasters)
+        # Call OpenAI API (identical requests for unchanged events are cached)
+        return chat_completion(**sitrep_completion_request(impacted_facilities, disasters, token_budget, map_reduce),
+                               retries=retries)
+    
+    except Exception as e:
+        print(f"Error generating SitRep: {e}")
+        return f"Error generating Situation Report: {str(e)}"
+
+def sitrep_completion_request(impacted_facilities, disasters, token_budget=SITREP_OVERVIEW_TOKENS, map_reduce=False):
+    """Arguments of the SitRep completion, shared by the buffered and streamed paths"""
+    
+    # Create a comprehensive overview of the situation, within the token budget
+    # (the map-reduce summaries' LLM calls are timed as llm_completion too)
+    with metrics.span('prompt_build'):
+        situation_overview = create_overview_within_budget(impacted_facilities, disasters, token_budget)
+        if map_reduce and situation_overview is None:
+            situation_overview = map_reduce_overview(impacted_facilities, disasters, token_budget)
+        elif situation_overview is None:
+            situation_overview = budgeted_overview(impacted_facilities, disasters, token_budget)
         
-        # Create prompt for GPT
-        prompt = f"""
+    # Create prompt for GPT
+    prompt = f"""
 You are a disaster management professional tasked with creating a concise Situation Report (SitRep).
 Based on the information below, create a formal SitRep that would be suitable for sharing with 
 organizational leadership, emergency response teams, and other stakeholders.
@@ -73,25 +179,84 @@ Your SitRep should include:
 Format your response in markdown for readability. Keep the entire SitRep concise and actionable.
 """
 
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a disaster management professional creating a formal Situation Report."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
-        # Extract the response
-        sitrep_text = response.choices[0].message.content.strip()
-        
-        return sitrep_text
+    return {
+        'messages': [
+            {"role": "system", "content": "You are a disaster management professional creating a formal Situation Report."},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': 0.7,
+        'max_tokens': 1500,
+        'cache_events': disasters + [
+            impact.get('disaster', {})
+            for facility in impacted_facilities
+            for impact in facility.get('impacts', [])
+        ]
+    }
+
+def create_overview_within_budget(impacted_facilities, disasters, token_budget):
+    """The full line-per-impact overview, or None if it would exceed `token_budget`"""
     
-    except Exception as e:
-        print(f"Error generating SitRep: {e}")
-        return f"Error generating Situation Report: {str(e)}"
+    # Every line costs at least one token, so skip building overviews that cannot fit
+    if overview_line_count(impacted_facilities, disasters) > token_budget:
+        return None
+    overview = create_situation_overview(impacted_facilities, disasters)
+    return overview if estimate_tokens(overview) <= token_budget else None
+
+def map_reduce_overview(impacted_facilities, disasters, token_budget):
+    """
+    Overview built from one summary per disaster type, generated concurrently
+    from that type's own budgeted overview. Each type gets an equal share of
+    `token_budget` for its summary, so the result stays within the budget
+    however many types there are.
+    """
+    by_type = {}
+    for disaster in disasters:
+        by_type.setdefault(disaster_type_name(disaster), ([], []))[0].append(disaster)
+    for impact in impacted_facilities:
+        per_type = {}
+        for disaster_impact in impact.get('impacts', []):
+            per_type.setdefault(disaster_type_name(disaster_impact.get('disaster', {})), []).append(disaster_impact)
+        for type_name, type_impacts in per_type.items():
+            by_type.setdefault(type_name, ([], []))[1].append({
+                'facility': impact.get('facility', {}),
+                'impacts': type_impacts
+            })
+    
+    type_names = list(by_type)
+    # The share of each section, less its "TYPE:" heading and blank line
+    share = max(1, token_budget // max(1, len(type_names)) - 8)
+    summary_tokens = min(SITREP_MAP_SUMMARY_TOKENS, share)
+    
+    def summarize(type_name):
+        type_disasters, type_facilities = by_type[type_name]
+        overview = create_overview_within_budget(type_facilities, type_disasters, token_budget) or \
+            budgeted_overview(type_facilities, type_disasters, token_budget)
+        try:
+            return chat_completion(
+                messages=[
+                    {"role": "system", "content": "You are a disaster management analyst summarizing impacts for a Situation Report."},
+                    {"role": "user", "content": f"Summarize the {type_name} situation below in a few short paragraphs: the most severe events, the number and location of impacted facilities, and the most urgent concerns.\n\n{overview}"}
+                ],
+                temperature=0.3,
+                max_tokens=summary_tokens,
+                cache_events=type_disasters + [
+                    disaster_impact.get('disaster', {})
+                    for facility in type_facilities
+                    for disaster_impact in facility['impacts']
+                ]
+            )
+        except Exception as e:
+            # A failed summary degrades to the (already bounded) budgeted overview
+            print(f"Error summarizing {type_name} impacts: {e}")
+            return budgeted_overview(type_facilities, type_disasters, summary_tokens)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(SITREP_MAP_CONCURRENCY, len(type_names)))) as pool:
+        summaries = list(pool.map(summarize, type_names))
+    
+    # max_tokens counts model tokens, the budget estimated ones; trim to the estimate
+    summaries = [summary if estimate_tokens(summary) <= share else summary[:share * CHARS_PER_TOKEN - 3] + '...'
+                 for summary in summaries]
+    return '\n'.join(f"{type_name.upper()}:\n{summary}\n" for type_name, summary in zip(type_names, summaries))
 
 def create_situation_overview(impacted_facilities, disasters):
     """Create a comprehensive situation overview for the AI prompt"""
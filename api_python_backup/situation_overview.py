@@ -0,0 +1,188 @@
+import bisect
+import heapq
+import math
+
+from events import event_key
+
+# Rough prompt-size estimate used for budgeting: ~4 characters per token
+CHARS_PER_TOKEN = 4
+
+DISTANCE_BANDS_KM = (25, 50, 100, 250, 500)
+
+ALERT_SEVERITY = {'red': 3, 'orange': 2, 'green': 1}
+
+# Facility fields naming its administrative area, most specific first
+ADMIN_AREA_FIELDS = ('district', 'admin', 'region', 'country')
+
+DISASTER_TYPE_NAMES = {
+    'eq': 'Earthquake',
+    'tc': 'Tropical Cyclone',
+    'fl': 'Flood',
+    'vo': 'Volcanic Activity',
+    'dr': 'Drought'
+}
+
+# Detail kept per disaster before budgeting trims it further
+TOP_AREAS = 5
+NEAREST_FACILITIES = 5
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def overview_line_count(impacted_facilities, disasters):
+    """Lines create_situation_overview would write; each costs at least a token"""
+    return 2 * len(disasters) + sum(2 + len(impact.get('impacts', [])) for impact in impacted_facilities)
+
+
+def disaster_type_name(disaster):
+    disaster_type = disaster.get('eventType', 'unknown').lower()
+    return DISASTER_TYPE_NAMES.get(disaster_type, disaster_type)
+
+
+BAND_LABELS = [f'<={limit} km' for limit in DISTANCE_BANDS_KM] + [f'>{DISTANCE_BANDS_KM[-1]} km']
+
+
+def admin_area(facility):
+    for field in ADMIN_AREA_FIELDS:
+        if facility.get(field):
+            return str(facility[field])
+    return 'Unspecified area'
+
+
+def aggregate_impacts(impacted_facilities, disasters):
+    """
+    Per-disaster aggregates, most severe first: facility counts by distance
+    band and admin area, and the nearest facilities. Disasters that only
+    appear inside impacts are included.
+    """
+    events = {}
+
+    def event_for(disaster):
+        key = event_key(disaster) or id(disaster)
+        event = events.get(key)
+        if event is None:
+            event = events[key] = {
+                'disaster': disaster,
+                'facilities': 0,
+                'bands': [0] * len(BAND_LABELS),
+                'areas': {},
+                'nearest': [],  # max-heap of (-distance, seq, name) holding the closest facilities
+            }
+        return event
+
+    for disaster in disasters:
+        event_for(disaster)
+
+    seq = 0
+    for impact in impacted_facilities:
+        facility = impact.get('facility', {})
+        name = facility.get('name', 'Unnamed facility')
+        area = admin_area(facility)
+        for disaster_impact in impact.get('impacts', []):
+            event = event_for(disaster_impact.get('disaster', {}))
+            distance = disaster_impact.get('distance')
+            distance = float(distance) if isinstance(distance, (int, float)) else math.inf
+
+            event['facilities'] += 1
+            event['bands'][bisect.bisect_left(DISTANCE_BANDS_KM, distance)] += 1
+            areas = event['areas']
+            areas[area] = areas.get(area, 0) + 1
+
+            seq += 1
+            nearest = event['nearest']
+            if len(nearest) < NEAREST_FACILITIES:
+                heapq.heappush(nearest, (-distance, seq, name))
+            elif -distance > nearest[0][0]:
+                heapq.heapreplace(nearest, (-distance, seq, name))
+
+    def severity(event):
+        alert = ALERT_SEVERITY.get(str(event['disaster'].get('alertLevel', '')).lower(), 0)
+        nearest = -max(event['nearest'])[0] if event['nearest'] else math.inf
+        return (-alert, -event['facilities'], nearest)
+
+    ranked = sorted(events.values(), key=severity)
+    for event in ranked:
+        event['nearest'] = [(-d, name) for d, _, name in sorted(event['nearest'], reverse=True)]
+    return ranked
+
+
+def event_lines(event):
+    """
+    Lines describing one disaster, from most to least essential. The first
+    is the headline; the rest are detail that budgeting may drop.
+    """
+    disaster = event['disaster']
+    title = disaster.get('title', 'Unnamed disaster')
+    alert_level = disaster.get('alertLevel', 'unknown')
+    headline = f"- {title} ({disaster_type_name(disaster)}, Alert Level: {alert_level})"
+    if not event['facilities']:
+        return [headline + ": no facilities impacted"]
+
+    lines = [headline + f": {event['facilities']} facilities impacted"]
+    lines.append("  Distance bands: " + ', '.join(f"{label}: {count}" for label, count in zip(BAND_LABELS, event['bands']) if count))
+    areas = sorted(event['areas'].items(), key=lambda item: -item[1])
+    more = f" (+{len(areas) - TOP_AREAS} more areas)" if len(areas) > TOP_AREAS else ''
+    lines.append("  Most affected areas: " + ', '.join(f"{area} ({count})" for area, count in areas[:TOP_AREAS]) + more)
+    nearest = ', '.join(f"{name} ({distance:.1f} km)" if math.isfinite(distance) else name
+                        for distance, name in event['nearest'])
+    lines.append(f"  Nearest facilities: {nearest}")
+    return lines
+
+
+def budgeted_overview(impacted_facilities, disasters, token_budget):
+    """
+    Situation overview that fits in `token_budget` tokens however many
+    facilities are impacted.
+
+    Impacts are aggregated per disaster and disasters ranked by severity
+    (alert level, facilities impacted, nearest distance). Lines are admitted
+    level by level - every headline before any distance bands, bands before
+    areas, areas before facility names - and within a level most severe
+    first, so a tight budget keeps the broad picture rather than the full
+    detail of a few events.
+    """
+    ranked = aggregate_impacts(impacted_facilities, disasters)
+    n_facilities = len(impacted_facilities)
+
+    type_counts = {}
+    for event in ranked:
+        name = disaster_type_name(event['disaster'])
+        type_counts[name] = type_counts.get(name, 0) + 1
+    header = [
+        f"ACTIVE DISASTERS ({len(ranked)}): " + ', '.join(f"{name} {count}" for name, count in type_counts.items()),
+        f"IMPACTED FACILITIES: {n_facilities}",
+        "",
+        "DISASTERS BY SEVERITY:",
+    ]
+
+    blocks = [event_lines(event) for event in ranked]
+    used = sum(estimate_tokens(line) + 1 for line in header)
+    # Room for the note on what was left out
+    reserve = estimate_tokens(f"({len(ranked)} lower-severity disasters and further detail omitted)") + 1
+
+    included = [0] * len(blocks)
+    full = True
+    for level in range(max((len(b) for b in blocks), default=0)):
+        for rank, lines in enumerate(blocks):
+            if level >= len(lines):
+                continue
+            cost = estimate_tokens(lines[level]) + 1
+            if used + cost + reserve > token_budget:
+                full = False
+                break
+            used += cost
+            included[rank] += 1
+        if not full:
+            break
+
+    lines = list(header)
+    for rank, lines_of_event in enumerate(blocks):
+        lines.extend(lines_of_event[:included[rank]])
+    omitted_events = sum(1 for count in included if count == 0)
+    if omitted_events:
+        lines.append(f"({omitted_events} lower-severity disasters and further detail omitted)")
+    elif any(count < len(block) for count, block in zip(included, blocks)):
+        lines.append("(further detail omitted)")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,301 @@
+import numpy as np
+
+import metrics
+from geo_engine import (
+    CHUNK_ELEMENTS,
+    DISTANCE_METHODS,
+    EARTH_RADIUS_KM,
+    SPHERICAL_PREFILTER_MARGIN,
+    concat_pairs,
+    ellipsoidal_km,
+    empty_pairs,
+    haversine_km,
+    pair_distances,
+    sort_pairs,
+)
+
+DEFAULT_CELL_DEG = 1.0
+
+# Below this many facility x disaster pairs the brute-force matrix is faster
+# than building the grid (see benchmarks/bench_spatial_index.py)
+INDEX_MIN_PAIRS = 100_000
+
+
+class FacilityGrid:
+    """
+    Lat/lon grid over facility coordinates.
+
+    Facilities are sorted by cell id (row-major, rows = latitude bands), so
+    every run of adjacent cells inside a latitude band is one contiguous slice
+    of `order`. A radius query therefore costs one or two binary searches per
+    latitude band it crosses, plus the candidates it returns.
+    """
+
+    def __init__(self, lat, lon, cell_deg=DEFAULT_CELL_DEG, order=None, sorted_cells=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_rows = int(np.ceil(180 / cell_deg))
+        self.n_cols = int(np.ceil(360 / cell_deg))
+
+        if order is None:
+            cells = self._rows(self.lat) * self.n_cols + self._cols(self.lon)
+            order = np.argsort(cells, kind='stable')
+            sorted_cells = cells[order]
+        self.order = order
+        self.sorted_cells = sorted_cells
+
+    @classmethod
+    def from_sorted(cls, lat, lon, order, sorted_cells, cell_deg=DEFAULT_CELL_DEG):
+        """Rebuild a grid from a previously computed `order` / `sorted_cells` pair"""
+        return cls(lat, lon, cell_deg=cell_deg, order=order, sorted_cells=sorted_cells)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _rows(self, lat):
+        return np.clip(np.floor((lat + 90) / self.cell_deg), 0, self.n_rows - 1).astype(np.int64)
+
+    def _cols(self, lon):
+        return (np.floor((lon + 180) / self.cell_deg) % self.n_cols).astype(np.int64)
+
+    def _slices(self, row_lo, row_hi, col_ranges):
+        """Facility indices in rows [row_lo, row_hi] for inclusive column ranges"""
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.n_cols
+        parts = []
+        for col_lo, col_hi in col_ranges:
+            starts = np.searchsorted(self.sorted_cells, rows + col_lo, side='left')
+            stops = np.searchsorted(self.sorted_cells, rows + col_hi, side='right')
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                if stop > start:
+                    parts.append(self.order[start:stop])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def query_bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """
+        Candidate facilities whose cell intersects the box. `lon_min > lon_max`
+        denotes a box crossing the antimeridian.
+        """
+        row_lo = int(self._rows(np.float64(lat_min)))
+        row_hi = int(self._rows(np.float64(lat_max)))
+        col_lo = int(self._cols(np.float64(lon_min)))
+        col_hi = int(self._cols(np.float64(lon_max)))
+        if lon_max - lon_min >= 360:
+            col_ranges = [(0, self.n_cols - 1)]
+        elif col_lo <= col_hi and lon_min <= lon_max:
+            col_ranges = [(col_lo, col_hi)]
+        else:
+            col_ranges = [(col_lo, self.n_cols - 1), (0, col_hi)]
+        return self._slices(row_lo, row_hi, col_ranges)
+
+    def _col_ranges(self, col_lo, col_hi):
+        """Inclusive column ranges for columns col_lo..col_hi, which may wrap"""
+        if col_hi - col_lo + 1 >= self.n_cols:
+            return [(0, self.n_cols - 1)]
+        col_lo, col_hi = col_lo % self.n_cols, col_hi % self.n_cols
+        if col_lo <= col_hi:
+            return [(col_lo, col_hi)]
+        return [(col_lo, self.n_cols - 1), (0, col_hi)]
+
+    def query_ring(self, row, col, inner, outer):
+        """
+        Facilities in the cells within `outer` but not within `inner` cells
+        (Chebyshev distance) of cell (row, col); `inner` = -1 includes the
+        centre cell. Rows are clipped at the poles, columns wrap around.
+        """
+        cols = self._col_ranges(col - outer, col + outer)
+        if inner < 0:
+            return self._slices(max(row - outer, 0), min(row + outer, self.n_rows - 1), cols)
+
+        # Full-width bands south and north of the inner window
+        parts = []
+        for row_lo, row_hi in ((row - outer, row - inner - 1), (row + inner + 1, row + outer)):
+            row_lo, row_hi = max(row_lo, 0), min(row_hi, self.n_rows - 1)
+            if row_lo <= row_hi:
+                parts.append(self._slices(row_lo, row_hi, cols))
+
+        # Columns east and west of the inner window, in its rows
+        if 2 * inner + 1 < self.n_cols:
+            if 2 * outer + 1 >= self.n_cols:
+                cols = self._col_ranges(col + inner + 1, col - inner - 1 + self.n_cols)
+            else:
+                cols = self._col_ranges(col - outer, col - inner - 1) + self._col_ranges(col + inner + 1, col + outer)
+            parts.append(self._slices(max(row - inner, 0), min(row + inner, self.n_rows - 1), cols))
+
+        parts = [part for part in parts if part.size]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def window_bound(self, lat, lon, row, col, radius):
+        """
+        Lower bound, in radians on the sphere, on the distance from (lat, lon)
+        to any point outside the cells within `radius` of cell (row, col).
+        """
+        bound = np.inf
+        phi = np.radians(lat)
+        if row - radius > 0:
+            bound = min(bound, phi - np.radians((row - radius) * self.cell_deg - 90))
+        if row + radius < self.n_rows - 1:
+            bound = min(bound, np.radians((row + radius + 1) * self.cell_deg - 90) - phi)
+        if 2 * radius + 1 < self.n_cols:
+            # Distance to the great circle of the nearer bounding meridian
+            dlon = min(lon - ((col - radius) * self.cell_deg - 180),
+                       ((col + radius + 1) * self.cell_deg - 180) - lon)
+            dlon = np.radians(min(dlon, 90.0))
+            bound = min(bound, np.arcsin(min(1.0, np.cos(phi) * np.sin(dlon))))
+        return max(bound, 0.0)
+
+    def window_radius(self, lat, radius_km):
+        """Cells around a point's cell that hold every point within `radius_km` of it"""
+        theta = radius_km / EARTH_RADIUS_KM
+        rows = int(np.ceil(np.degrees(theta) / self.cell_deg))
+        sin_ratio = np.sin(min(theta, np.pi / 2)) / max(np.cos(np.radians(lat)), 1e-12)
+        if theta >= np.pi / 2 or sin_ratio >= 1:
+            return max(rows, self.n_cols // 2)
+        return max(rows, int(np.ceil(np.degrees(np.arcsin(sin_ratio)) / self.cell_deg)))
+
+    def query_radius(self, lat, lon, radius_km):
+        """
+        Candidate facilities within `radius_km` of a point (a superset: exact
+        distances still have to be checked by the caller).
+        """
+        # Angular radius on the sphere, widened to cover the ellipsoid
+        rho = np.degrees(radius_km * SPHERICAL_PREFILTER_MARGIN / EARTH_RADIUS_KM)
+        lat_min, lat_max = lat - rho, lat + rho
+
+        if lat_min <= -90 or lat_max >= 90:
+            # The cap contains a pole: every longitude is reachable
+            return self.query_bbox(max(lat_min, -90), -180, min(lat_max, 90), 180)
+
+        # Widest longitude extent of a spherical cap of angular radius rho
+        sin_ratio = np.sin(np.radians(rho)) / np.cos(np.radians(lat))
+        if sin_ratio >= 1:
+            return self.query_bbox(lat_min, -180, lat_max, 180)
+        dlon = np.degrees(np.arcsin(sin_ratio))
+        lon_min = (lon - dlon + 180) % 360 - 180
+        lon_max = (lon + dlon + 180) % 360 - 180
+        return self.query_bbox(lat_min, lon_min, lat_max, lon_max)
+
+
+def _knn_candidates(grid, lat, lon, k, margin, max_km):
+    """
+    Facilities that may be among the `k` nearest to a point, with their
+    haversine distances: every facility within `margin` times the k-th
+    nearest haversine distance (and within max_km * margin).
+    """
+    lon = (lon + 180) % 360 - 180
+    row, col = int(grid._rows(np.float64(lat))), int(grid._cols(np.float64(lon)))
+    limit_km = max_km * margin if max_km is not None else np.inf
+
+    candidates, distances, total = [], [], 0
+    inner, outer = -1, 0
+    while True:
+        found = grid.query_ring(row, col, inner, outer)
+        if found.size:
+            candidates.append(found)
+            distances.append(haversine_km(grid.lat[found], grid.lon[found], lat, lon))
+            metrics.count('pairs_evaluated', found.size)
+            total += found.size
+        bound_km = grid.window_bound(lat, lon, row, col, outer) * EARTH_RADIUS_KM
+        if total >= k:
+            cutoff = min(np.partition(np.concatenate(distances), k - 1)[k - 1] * margin, limit_km)
+        else:
+            cutoff = limit_km
+        if cutoff <= bound_km or np.isinf(bound_km):
+            break
+        if total >= k or max_km is not None:
+            # Straight to the window that holds every point within the cutoff
+            next_outer = grid.window_radius(lat, min(cutoff, np.pi * EARTH_RADIUS_KM))
+            if total < k:
+                next_outer = min(next_outer, max(1, outer * 2))
+        else:
+            next_outer = outer * 2
+        inner, outer = outer, max(outer + 1, next_outer)
+
+    if not candidates:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    candidates = np.concatenate(candidates)
+    distances = np.concatenate(distances)
+    keep = distances <= cutoff
+    return candidates[keep], distances[keep]
+
+
+def nearest_in_grid(grid, lat, lon, k, method='ellipsoidal', max_km=None):
+    """
+    The `k` facilities nearest to each point of `lat`/`lon`, optionally
+    within `max_km`: a list of (facility indices, distances in km) ordered
+    by distance.
+
+    Rings of grid cells are searched outwards until the k-th nearest
+    haversine distance found is within the lower bound on the distance to
+    any cell not searched yet. In ellipsoidal mode that cut-off is widened
+    by the prefilter margin on both sides, and Vincenty ranks the candidates
+    of all points in one batch.
+    """
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Unknown distance method '{method}'")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if k <= 0 or len(grid) == 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0)) for _ in range(len(lat))]
+    # Haversine distances that may still hold the k-th exact distance
+    margin = 1.0 if method == 'haversine' else SPHERICAL_PREFILTER_MARGIN ** 2
+
+    found = [_knn_candidates(grid, lat[j], lon[j], k, margin, max_km) for j in range(len(lat))]
+    if method == 'ellipsoidal' and found:
+        sizes = [len(candidates) for candidates, _ in found]
+        fac = np.concatenate([candidates for candidates, _ in found])
+        exact = ellipsoidal_km(grid.lat[fac], grid.lon[fac], np.repeat(lat, sizes), np.repeat(lon, sizes))
+        found = list(zip([candidates for candidates, _ in found], np.split(exact, np.cumsum(sizes)[:-1])))
+
+    nearest = []
+    for candidates, distances in found:
+        if max_km is not None:
+            keep = distances <= max_km
+            candidates, distances = candidates[keep], distances[keep]
+        order = np.lexsort((candidates, distances))[:k]
+        nearest.append((candidates[order], distances[order]))
+    return nearest
+
+
+def indexed_impact_pairs(grid, dis_lat, dis_lon, radii, method='ellipsoidal',
+                         chunk_elements=CHUNK_ELEMENTS):
+    """
+    Same contract as geo_engine.impact_pairs, but only the facilities returned
+    by a grid radius query are measured for each disaster. Candidates of
+    several disasters are measured together in batches of about
+    `chunk_elements` pairs, which keeps per-call overhead low.
+    """
+    fac_parts, dis_parts, dist_parts = [], [], []
+    batch_fac, batch_dis, batch_size = [], [], 0
+
+    def flush():
+        fac = np.concatenate(batch_fac)
+        dis = np.concatenate(batch_dis)
+        keep, distances = pair_distances(grid.lat[fac], grid.lon[fac], dis_lat[dis], dis_lon[dis],
+                                         radii[dis], method=method)
+        fac_parts.append(fac[keep])
+        dis_parts.append(dis[keep])
+        dist_parts.append(distances)
+        batch_fac.clear()
+        batch_dis.clear()
+
+    for j in range(len(dis_lat)):
+        candidates = grid.query_radius(dis_lat[j], dis_lon[j], radii[j])
+        if candidates.size == 0:
+            continue
+        batch_fac.append(candidates)
+        batch_dis.append(np.full(candidates.size, j, dtype=np.int64))
+        batch_size += candidates.size
+        if batch_size >= chunk_elements:
+            flush()
+            batch_size = 0
+    if batch_fac:
+        flush()
+
+    if not fac_parts:
+        return empty_pairs()
+    return sort_pairs(*concat_pairs(fac_parts, dis_parts, dist_parts))
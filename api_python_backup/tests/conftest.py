@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The handlers are flat modules imported by name, as in the serverless layout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Nothing in the tests may reach gdacs.org, the LLM or shared caches on disk
+os.environ['GDACS_RSS_URL'] = ''
+os.environ['LLM_CACHE_ENABLED'] = '0'
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+
+class StubLLM:
+    """
+    Local chat completions endpoint. Requests are answered with the queued
+    `statuses` (then 200s); streams send one chunk per word of `answer` every
+    `token_delay` seconds, or a malformed first chunk with `bad_stream`.
+    """
+
+    def __init__(self, answer='Stay safe'):
+        self.answer = answer
+        self.statuses = []
+        self.token_delay = 0.0
+        self.bad_stream = False
+        self.requests = []
+        self.tokens_sent = 0
+        self.disconnects = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append((time.monotonic(), bool(body.get('stream'))))
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                if status == 200 and body.get('stream'):
+                    self.stream()
+                    return
+                if status == 200:
+                    payload = {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': stub.answer}}],
+                               'usage': {'prompt_tokens': 5, 'completion_tokens': 2}}
+                else:
+                    payload = {'error': {'message': f'stub {status}', 'type': 'server_error'}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self):
+                # No length: the stream ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+                self.end_headers()
+                try:
+                    if stub.bad_stream:
+                        self.wfile.write(b'data: {not json\n\n')
+                        return
+                    for word in stub.answer.split(' '):
+                        chunk = {'choices': [{'index': 0, 'delta': {'content': word + ' '}}]}
+                        self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                        self.wfile.flush()
+                        stub.tokens_sent += 1
+                        time.sleep(stub.token_delay)
+                    self.wfile.write(b'data: [DONE]\n\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnects += 1
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+
+@pytest.fixture
+def llm_api(monkeypatch):
+    """A StubLLM the openai client talks to for the duration of the test"""
+    import llm
+    stub = StubLLM()
+    monkeypatch.setattr(llm._openai(), 'api_base', f'http://127.0.0.1:{stub.server.server_port}/v1')
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
@@ -0,0 +1,112 @@
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import alert_store
+from alert_store import AlertStore, window_options
+from facility_ingest import read_facilities
+from impact_assessment import assess_history
+
+NOW = 1_700_000_000
+DAY = 86400
+
+
+def alert(event_id, when, lat, lon, event_type='EQ', level='Red'):
+    return {'eventId': event_id, 'eventType': event_type, 'alertLevel': level, 'title': f'{event_type} {event_id}',
+            'pubDate': format_datetime(datetime.fromtimestamp(when, timezone.utc)),
+            'latitude': lat, 'longitude': lon}
+
+
+def titles(alerts):
+    return [(a['title'], a['alertLevel']) for a in alerts]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AlertStore(str(tmp_path))
+
+
+def test_append_stores_each_version_once(store):
+    feed = [alert(1, NOW - 10 * DAY, 10, 10), alert(2, NOW - 5 * DAY, 50, 50, 'TC'), {'title': 'no date'}]
+
+    assert store.append(feed) == 2
+    assert store.append(feed) == 0
+    assert store.append([alert(1, NOW - 9 * DAY, 10, 10, level='Orange')]) == 1
+    assert len(store) == 3
+    # Another instance (another worker) sees the same versions
+    assert AlertStore(store.root).append(feed) == 0
+
+
+def test_query_by_time_window(store):
+    store.append([alert(1, NOW - 100 * DAY, 0, 0), alert(2, NOW - 10 * DAY, 0, 0), alert(3, NOW, 0, 0)])
+
+    assert titles(store.query(start=NOW - 30 * DAY, end=NOW - DAY)) == [('EQ 2', 'Red')]
+    assert titles(store.query(**window_options({'days': 30}, now=NOW))) == [('EQ 2', 'Red'), ('EQ 3', 'Red')]
+    assert titles(store.query(limit=1)) == [('EQ 3', 'Red')]
+
+
+def test_query_by_bbox_and_across_the_antimeridian(store):
+    store.append([alert(1, NOW, 10, 10), alert(2, NOW, 0, 179.5), alert(3, NOW, 0, -179.5), alert(4, NOW, 0, 0),
+                  alert(5, NOW, 60, 179.5)])
+
+    assert titles(store.query(bbox=(0, 5, 20, 15))) == [('EQ 1', 'Red')]
+    assert titles(store.query(bbox=(-5, 170, 5, -170))) == [('EQ 2', 'Red'), ('EQ 3', 'Red')]
+
+
+def test_latest_version_per_event(store):
+    store.append([alert(1, NOW - 3 * DAY, 10, 10, level='Green'), alert(2, NOW - 2 * DAY, 10, 10)])
+    store.append([alert(1, NOW - DAY, 10, 10, level='Orange')])
+
+    assert titles(store.query()) == [('EQ 2', 'Red'), ('EQ 1', 'Orange')]
+    assert titles(store.query(latest=False)) == [('EQ 1', 'Green'), ('EQ 2', 'Red'), ('EQ 1', 'Orange')]
+    # Latest within the window, not overall
+    assert titles(store.query(end=NOW - 2 * DAY)) == [('EQ 1', 'Green'), ('EQ 2', 'Red')]
+    assert titles(store.query(alert_levels=['green'])) == [('EQ 1', 'Green')]
+
+
+def test_repeated_appends_are_merged_by_size(store):
+    for batch in range(64):
+        store.append([alert(batch, NOW + batch, 10, 10)])
+        segments = [len(segment) for segment in store.segments()]
+        # Sizes shrink at least by MERGE_RATIO towards the tail
+        assert all(older > newer * alert_store.MERGE_RATIO for older, newer in zip(segments, segments[1:]))
+
+    assert len(store) == 64 and len(store.segments()) <= 7
+    assert [a['title'] for a in store.query()] == [f'EQ {batch}' for batch in range(64)]
+    # Merged-away segments are removed from disk
+    assert len([name for name in os.listdir(store.root) if name.startswith('segment-')]) == len(store.segments())
+
+    assert store.compact() == len(segments)
+    assert len(store.segments()) == 1 and len(store) == 64
+
+
+def test_concurrent_appends_from_threads(store):
+    feeds = [[alert(event, NOW + event, 10, 10) for event in range(thread, thread + 20)] for thread in range(8)]
+    added = []
+    threads = [threading.Thread(target=lambda feed=feed: added.append(store.append(feed))) for feed in feeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(added) == len(store) == 27
+
+
+def test_assess_history(store):
+    store.append([alert(1, NOW - 40 * DAY, 10, 10), alert(2, NOW - 5 * DAY, 10.2, 10.2, level='Orange'),
+                  alert(3, NOW - 5 * DAY, 50, 50, 'TC')])
+    store.append([alert(2, NOW - 2 * DAY, 10.2, 10.2)])
+    facilities = read_facilities('name,latitude,longitude\nClinic,10.1,10.1\nSchool,-40,-40\n')
+
+    impacted = assess_history(facilities, store, start=NOW - 30 * DAY, event_types=['EQ'])
+    assert [entry['facility']['name'] for entry in impacted] == ['Clinic']
+    assert [(i['disaster']['title'], i['disaster']['alertLevel']) for i in impacted[0]['impacts']] == [('EQ 2', 'Red')]
+
+
+@pytest.mark.parametrize('options', [{'bbox': [1, 2]}, {'days': -1}, {'start': 'junk'}, {'versions': 'some'}])
+def test_invalid_window_options(options):
+    with pytest.raises(ValueError):
+        window_options(options)
@@ -0,0 +1,76 @@
+import base64
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from facility_ingest import ADMIN_COLUMNS, read_facilities
+from impact_assessment import assess_impact
+from situation_overview import ADMIN_AREA_FIELDS, aggregate_impacts
+
+CSV = '''name,latitude,longitude,district,country,beds
+Clinic A,10.0,20.0,Nairobi,Kenya,12
+Clinic B,10.1,20.1,, Kenya ,4
+Clinic C,10.2,20.2,Mombasa,,8
+'''
+
+EXPECTED = [
+    {'name': 'Clinic A', 'latitude': 10.0, 'longitude': 20.0, 'district': 'Nairobi', 'country': 'Kenya'},
+    {'name': 'Clinic B', 'latitude': 10.1, 'longitude': 20.1, 'country': 'Kenya'},
+    {'name': 'Clinic C', 'latitude': 10.2, 'longitude': 20.2, 'district': 'Mombasa'},
+]
+
+
+def table():
+    return pa.table({'name': ['Clinic A', 'Clinic B', 'Clinic C'], 'latitude': [10.0, 10.1, 10.2],
+                     'longitude': [20.0, 20.1, 20.2], 'district': ['Nairobi', None, 'Mombasa'],
+                     'country': ['Kenya', ' Kenya ', ''], 'beds': [12, 4, 8]})
+
+
+def parquet_payload():
+    buffer = io.BytesIO()
+    pq.write_table(table(), buffer)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def arrow_payload():
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table().schema) as writer:
+        writer.write_table(table())
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode()
+
+
+def test_admin_columns_are_the_overview_area_fields():
+    assert ADMIN_COLUMNS == ADMIN_AREA_FIELDS
+
+
+@pytest.mark.parametrize('payload, facilities_format', [
+    (CSV, 'csv'), (parquet_payload(), 'parquet'), (arrow_payload(), 'arrow')])
+def test_admin_columns_are_kept_when_present(payload, facilities_format):
+    facilities = read_facilities(payload, facilities_format)
+
+    assert [facilities.record(i) for i in range(len(facilities))] == EXPECTED
+    assert sorted(facilities.admin_columns) == ['country', 'district']
+
+
+def test_uploads_without_admin_columns_are_unchanged():
+    facilities = read_facilities('name,latitude,longitude\nClinic A,10,20\n')
+
+    assert facilities.admin_columns == {}
+    assert facilities.record(0) == {'name': 'Clinic A', 'latitude': 10.0, 'longitude': 20.0}
+
+
+@pytest.mark.parametrize('payload', ['name,latitude\nClinic A,10\n', 'name,latitude,district\nClinic A,10,Nairobi\n'])
+def test_missing_required_columns_are_reported(payload):
+    with pytest.raises(ValueError, match='missing columns: longitude'):
+        read_facilities(payload)
+
+
+def test_overview_groups_uploaded_facilities_by_area():
+    facilities = read_facilities(CSV)
+    disaster = {'guid': 'EQ1', 'eventType': 'EQ', 'title': 'M6', 'latitude': 10.1, 'longitude': 20.1}
+    impacted = assess_impact(facilities, [disaster])
+
+    events = aggregate_impacts(impacted, [disaster])
+    assert events[0]['areas'] == {'Nairobi': 1, 'Kenya': 1, 'Mombasa': 1}
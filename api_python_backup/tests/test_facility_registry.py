@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+from facility_ingest import FacilityColumns
+from facility_registry import FacilityRegistry
+
+
+def make_facilities(rows=1_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return FacilityColumns(np.array([f'Facility {i} é' for i in range(rows)], dtype=object),
+                           rng.uniform(-60, 60, rows), rng.uniform(-180, 180, rows))
+
+
+def test_register_is_content_addressed(tmp_path):
+    registry = FacilityRegistry(str(tmp_path))
+    facilities = make_facilities()
+    set_id = registry.register(facilities)
+
+    records = [{'name': str(n), 'latitude': lat, 'longitude': lon}
+               for n, lat, lon in zip(facilities.name, facilities.latitude, facilities.longitude)]
+    assert registry.register(records) == set_id
+    assert registry.register(make_facilities(seed=1)) != set_id
+
+
+def test_register_opened_set_returns_its_id(tmp_path):
+    registry = FacilityRegistry(str(tmp_path))
+    opened = registry.open(registry.register(make_facilities()))
+
+    assert registry.register(opened) == opened.set_id
+    assert sorted(os.listdir(tmp_path)) == [opened.set_id]
+
+
+def test_register_opened_set_into_another_registry(tmp_path):
+    source = FacilityRegistry(str(tmp_path / 'a'))
+    opened = source.open(source.register(make_facilities()))
+    target = FacilityRegistry(str(tmp_path / 'b'))
+
+    assert target.register(opened) == opened.set_id
+    copy = target.open(opened.set_id)
+    assert [copy.record(i) for i in range(len(copy))] == [opened.record(i) for i in range(len(opened))]
+
+
+def test_stored_columns_are_the_ones_read(tmp_path):
+    registry = FacilityRegistry(str(tmp_path))
+    set_id = registry.register(make_facilities())
+
+    assert sorted(os.listdir(tmp_path / set_id)) == sorted(
+        ['latitude.npy', 'longitude.npy', 'name_offsets.npy', 'grid_order.npy', 'grid_cells.npy', 'names.bin'])
+
+
+def test_admin_columns_are_stored_and_hashed(tmp_path):
+    registry = FacilityRegistry(str(tmp_path))
+    plain = make_facilities(rows=3)
+    with_admin = FacilityColumns(plain.name, plain.latitude, plain.longitude,
+                                 {'country': ['Kenya', None, 'Chad'], 'district': ['Nairobi', None, None]})
+    plain_id, admin_id = registry.register(plain), registry.register(with_admin)
+
+    assert plain_id != admin_id
+    opened = registry.open(admin_id)
+    assert [opened.record(i) for i in range(3)] == [with_admin.record(i) for i in range(3)]
+    assert registry.open(plain_id).admin_columns == {}
+
+    # Column order of the upload does not change the id
+    reordered = FacilityColumns(plain.name, plain.latitude, plain.longitude,
+                                {'district': ['Nairobi', None, None], 'country': ['Kenya', None, 'Chad']})
+    assert registry.register(reordered) == admin_id
+    assert FacilityRegistry(str(tmp_path / 'copy')).register(opened) == admin_id
+
+
+def stored(root):
+    return sorted(name for name in os.listdir(root) if not name.startswith('.'))
+
+
+def test_least_recently_used_sets_are_evicted(tmp_path):
+    registry = FacilityRegistry(str(tmp_path), max_sets=3)
+    a, b, c = (registry.register(make_facilities(rows=100, seed=seed)) for seed in range(3))
+    registry.open(a)
+    d = registry.register(make_facilities(rows=100, seed=3))
+
+    assert stored(tmp_path) == sorted([a, c, d])
+    with pytest.raises(ValueError, match='Unknown facility set'):
+        registry.open(b)
+    # Registering again marks it used
+    registry.register(make_facilities(rows=100, seed=2))
+    assert registry.register(make_facilities(rows=100, seed=1)) == b
+    assert stored(tmp_path) == sorted([b, c, d])
+
+
+def test_registry_is_bounded_by_bytes(tmp_path):
+    probe = FacilityRegistry(str(tmp_path / 'probe'))
+    one_set = sum(f.stat().st_size for f in os.scandir(tmp_path / 'probe' / probe.register(make_facilities())))
+    registry = FacilityRegistry(str(tmp_path / 'bounded'), max_bytes=int(one_set * 2.5))
+    ids = [registry.register(make_facilities(seed=seed)) for seed in range(4)]
+
+    assert stored(tmp_path / 'bounded') == sorted(ids[2:])
+    # A set larger than the bound on its own is still kept
+    large = FacilityRegistry(str(tmp_path / 'large'), max_bytes=1)
+    set_id = large.register(make_facilities())
+    assert stored(tmp_path / 'large') == [set_id]
+
+
+def test_open_set_stays_readable_after_eviction(tmp_path):
+    registry = FacilityRegistry(str(tmp_path), max_sets=1)
+    opened = registry.open(registry.register(make_facilities(rows=100)))
+    registry.register(make_facilities(rows=100, seed=1))
+
+    assert stored(tmp_path) != [opened.set_id]
+    assert opened.record(0)['name'] == 'Facility 0 é'
+    assert len(opened.grid().query_bbox(-90, -180, 90, 180)) == 100
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from feed_cache import FeedCache
+
+
+class Upstream:
+    """Local feed server with an ETag, a settable body and response delay"""
+
+    def __init__(self):
+        self.items = [{'guid': 'EQ1'}]
+        self.delay = 0.0
+        self.requests = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                upstream.requests.append(dict(self.headers))
+                time.sleep(upstream.delay)
+                body = json.dumps(upstream.items).encode()
+                etag = f'"{hash(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/feed.json'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def counting_parse(calls):
+    def parse(stream):
+        calls.append(1)
+        return json.load(stream)
+    return parse
+
+
+def test_cold_cache_fetches_once_for_concurrent_callers(upstream):
+    upstream.delay = 0.3
+    parses = []
+    cache = FeedCache(upstream.url, parse=counting_parse(parses))
+    results = []
+    barrier = threading.Barrier(8)
+
+    def get():
+        barrier.wait()
+        results.append(cache.get())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(upstream.requests) == 1 and len(parses) == 1
+    assert [items for items, _ in results] == [[{'guid': 'EQ1'}]] * 8
+    assert {state for _, state in results} == {'miss'}
+
+
+def test_unchanged_feed_revalidates_with_304(upstream):
+    parses, enriched = [], []
+    cache = FeedCache(upstream.url, parse=counting_parse(parses),
+                      enrich=lambda items: enriched.append(items) or items)
+    items, _ = cache.get()
+    cache.refresh(wait=True)
+
+    assert upstream.requests[1]['If-None-Match'] == cache._entry['etag']
+    assert len(parses) == 1 and len(enriched) == 1
+    assert cache.get() == (items, 'fresh') and cache.get()[0] is items
+
+
+def test_stale_items_served_while_revalidating(upstream):
+    cache = FeedCache(upstream.url, parse=json.load, ttl=0, stale_ttl=60)
+    cache.get()
+    upstream.items = [{'guid': 'EQ2'}]
+    upstream.delay = 0.5
+
+    start = time.perf_counter()
+    items, state = cache.get()
+    assert (items, state) == ([{'guid': 'EQ1'}], 'stale')
+    assert time.perf_counter() - start < 0.25
+
+    # Joins the background refresh instead of starting another
+    assert cache.refresh(wait=True)['items'] == [{'guid': 'EQ2'}]
+    assert len(upstream.requests) == 2
+
+
+def test_items_past_the_stale_window_are_refetched(upstream):
+    cache = FeedCache(upstream.url, parse=json.load, ttl=0, stale_ttl=0)
+    cache.get()
+    upstream.items = [{'guid': 'EQ2'}]
+
+    assert cache.get() == ([{'guid': 'EQ2'}], 'miss')
+
+
+def test_cold_process_starts_from_snapshot(upstream, tmp_path):
+    snapshot = str(tmp_path / 'feed.json')
+    FeedCache(upstream.url, parse=json.load, snapshot_path=snapshot).get()
+    upstream.server.shutdown()
+
+    restored = FeedCache(upstream.url, parse=json.load, snapshot_path=snapshot)
+    assert restored.get() == ([{'guid': 'EQ1'}], 'fresh')
+    assert len(upstream.requests) == 1
+
+    # A snapshot of another feed is ignored
+    other = FeedCache(upstream.url + '?other', parse=json.load, snapshot_path=snapshot, timeout=(0.5, 0.5))
+    assert other.get() == ([], 'miss')
@@ -0,0 +1,122 @@
+import io
+
+import pytest
+
+import gdacs
+from events import event_key
+
+RSS = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:geo="http://www.w3.org/2003/01/geo/wgs84_pos#" xmlns:gdacs="http://www.gdacs.org">
+<channel>
+{items}
+</channel>
+</rss>
+'''
+
+RSS_ITEM = '''<item>
+<title>{title}</title>
+<link>https://www.gdacs.org/report.aspx?eventid={event_id}</link>
+<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>
+<guid isPermaLink="false">{guid}</guid>
+<geo:Point><geo:lat>10.0</geo:lat><geo:long>20.0</geo:long></geo:Point>
+<gdacs:eventtype>{event_type}</gdacs:eventtype>
+<gdacs:alertlevel>{alert}</gdacs:alertlevel>
+<gdacs:eventid>{event_id}</gdacs:eventid>
+<gdacs:episodeid>2</gdacs:episodeid>
+<gdacs:population>1000 people</gdacs:population>
+</item>'''
+
+
+def rss_items(*items):
+    xml = RSS.format(items=''.join(RSS_ITEM.format(**dict({'title': 'RSS event', 'alert': 'Red'}, **item))
+                                   for item in items))
+    return list(gdacs.iter_gdacs_rss_data(io.BytesIO(xml.encode())))
+
+
+def cap_event(guid, event_type='EQ', event_id=None):
+    parameters = {'alertlevel': 'Green'}
+    if event_id is not None:
+        parameters['eventid'] = event_id
+    return {'title': f'CAP {guid}', 'guid': guid, 'eventType': event_type, 'pubDate': 'Mon, 01 Jan 2024 00:00:00 GMT',
+            'latitude': 10.0, 'longitude': 20.0, 'link': '', 'webUrl': '', 'severity': '', 'certainty': 'Observed',
+            'urgency': 'Past', 'headline': f'CAP {guid}', 'polygon': [[9, 19], [11, 19], [11, 21], [9, 19]],
+            'parameters': parameters}
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Serve the given items as the RSS feed to enrich_gdacs_events"""
+    feed = []
+    monkeypatch.setattr(gdacs, 'fetch_gdacs_rss_data', lambda url: feed)
+    return feed
+
+
+def enrich(disasters, **kwargs):
+    return gdacs.enrich_gdacs_events(disasters, rss_url='http://rss.test/rss.xml', fetch_geometry=False, **kwargs)
+
+
+def test_rss_matches_on_event_type_and_id_before_guid(rss):
+    # Same event under another guid, and another event reusing a CAP guid
+    rss.extend(rss_items({'guid': 'rss-guid', 'event_type': 'EQ', 'event_id': '1001', 'alert': 'Red'},
+                         {'guid': 'EQ1002', 'event_type': 'TC', 'event_id': '9', 'alert': 'Orange'}))
+    merged = enrich([cap_event('EQ1001', event_id='1001'), cap_event('EQ1002', event_id='1002')])
+
+    assert [(d['guid'], d['alertLevel'], d['population']) for d in merged if 'population' in d] == \
+        [('EQ1001', 'Red', '1000 people')]
+    assert merged[1]['alertLevel'] == 'Green'
+
+
+def test_rss_falls_back_to_guid_without_cap_event_id(rss):
+    rss.extend(rss_items({'guid': 'EQ1001', 'event_type': 'EQ', 'event_id': '1001', 'alert': 'Orange'}))
+    merged = enrich([cap_event('EQ1001')])
+
+    assert len(merged) == 1
+    assert (merged[0]['alertLevel'], merged[0]['eventId']) == ('Orange', '1001')
+
+
+def test_event_id_match_ignores_type_case_and_whitespace(rss):
+    rss.extend(rss_items({'guid': 'x', 'event_type': 'eq', 'event_id': ' 1001 ', 'alert': 'Red'}))
+    merged = enrich([cap_event('EQ1001', event_id='1001')])
+
+    assert len(merged) == 1 and merged[0]['alertLevel'] == 'Red'
+
+
+def test_rss_only_events_dropped_by_default(rss):
+    rss.extend(rss_items({'guid': 'FL5', 'event_type': 'FL', 'event_id': '5'}))
+    merged = enrich([cap_event('EQ1001', event_id='1001')])
+
+    assert [d['guid'] for d in merged] == ['EQ1001']
+
+
+def test_appended_rss_only_events_have_cap_fields(rss):
+    rss.extend(rss_items({'guid': 'FL5', 'event_type': 'FL', 'event_id': '5'},
+                         {'guid': 'FL5-again', 'event_type': 'FL', 'event_id': '5'}))
+    cap = cap_event('EQ1001', event_id='1001')
+    merged = enrich([cap], append_rss=True)
+
+    assert [event_key(d) for d in merged] == ['EQ:1001', 'FL:5']
+    appended = merged[1]
+    assert set(cap) <= set(appended)
+    assert appended['polygon'] == [] and appended['headline'] == 'RSS event'
+    assert appended['webUrl'] == appended['link']
+    assert appended['parameters'] == {'alertlevel': 'Red', 'eventid': '5', 'episodeid': '2',
+                                      'population': '1000 people'}
+
+
+def test_events_without_a_key_are_all_kept_in_order(rss):
+    keyless = [{'eventType': 'EQ', 'latitude': lat, 'longitude': 0.0} for lat in (1.0, 2.0)]
+    rss.extend(rss_items({'guid': 'FL5', 'event_type': 'FL', 'event_id': '5'}))
+    rss[0].update(guid='', title='', eventId='')
+    merged = enrich([keyless[0], cap_event('EQ1001', event_id='1001'), keyless[1]], append_rss=True)
+
+    assert [d['latitude'] for d in merged] == [1.0, 10.0, 2.0, 10.0]
+    assert merged[3]['polygon'] == []
+
+
+def test_duplicate_events_merge_into_the_first(rss):
+    rss.extend(rss_items({'guid': 'EQ1001', 'event_type': 'EQ', 'event_id': '1001', 'alert': 'Red'}))
+    first, second = cap_event('EQ1001', event_id='1001'), cap_event('EQ1001-b', event_id='1001')
+    merged = enrich([first, cap_event('EQ1002', event_id='1002'), second])
+
+    assert [d['guid'] for d in merged] == ['EQ1001', 'EQ1002']
+    assert merged[0] is first and first['alertLevel'] == 'Red'
@@ -0,0 +1,218 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import gdacs
+from geometry import (GeometryProcessor, _douglas_peucker_keep, _planar, decode_polyline, encode_polyline,
+                      quantize, simplify_polygon)
+
+GOOGLE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+GOOGLE_ENCODED = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+def reference_douglas_peucker(points, tolerance, lo=0, hi=None, keep=None):
+    """Textbook recursive Douglas-Peucker, one segment at a time"""
+    if keep is None:
+        hi = len(points) - 1
+        keep = np.zeros(len(points), dtype=bool)
+        keep[[0, hi]] = True
+    if hi - lo < 2:
+        return keep
+    start, direction = points[lo], points[hi] - points[lo]
+    offsets = points[lo + 1:hi] - start
+    length = np.hypot(*direction)
+    distances = (np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length if length > 0
+                 else np.hypot(offsets[:, 0], offsets[:, 1]))
+    farthest = int(np.argmax(distances))
+    if distances[farthest] > tolerance:
+        keep[lo + 1 + farthest] = True
+        reference_douglas_peucker(points, tolerance, lo, lo + 1 + farthest, keep)
+        reference_douglas_peucker(points, tolerance, lo + 1 + farthest, hi, keep)
+    return keep
+
+
+def wobbly_ring(vertices=500, seed=0):
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = 3 + 0.5 * np.sin(5 * angles) + rng.normal(0, 0.02, vertices)
+    ring = np.column_stack((10 + radii * np.sin(angles), 20 + radii * np.cos(angles))).tolist()
+    return ring + ring[:1]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_douglas_peucker_matches_the_recursive_algorithm(seed):
+    rng = np.random.default_rng(seed)
+    points = np.cumsum(rng.normal(0, 1, (300, 2)), axis=0)
+    for tolerance in (0.1, 1, 5):
+        np.testing.assert_array_equal(_douglas_peucker_keep(points, tolerance),
+                                      reference_douglas_peucker(points, tolerance))
+
+
+@pytest.mark.parametrize('method', ['dp', 'vw'])
+def test_simplified_ring_stays_closed_and_shrinks_with_tolerance(method):
+    ring = wobbly_ring()
+    sizes = []
+    for tolerance in (0.01, 0.05, 0.2, 1.0):
+        simplified = simplify_polygon(ring, tolerance, method)
+        assert simplified[0] == simplified[-1] and len(simplified) >= 4
+        assert all(vertex in ring for vertex in simplified)
+        sizes.append(len(simplified))
+    assert sizes == sorted(sizes, reverse=True) and sizes[0] < len(ring)
+
+
+def test_douglas_peucker_deviation_is_within_tolerance():
+    ring = np.array(wobbly_ring())
+    simplified = np.array(simplify_polygon(ring.tolist(), 0.05, 'dp'))
+    # Both outlines in the ring's projection
+    scale = np.cos(np.radians(ring[:, 0].mean()))
+    points = _planar(ring)
+    kept = np.column_stack((simplified[:, 1] * scale, simplified[:, 0]))
+
+    # Distance of every original vertex to the nearest simplified edge
+    starts, direction = kept[:-1], kept[1:] - kept[:-1]
+    offsets = points[:, None] - starts
+    t = np.clip((offsets * direction).sum(axis=2) / (direction * direction).sum(axis=1), 0, 1)
+    gaps = offsets - t[..., None] * direction
+    assert np.hypot(gaps[..., 0], gaps[..., 1]).min(axis=1).max() <= 0.05 + 1e-9
+
+
+def test_visvalingam_removes_small_triangles_first():
+    line = [[0, 0], [0.001, 1], [0, 2], [3, 3], [0, 4], [0, 5]]
+    simplified = simplify_polygon(line, 0.5, 'vw')
+
+    # The near-collinear vertex goes; the spike and its neighbours stay
+    assert simplified == [[0, 0], [0, 2], [3, 3], [0, 4], [0, 5]]
+    assert simplify_polygon(line, 5, 'vw') == [[0, 0], [0, 5]]
+
+
+def test_nothing_to_simplify():
+    triangle = [[0, 0], [1, 1], [0, 1]]
+    assert simplify_polygon(triangle, 1) == triangle
+    assert simplify_polygon(wobbly_ring(), 0) == wobbly_ring()
+    with pytest.raises(ValueError):
+        simplify_polygon(wobbly_ring(), 1, 'bogus')
+
+
+def test_polyline_reference_example():
+    assert encode_polyline(GOOGLE_POINTS) == GOOGLE_ENCODED
+    assert decode_polyline(GOOGLE_ENCODED) == GOOGLE_POINTS
+    assert encode_polyline([]) == '' and decode_polyline('') == []
+
+
+@pytest.mark.parametrize('precision', [0, 5, 6])
+def test_polyline_round_trip(precision):
+    ring = wobbly_ring(vertices=200)
+    decoded = decode_polyline(encode_polyline(ring, precision), precision)
+
+    np.testing.assert_allclose(decoded, np.round(ring, precision), atol=10 ** -precision / 2)
+
+
+def test_quantize_drops_repeated_vertices():
+    assert quantize([[1.001, 2.001], [1.002, 2.0], [1.5, 2.5]], 2) == [[1.0, 2.0], [1.5, 2.5]]
+
+
+def event(pub_date='Mon, 01 Jan 2024 00:00:00 GMT', guid='EQ1', **fields):
+    return dict({'guid': guid, 'eventType': 'EQ', 'eventId': '1', 'pubDate': pub_date, 'polygon': wobbly_ring()},
+                **fields)
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    calls = []
+    process = GeometryProcessor._process_polygon
+
+    def counting(*args):
+        calls.append(args[1:])
+        return process(*args)
+
+    monkeypatch.setattr(GeometryProcessor, '_process_polygon', staticmethod(counting))
+    return calls
+
+
+def test_processor_caches_per_event_version_and_options(counted):
+    processor = GeometryProcessor()
+    first = processor.process([event()], tolerance=0.1)
+    # The same version under another guid (e.g. from the RSS feed) is a hit
+    assert processor.process([event(guid='gdacs-eq-1')], tolerance=0.1) == [dict(first[0], guid='gdacs-eq-1')]
+    assert len(counted) == 1
+
+    processor.process([event(pub_date='Tue, 02 Jan 2024 00:00:00 GMT')], tolerance=0.1)
+    processor.process([event()], tolerance=0.1, method='vw')
+    processor.process([event()], tolerance=0.1, encoding='polyline')
+    assert len(counted) == 4
+
+
+def test_events_without_a_key_are_not_cached(counted):
+    processor = GeometryProcessor()
+    keyless = {'polygon': wobbly_ring()}
+    processor.process([keyless, keyless], tolerance=0.1)
+
+    assert len(counted) == 2 and not processor._cache
+
+
+def test_processor_cache_is_bounded():
+    processor = GeometryProcessor(max_entries=3)
+    for i in range(10):
+        processor.process([event(guid=f'EQ{i}', eventId=str(i))], precision=2)
+    assert len(processor._cache) == 3
+
+
+def test_processor_output_formats():
+    processor = GeometryProcessor()
+    disasters = [event(), {'guid': 'no polygon', 'polygon': []}]
+
+    assert processor.process(disasters) is disasters
+    encoded = processor.process(disasters, precision=4, encoding='polyline')
+    assert 'polygon' not in encoded[0] and encoded[0]['polygonPrecision'] == 4
+    assert decode_polyline(encoded[0]['polygonEncoded'], 4) == quantize(wobbly_ring(), 4)
+    assert encoded[1] is disasters[1]
+    assert processor.process(disasters, precision=2)[0]['polygon'] == quantize(wobbly_ring(), 2)
+
+
+@pytest.mark.parametrize('options', [{'method': 'bogus', 'tolerance': 1}, {'encoding': 'geojson'}])
+def test_processor_rejects_unknown_options(options):
+    with pytest.raises(ValueError):
+        GeometryProcessor().process([event()], **options)
+
+
+class Request:
+    """Just enough of a connection to run the gdacs handler on one GET"""
+
+    def __init__(self, path):
+        self.data = f'GET {path} HTTP/1.1\r\nHost: test\r\n\r\n'.encode()
+        self.output = io.BytesIO()
+
+    def makefile(self, mode, *args, **kwargs):
+        return io.BytesIO(self.data) if 'r' in mode else self.output
+
+    def sendall(self, data):
+        self.output.write(data)
+
+
+def get_feed(path):
+    request = Request(path)
+    handler = type('handler', (gdacs.handler,), {'log_message': lambda *args: None})
+    handler(request, ('127.0.0.1', 0), None)
+    head, _, body = request.output.getvalue().partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+@pytest.mark.parametrize('query', ['method=bogus&simplify=0.1', 'encoding=geojson', 'simplify=x', 'precision=11',
+                                   'simplify=-1'])
+def test_feed_rejects_invalid_geometry_options(monkeypatch, query):
+    monkeypatch.setattr(gdacs.FEED_CACHE, 'get', lambda: ([event()], 'hit'))
+    status, body = get_feed(f'/api/gdacs?{query}')
+
+    assert status == 400 and 'error' in body
+
+
+def test_feed_applies_geometry_options(monkeypatch):
+    monkeypatch.setattr(gdacs.FEED_CACHE, 'get', lambda: ([event()], 'hit'))
+    monkeypatch.setattr(gdacs, 'GEOMETRY', GeometryProcessor())
+    status, body = get_feed('/api/gdacs?simplify=0.1&encoding=polyline&precision=4')
+
+    assert status == 200
+    assert decode_polyline(body[0]['polygonEncoded'], 4) == \
+        decode_polyline(encode_polyline(simplify_polygon(wobbly_ring(), 0.1), 4), 4)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from facility_ingest import FacilityColumns
+from impact_assessment import assess_impact
+from impact_format import compact_from_grouped, expand_compact
+
+
+def make_facilities():
+    return FacilityColumns(np.array(['North', 'South', 'Far'], dtype=object),
+                           np.array([10.0, 9.5, 60.0]), np.array([20.0, 20.0, -100.0]))
+
+
+def versions(pub_dates, **fields):
+    """One GDACS event as published at each pubDate, as a history query with versions=all returns it"""
+    return [dict({'guid': 'EQ1001', 'eventType': 'EQ', 'eventId': '1001', 'title': f'M6 v{i}', 'pubDate': pub_date,
+                  'latitude': 10.0, 'longitude': 20.2}, **fields) for i, pub_date in enumerate(pub_dates)]
+
+
+def test_compact_keeps_each_version_of_an_event():
+    facilities = make_facilities()
+    disasters = versions(['Mon, 01 Jan 2024 00:00:00 GMT', 'Mon, 01 Jan 2024 06:00:00 GMT'])
+    compact = assess_impact(facilities, disasters, response_format='compact')
+
+    assert [d['pubDate'] for d in compact['disasters']] == [d['pubDate'] for d in disasters]
+    assert expand_compact(compact) == assess_impact(facilities, disasters)
+
+
+def test_compact_merges_repeated_version_and_id_sources():
+    # The same version referenced twice, once keyed by CAP parameters only, is one row
+    facilities = make_facilities()
+    first = versions(['Mon, 01 Jan 2024 00:00:00 GMT'])[0]
+    repeat = dict(first, eventId=None, guid=None, parameters={'eventid': '1001'})
+    compact = assess_impact(facilities, [first, repeat], response_format='compact')
+
+    assert len(compact['disasters']) == 1
+    assert sorted(compact['impacts']['disaster']) == [0, 0, 0, 0]
+
+
+def test_compact_from_grouped_matches_compact_impacts():
+    facilities = make_facilities()
+    disasters = versions(['Mon, 01 Jan 2024 00:00:00 GMT', 'Tue, 02 Jan 2024 00:00:00 GMT'])
+    grouped = assess_impact(facilities, disasters)
+
+    assert compact_from_grouped(grouped) == assess_impact(facilities, disasters, response_format='compact')
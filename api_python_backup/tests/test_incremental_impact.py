@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+
+import impact_assessment
+from facility_ingest import FacilityColumns
+from impact_assessment import incremental_assessor
+
+
+def make_facilities(rows=50_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return FacilityColumns(np.array([f'Facility {i}' for i in range(rows)], dtype=object),
+                           rng.uniform(-60, 60, rows), rng.uniform(-180, 180, rows))
+
+
+def make_feed(client, refresh, events=20, seed=0):
+    """Disjoint events per client; every refresh replaces half of them"""
+    rng = np.random.default_rng(seed * 1000 + client)
+    feed = []
+    for j in range(events):
+        generation = refresh if j < events // 2 else 0
+        feed.append({'guid': f's{client}-{j}-{generation}', 'eventType': 'TC', 'title': f'Event {client}-{j}',
+                     'pubDate': f'refresh {generation}',
+                     'latitude': float(rng.uniform(-50, 50)), 'longitude': float(rng.uniform(-170, 170))})
+    return feed
+
+
+def run_clients(facilities, sessions, clients=8, refreshes=20):
+    errors, deltas = [], {client: [] for client in range(clients)}
+
+    def client(number):
+        try:
+            for refresh in range(refreshes):
+                assessor = incremental_assessor(facilities, session=sessions[number])
+                _, delta = assessor.update(make_feed(number, refresh))
+                deltas[number].append(delta)
+        except Exception as e:  # noqa: BLE001 - collected for the assertion
+            errors.append(e)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors, deltas
+
+
+def test_shared_assessor_survives_concurrent_updates():
+    impact_assessment._incremental_assessors.clear()
+    errors, _ = run_clients(make_facilities(), sessions=[None] * 8)
+    assert errors == []
+
+
+def test_sessions_get_deltas_against_their_own_feed():
+    impact_assessment._incremental_assessors.clear()
+    facilities = make_facilities(seed=1)
+    errors, deltas = run_clients(facilities, sessions=[f'client-{n}' for n in range(8)], refreshes=5)
+    assert errors == []
+    for client, client_deltas in deltas.items():
+        assert sorted(client_deltas[0]['addedDisasters']) == sorted(d['guid'] for d in make_feed(client, 0))
+        for refresh in range(1, 5):
+            delta = client_deltas[refresh]
+            # Half of the client's own events are replaced, nobody else's show up
+            assert sorted(delta['addedDisasters']) == sorted(f's{client}-{j}-{refresh}' for j in range(10))
+            assert sorted(delta['removedDisasters']) == sorted(f's{client}-{j}-{refresh - 1}' for j in range(10))
+            assert delta['updatedDisasters'] == []
+
+
+def test_incremental_matches_full_assessment():
+    impact_assessment._incremental_assessors.clear()
+    facilities = make_facilities(rows=5_000, seed=2)
+    assessor = incremental_assessor(facilities, session='check')
+    for refresh in range(3):
+        feed = make_feed(0, refresh)
+        merged, _ = assessor.update(feed)
+        assert merged == impact_assessment.assess_impact(facilities, feed, workers=1)
+
+
+def test_registered_set_reuses_its_grid(tmp_path, monkeypatch):
+    from facility_registry import FacilityRegistry
+    from incremental_impact import IncrementalImpactAssessor
+    registry = FacilityRegistry(str(tmp_path))
+    facilities = registry.open(registry.register(make_facilities(rows=5_000, seed=3)))
+    monkeypatch.setattr('incremental_impact.FacilityGrid', None)  # building a new grid would fail
+    assessor = IncrementalImpactAssessor(facilities, workers=1)
+    feed = make_feed(0, 0)
+    merged, _ = assessor.update(feed)
+    assert assessor._grid_for(len(feed)) is facilities.grid()
+    assert merged == impact_assessment.assess_impact(facilities, feed, workers=1)
+
+
+def test_worker_pool_gives_the_same_impacts():
+    from incremental_impact import IncrementalImpactAssessor
+    facilities = make_facilities(rows=60_000, seed=4)
+    feed = make_feed(0, 0)
+    pooled, _ = IncrementalImpactAssessor(facilities, workers=2).update(feed)
+    single, _ = IncrementalImpactAssessor(facilities, workers=1).update(feed)
+    assert pooled == single
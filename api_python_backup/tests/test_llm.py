@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+import llm
+from llm import RateLimiter, chat_completion, stream_chat_completion
+
+MESSAGES = [{'role': 'user', 'content': 'Recommend something'}]
+
+
+def gaps(times):
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=20, burst=1)
+    times = []
+    for _ in range(6):
+        limiter.acquire()
+        times.append(time.monotonic())
+
+    assert min(gaps(times)) >= 0.045
+
+
+def test_rate_limiter_allows_bursts():
+    limiter = RateLimiter(rate=1, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.monotonic() - start < 0.1
+
+
+def test_rate_limiter_is_shared_across_threads():
+    limiter = RateLimiter(rate=40, burst=1)
+    times, lock = [], threading.Lock()
+
+    def worker():
+        for _ in range(3):
+            limiter.acquire()
+            with lock:
+                times.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 12 calls at 40/s after the first token: at least 11 intervals
+    assert max(times) - min(times) >= 11 / 40 - 0.01
+
+
+def test_throttling_and_server_errors_are_retried_with_backoff(llm_api):
+    llm_api.statuses = [429, 503, 500]
+    assert chat_completion(MESSAGES, retries=3, backoff=0.05) == 'Stay safe'
+
+    # Delays of 0.05, 0.1 and 0.2 s, each plus up to half again of jitter
+    delays = gaps([when for when, _ in llm_api.requests])
+    assert len(delays) == 3
+    for delay, base in zip(delays, (0.05, 0.1, 0.2)):
+        assert base <= delay < base * 1.5 + 0.1
+
+
+def test_gives_up_after_the_last_retry(llm_api):
+    llm_api.statuses = [503] * 5
+    with pytest.raises(Exception) as raised:
+        chat_completion(MESSAGES, retries=2, backoff=0.01)
+
+    assert llm.is_retryable(raised.value)
+    assert len(llm_api.requests) == 3
+
+
+def test_client_errors_are_not_retried(llm_api):
+    llm_api.statuses = [400]
+    with pytest.raises(Exception) as raised:
+        chat_completion(MESSAGES, retries=3, backoff=0.01)
+
+    assert not llm.is_retryable(raised.value)
+    assert len(llm_api.requests) == 1
+
+
+def test_every_attempt_takes_a_rate_limiter_token(llm_api):
+    class CountingLimiter(RateLimiter):
+        acquired = 0
+
+        def acquire(self):
+            CountingLimiter.acquired += 1
+            super().acquire()
+
+    llm_api.statuses = [429, 429]
+    chat_completion(MESSAGES, retries=3, backoff=0.01, rate_limiter=CountingLimiter(rate=1000))
+
+    assert len(llm_api.requests) == CountingLimiter.acquired == 3
+
+
+def test_opening_a_stream_is_retried(llm_api):
+    llm_api.statuses = [429]
+    text = ''.join(stream_chat_completion(MESSAGES, retries=1, backoff=0.01))
+
+    assert text.strip() == 'Stay safe'
+    assert len(llm_api.requests) == 2
@@ -0,0 +1,76 @@
+import os
+import time
+
+from llm_cache import ResponseCache, cache_key
+
+MESSAGES = [{'role': 'user', 'content': 'Summarize  the\nsituation'}]
+
+
+def key(events, messages=MESSAGES):
+    return cache_key(messages, 'gpt-3.5-turbo', 0.7, 100, events)
+
+
+def test_key_follows_event_versions():
+    cap = {'guid': 'EQ1001', 'eventType': 'EQ', 'parameters': {'eventid': '1001'}, 'pubDate': 'Mon, 01 Jan 2024'}
+    rss = {'guid': 'gdacs-eq-1001', 'eventType': 'eq', 'eventId': ' 1001', 'pubDate': 'Mon, 01 Jan 2024'}
+
+    # The same version of an event under CAP and RSS fields, in any order
+    assert key([cap]) == key([rss]) == key([cap, rss])
+    assert key([cap]) != key([dict(cap, pubDate='Tue, 02 Jan 2024')])
+    assert key([cap]) != key([cap, {'eventType': 'TC', 'eventId': '7', 'pubDate': 'Mon, 01 Jan 2024'}])
+    # Formatting-only prompt differences share an entry
+    assert key([cap]) == key([cap], [{'role': 'user', 'content': ' Summarize the situation '}])
+
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=100)
+    for i in range(5):
+        cache.put(f'k{i}', 'x' * 30)
+    cache.get('k2')
+    cache.put('k5', 'x' * 30)
+
+    assert [cache.get(f'k{i}') is not None for i in range(6)] == [False, False, True, False, True, True]
+    assert cache.stats()['bytes'] <= 100
+
+
+def test_entries_expire(monkeypatch):
+    cache = ResponseCache(ttl=10)
+    cache.put('k', 'value')
+    monkeypatch.setattr(time, 'time', lambda real=time.time: real() + 11)
+
+    assert cache.get('k') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_disk_tier_is_shared(tmp_path):
+    ResponseCache(disk_dir=str(tmp_path)).put('ab12', 'value')
+    other = ResponseCache(disk_dir=str(tmp_path))
+
+    assert other.get('ab12') == 'value'
+    assert other.stats()['diskHits'] == 1
+
+
+def disk_bytes(root):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+def test_disk_tier_is_bounded_by_bytes(tmp_path):
+    cache = ResponseCache(max_bytes=10 ** 6, disk_dir=str(tmp_path), disk_max_bytes=4000)
+    for i in range(100):
+        cache.put(f'{i:02x}{i}', 'x' * 200)
+        assert disk_bytes(tmp_path) <= 4000
+
+    # The oldest entries went first
+    fresh = ResponseCache(disk_dir=str(tmp_path))
+    assert fresh.get('6399') is not None and fresh.get('0000') is None
+    assert cache.stats()['diskEvictions'] > 0
+
+
+def test_disk_sweep_counts_other_processes_entries(tmp_path):
+    for i in range(20):
+        ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=10 ** 6).put(f'{i:02x}{i}', 'x' * 200)
+    cache = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=2000)
+    cache.put('ffff', 'x' * 200)
+
+    assert disk_bytes(tmp_path) <= 2000
+    assert cache.get('ffff') == 'x' * 200
@@ -0,0 +1,183 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import metrics
+from metrics import InstrumentedHandler, Registry
+
+
+@pytest.fixture
+def enabled():
+    metrics.configure(enabled=True)
+    metrics.REGISTRY.reset()
+    yield metrics.REGISTRY
+    metrics.configure(enabled=False, log_requests=False)
+    metrics.REGISTRY.reset()
+
+
+def test_exposition_format():
+    registry = Registry(buckets=(0.1, 1))
+    registry.inc('requests_total', 2, (('route', '/api/gdacs'), ('status', '200')))
+    registry.inc('requests_total', 1, (('route', '/api/gdacs'), ('status', '500')))
+    registry.set('feed_items', 42)
+    for value in (0.05, 0.5, 0.5, 3):
+        registry.observe('stage_duration_seconds', value, (('stage', 'csv_parse'),))
+    registry.register_collector(lambda: {'llm_cache_entries': 7})
+
+    assert registry.render().splitlines() == [
+        '# HELP gdacs_requests_total Requests served, by route and status',
+        '# TYPE gdacs_requests_total counter',
+        'gdacs_requests_total{route="/api/gdacs",status="200"} 2',
+        'gdacs_requests_total{route="/api/gdacs",status="500"} 1',
+        '# HELP gdacs_feed_items Items in the cached GDACS feed',
+        '# TYPE gdacs_feed_items gauge',
+        'gdacs_feed_items 42',
+        '# TYPE gdacs_llm_cache_entries gauge',
+        'gdacs_llm_cache_entries 7',
+        '# HELP gdacs_stage_duration_seconds Time spent in each request stage',
+        '# TYPE gdacs_stage_duration_seconds histogram',
+        'gdacs_stage_duration_seconds_bucket{stage="csv_parse",le="0.1"} 1',
+        'gdacs_stage_duration_seconds_bucket{stage="csv_parse",le="1"} 3',
+        'gdacs_stage_duration_seconds_bucket{stage="csv_parse",le="+Inf"} 4',
+        'gdacs_stage_duration_seconds_sum{stage="csv_parse"} 4.05',
+        'gdacs_stage_duration_seconds_count{stage="csv_parse"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.inc('odd_total', 1, (('path', 'a"b\\c\nd'),))
+
+    assert 'gdacs_odd_total{path="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_failing_collector_does_not_break_the_export(capsys):
+    registry = Registry()
+    registry.inc('requests_total')
+    registry.register_collector(lambda: 1 / 0)
+
+    assert 'gdacs_requests_total 1' in registry.render()
+    assert 'Error collecting metrics' in capsys.readouterr().out
+
+
+def test_registry_is_thread_safe():
+    registry = Registry()
+
+    def work():
+        for _ in range(1000):
+            registry.inc('hits_total')
+            registry.observe('latency_seconds', 0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = registry.render()
+    assert 'gdacs_hits_total 8000' in text and 'gdacs_latency_seconds_count 8000' in text
+
+
+def test_disabled_instrumentation_records_nothing():
+    metrics.configure(enabled=False)
+    metrics.REGISTRY.reset()
+    with metrics.span('csv_parse'):
+        pass
+    metrics.count('facilities', 10)
+    metrics.record('distance', 0.5)
+    metrics.gauge('feed_items', 3)
+
+    assert metrics.span('csv_parse') is metrics.span('distance')
+    # Only the registered collectors' gauges remain
+    text = metrics.REGISTRY.render()
+    assert not any(name in text for name in ('facilities_total', 'stage_duration', 'gdacs_feed_items '))
+
+
+def test_spans_and_counters_when_enabled(enabled):
+    with metrics.span('csv_parse'):
+        pass
+    metrics.count('facilities', 10)
+    metrics.count('facilities', 5)
+    metrics.gauge('feed_items', 3)
+
+    text = enabled.render()
+    assert 'gdacs_facilities_total 15' in text and 'gdacs_feed_items 3' in text
+    assert 'gdacs_stage_duration_seconds_count{stage="csv_parse"} 1' in text
+
+
+def test_collect_counters_captures_one_block(enabled):
+    metrics.count('facilities', 1)
+    with metrics.collect_counters() as counters:
+        metrics.count('pairs_evaluated', 4)
+        metrics.count('pairs_evaluated', 2)
+
+    assert counters == {'pairs_evaluated': 6}
+    assert 'gdacs_pairs_evaluated_total 6' in enabled.render()
+
+
+class Handler(InstrumentedHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def metrics_route(self):
+        return '/api/test' if self.path.startswith('/api/test') else 'other'
+
+    def do_GET(self):
+        with metrics.span('work'):
+            metrics.count('items', 3)
+        status = 200 if self.path.startswith('/api/test') else 404
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(server, *paths):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+    for path in paths:
+        conn.request('GET', path)
+        conn.getresponse().read()
+    conn.close()
+
+
+def test_instrumented_handler_labels_requests(enabled, server):
+    get(server, '/api/test', '/api/test?x=1', '/elsewhere')
+    text = enabled.render()
+
+    assert 'gdacs_requests_total{route="/api/test",status="200"} 2' in text
+    assert 'gdacs_requests_total{route="other",status="404"} 1' in text
+    assert 'gdacs_request_duration_seconds_count{route="/api/test"} 2' in text
+    assert 'gdacs_items_total 9' in text
+
+
+def test_instrumented_handler_logs_one_line_per_request(enabled, server, capsys):
+    metrics.configure(log_requests=True)
+    get(server, '/api/test')
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+    assert len(lines) == 1
+    assert lines[0]['route'] == '/api/test' and lines[0]['method'] == 'GET' and lines[0]['status'] == 200
+    assert lines[0]['counters'] == {'items': 3} and set(lines[0]['stagesMs']) == {'work'}
+
+
+def test_instrumented_handler_is_silent_when_disabled(server):
+    metrics.configure(enabled=False)
+    metrics.REGISTRY.reset()
+    get(server, '/api/test')
+
+    assert 'requests_total' not in metrics.REGISTRY.render()
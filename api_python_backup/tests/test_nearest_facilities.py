@@ -0,0 +1,162 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import gdacs
+import nearest_facilities
+from facility_ingest import FacilityColumns, read_facilities
+from facility_registry import FacilityRegistry
+from geo_engine import disaster_profile, ellipsoidal_km, haversine_km
+from nearest_facilities import nearest_facilities as find_nearest
+
+FACILITIES_CSV = 'name,latitude,longitude\nClinic,10.1,20.1\nSchool,10.5,20.5\nDepot,40,-100\n'
+QUAKE = {'guid': 'EQ1', 'eventType': 'EQ', 'title': 'M6', 'latitude': 10.0, 'longitude': 20.0}
+
+
+def make_facilities(rows=10_000, seed=0):
+    """Clustered facilities, including clusters by the poles and the antimeridian"""
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack((rng.uniform(-60, 60, 50), rng.uniform(-180, 180, 50)))
+    centers[:3] = [[85, 0], [0, 179.9], [-20, -179.9]]
+    picks = rng.integers(0, len(centers), rows)
+    lat = np.clip(centers[picks, 0] + rng.normal(0, 1, rows), -89.9, 89.9)
+    lon = (centers[picks, 1] + rng.normal(0, 1, rows) + 180) % 360 - 180
+    return FacilityColumns(np.array([f'F{i}' for i in range(rows)], dtype=object), lat, lon)
+
+
+def brute_force(facilities, disasters, k, method='ellipsoidal', max_km=None):
+    """Every facility's distance to each event, sorted (as in benchmarks/bench_nearest.py)"""
+    distance = ellipsoidal_km if method == 'ellipsoidal' else haversine_km
+    lat, lon = np.asarray(facilities.latitude), np.asarray(facilities.longitude)
+    _, dis_lat, dis_lon, _ = disaster_profile(disasters)
+    nearest = []
+    for j in range(len(dis_lat)):
+        distances = distance(lat, lon, dis_lat[j], dis_lon[j])
+        order = np.lexsort((np.arange(len(distances)), distances))
+        if max_km is not None:
+            order = order[distances[order] <= max_km]
+        nearest.append(np.round(distances[order[:k]], 2).tolist())
+    return nearest
+
+
+def events(facilities, count=40, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(facilities), count // 2)
+    near = [{'latitude': float(facilities.latitude[i]) + 0.2, 'longitude': float(facilities.longitude[i]),
+             'title': f'near {i}'} for i in picks]
+    anywhere = [{'latitude': float(lat), 'longitude': float(lon), 'title': 'open'}
+                for lat, lon in zip(rng.uniform(-89, 89, count // 2), rng.uniform(-180, 180, count // 2))]
+    return near + anywhere + [{'latitude': 0.5, 'longitude': -179.95, 'title': 'antimeridian'},
+                              {'latitude': 89.0, 'longitude': 120.0, 'title': 'pole'}]
+
+
+@pytest.fixture(scope='module')
+def facility_sets(tmp_path_factory):
+    facilities = make_facilities()
+    registry = FacilityRegistry(str(tmp_path_factory.mktemp('registry')))
+    return {'request': facilities, 'registered': registry.open(registry.register(facilities))}
+
+
+@pytest.mark.parametrize('source', ['request', 'registered'])
+@pytest.mark.parametrize('method', ['ellipsoidal', 'haversine'])
+@pytest.mark.parametrize('k, max_km', [(1, None), (10, None), (25, 150.0)])
+def test_grid_search_matches_brute_force(facility_sets, source, method, k, max_km):
+    facilities = facility_sets[source]
+    disasters = events(facility_sets['request'])
+    found = find_nearest(facilities, disasters, k=k, method=method, max_distance_km=max_km)
+
+    assert [[f['distance'] for f in entry['facilities']] for entry in found] == \
+        brute_force(facilities, disasters, k, method, max_km)
+
+
+def test_disasters_without_coordinates_get_no_facilities(facility_sets):
+    found = find_nearest(facility_sets['request'], [{'title': 'somewhere'}, QUAKE], k=2)
+
+    assert found[0] == {'disaster': {'title': 'somewhere'}, 'facilities': []}
+    assert len(found[1]['facilities']) == 2
+
+
+def test_unknown_distance_method(facility_sets):
+    with pytest.raises(ValueError):
+        find_nearest(facility_sets['request'], [QUAKE], method='manhattan')
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), nearest_facilities.handler)
+    httpd.daemon_threads = True
+    nearest_facilities.handler.log_message = lambda *args: None
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(server, data):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    conn.request('POST', '/api/nearest_facilities', body=json.dumps(data), headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def names(entry):
+    return [f['facility']['name'] for f in entry['facilities']]
+
+
+def test_handler_returns_the_nearest_facilities(server):
+    status, body = post(server, {'facilities': FACILITIES_CSV, 'disasters': [QUAKE], 'k': 2})
+
+    assert status == 200
+    assert names(body['nearestFacilities'][0]) == ['Clinic', 'School']
+    assert 'unresolvedGuids' not in body
+
+
+def test_handler_defaults_and_distance_limit(server):
+    status, body = post(server, {'facilities': FACILITIES_CSV, 'disasters': [QUAKE]})
+    assert status == 200 and names(body['nearestFacilities'][0]) == ['Clinic', 'School', 'Depot']
+
+    status, body = post(server, {'facilities': FACILITIES_CSV, 'disasters': [QUAKE], 'maxDistanceKm': 30})
+    assert status == 200 and names(body['nearestFacilities'][0]) == ['Clinic']
+
+
+def test_handler_resolves_guids_from_the_feed(server, monkeypatch):
+    monkeypatch.setattr(gdacs.FEED_CACHE, 'get', lambda: ([QUAKE, dict(QUAKE, guid='EQ2', latitude=40.0,
+                                                                        longitude=-100.0)], 'hit'))
+    status, body = post(server, {'facilities': FACILITIES_CSV, 'guids': ['EQ2', 'missing'], 'k': 1})
+
+    assert status == 200
+    assert body['unresolvedGuids'] == ['missing']
+    assert [(entry['disaster']['guid'], names(entry)) for entry in body['nearestFacilities']] == [('EQ2', ['Depot'])]
+
+
+def test_handler_uses_registered_facility_sets(server, monkeypatch, tmp_path):
+    registry = FacilityRegistry(str(tmp_path))
+    monkeypatch.setattr(nearest_facilities, 'FACILITY_REGISTRY', registry)
+    set_id = registry.register(read_facilities(FACILITIES_CSV))
+
+    status, body = post(server, {'facilitySetId': set_id, 'disasters': [QUAKE], 'k': 1})
+    assert status == 200 and names(body['nearestFacilities'][0]) == ['Clinic']
+
+    status, body = post(server, {'facilitySetId': 'f' * len(set_id), 'disasters': [QUAKE]})
+    assert status == 500 and 'Unknown facility set' in body['error']
+    status, body = post(server, {'facilitySetId': '../etc', 'disasters': [QUAKE]})
+    assert status == 500 and 'Invalid facility set id' in body['error']
+
+
+@pytest.mark.parametrize('data, message', [
+    ({'k': 0}, 'k must be an integer'),
+    ({'k': nearest_facilities.MAX_K + 1}, 'k must be an integer'),
+    ({'k': '5'}, 'k must be an integer'),
+    ({'k': 2.5}, 'k must be an integer'),
+    ({'k': True}, 'k must be an integer'),
+    ({'method': 'manhattan'}, 'Unknown distance method'),
+    ({'maxDistanceKm': 'far'}, 'far'),
+])
+def test_handler_rejects_invalid_options(server, data, message):
+    status, body = post(server, dict({'facilities': FACILITIES_CSV, 'disasters': [QUAKE]}, **data))
+
+    assert status == 500 and message in body['error']
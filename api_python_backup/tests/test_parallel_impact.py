@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pytest
+
+import metrics
+import parallel_impact
+from impact_assessment import impact_pairs_for
+from parallel_impact import parallel_impact_pairs
+
+DISASTERS = [{'title': f'M6 {i}', 'eventType': 'EQ', 'latitude': lat, 'longitude': lon}
+             for i, (lat, lon) in enumerate([(0, 0), (10, 179.5), (-20, -60), (45, 90), (-5, 20)])]
+
+
+@pytest.fixture(scope='module')
+def facilities():
+    rng = np.random.default_rng(0)
+    yield rng.uniform(-60, 60, 60_000), rng.uniform(-180, 180, 60_000)
+    parallel_impact.shutdown_pool()
+
+
+@pytest.fixture
+def counted():
+    metrics.configure(enabled=True)
+    metrics.REGISTRY.reset()
+    yield metrics.REGISTRY
+    metrics.REGISTRY.reset()
+    metrics.configure(enabled=False)
+
+
+def pairs_evaluated(registry):
+    return {name: value for (name, _), value in registry._counters.items() if name.startswith('pairs_evaluated')}
+
+
+def test_matches_the_single_process_pairs(facilities):
+    lat, lon = facilities
+    expected = impact_pairs_for(lat, lon, DISASTERS)
+    actual = parallel_impact_pairs(lat, lon, DISASTERS, workers=2)
+
+    for a, b in zip(actual, expected):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_worker_counters_are_added_in_the_parent(facilities, counted):
+    # Each shard decides on its own whether to use the grid index, so the
+    # expected count is that of the same shards run in-process
+    lat, lon = facilities
+    edges = np.linspace(0, len(lat), 2 * parallel_impact.SHARDS_PER_WORKER + 1).astype(int)
+    for start, stop in zip(edges[:-1], edges[1:]):
+        impact_pairs_for(lat[start:stop], lon[start:stop], DISASTERS)
+    expected = pairs_evaluated(counted)
+    counted.reset()
+
+    parallel_impact_pairs(lat, lon, DISASTERS, workers=2)
+    assert expected and pairs_evaluated(counted) == expected
+
+
+def test_pool_is_shared_across_requests(facilities):
+    lat, lon = facilities
+    parallel_impact_pairs(lat, lon, DISASTERS, workers=2)
+    pool = parallel_impact.worker_pool(2)
+    parallel_impact_pairs(lat, lon, DISASTERS, workers=2)
+
+    assert parallel_impact.worker_pool(2) is pool
+
+
+def test_workers_do_not_inherit_locks_held_by_server_threads(facilities):
+    # A forked worker would copy the registry lock in its held state and
+    # block on its first counter
+    lat, lon = facilities
+    parallel_impact.shutdown_pool()
+    held, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with metrics.REGISTRY._lock:
+            held.set()
+            release.wait()
+
+    threading.Thread(target=hold_lock, daemon=True).start()
+    held.wait()
+    done = []
+    worker = threading.Thread(target=lambda: done.append(parallel_impact_pairs(lat, lon, DISASTERS, workers=2)),
+                              daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    release.set()
+
+    assert done
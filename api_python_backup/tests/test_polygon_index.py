@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from polygon_index import PolygonIndex, polygon_impact_pairs
+from spatial_index import FacilityGrid
+
+
+def brute_force_contains(coordinates, lat, lon):
+    """Even-odd ray casting against every edge, one point at a time"""
+    ring = [(float(y), float(x)) for y, x in coordinates]
+    inside = []
+    for py, px in zip(lat, lon):
+        crossings = 0
+        for (y1, x1), (y2, x2) in zip(ring, ring[1:] + ring[:1]):
+            if (y1 > py) != (y2 > py) and px < x1 + (py - y1) * (x2 - x1) / (y2 - y1):
+                crossings += 1
+        inside.append(crossings % 2 == 1)
+    return np.array(inside)
+
+
+def star(center_lat, center_lon, vertices=40, seed=0):
+    """A concave star-shaped ring in CAP [lat, lon] order"""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = rng.uniform(1, 5, vertices)
+    return np.column_stack((center_lat + radii * np.sin(angles), center_lon + radii * np.cos(angles))).tolist()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_contains_matches_brute_force(seed):
+    coordinates = star(10, 20, vertices=40 + 20 * seed, seed=seed)
+    rng = np.random.default_rng(100 + seed)
+    lat, lon = rng.uniform(4, 16, 3000), rng.uniform(14, 26, 3000)
+
+    polygon = PolygonIndex(coordinates)
+    np.testing.assert_array_equal(polygon.contains(lat, lon), brute_force_contains(coordinates, lat, lon))
+
+
+def test_polygon_across_the_antimeridian():
+    coordinates = [[-1, 179], [-1, -179], [1, -179], [1, 179]]
+    polygon = PolygonIndex(coordinates)
+
+    assert polygon.wraps
+    assert polygon.centroid == pytest.approx((0.0, -180.0))
+    lat = np.array([0, 0, 0, 0, 2])
+    lon = np.array([179.5, -179.5, 0, 170, 179.5])
+    assert polygon.contains(lat, lon).tolist() == [True, True, False, False, False]
+
+
+def test_centroid_of_a_shifted_polygon_across_the_antimeridian():
+    polygon = PolygonIndex([[-1, 178], [-1, -176], [1, -176], [1, 178]])
+    assert polygon.centroid == pytest.approx((0.0, -179.0))
+    assert PolygonIndex([[0, 10], [0, 20], [10, 20], [10, 10]]).centroid == pytest.approx((5.0, 15.0))
+
+
+def test_impact_pairs_with_and_without_a_grid_agree():
+    rng = np.random.default_rng(1)
+    fac_lat, fac_lon = rng.uniform(-10, 10, 5000), rng.uniform(-180, 180, 5000)
+    fac_lon[:2500] = rng.uniform(170, 190, 2500) % 360 - 180
+    disasters = [{'latitude': None, 'longitude': None, 'polygon': [[-5, 175], [-5, -175], [5, -175], [5, 175]]},
+                 {'latitude': 0.5, 'longitude': 0.5, 'polygon': star(0, 0)}]
+    polygons = {i: PolygonIndex(d['polygon']) for i, d in enumerate(disasters)}
+
+    plain = polygon_impact_pairs(fac_lat, fac_lon, disasters, polygons)
+    indexed = polygon_impact_pairs(fac_lat, fac_lon, disasters, polygons, grid=FacilityGrid(fac_lat, fac_lon))
+    for a, b in zip(plain, indexed):
+        np.testing.assert_array_equal(np.sort(a), np.sort(b))
+    # Distances to the centroid of the antimeridian polygon stay regional
+    assert plain[0].size and plain[2][plain[1] == 0].max() < 1000
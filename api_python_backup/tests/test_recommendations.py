@@ -0,0 +1,97 @@
+import json
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import recommendations
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), recommendations.handler)
+    httpd.daemon_threads = True
+    recommendations.handler.log_message = lambda *args: None
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(server, data):
+    """Raw response (every status line is visible) and its JSON lines"""
+    body = json.dumps(data).encode()
+    with socket.create_connection(('127.0.0.1', server.server_port), timeout=10) as sock:
+        sock.sendall(b'POST /api/recommendations HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n'
+                     + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    raw = b''.join(chunks).decode()
+    head, _, payload = raw.partition('\r\n\r\n')
+    return raw, head.split(' ')[1], [json.loads(line) for line in payload.splitlines() if line]
+
+
+def item(name, impacts=True):
+    facility = {'name': name, 'latitude': 10.0, 'longitude': 20.0}
+    return {'facility': facility, 'impacts': [{'disaster': {'eventType': 'EQ', 'title': 'M6'}, 'distance': 12.0}]}\
+        if impacts else {'facility': facility}
+
+
+def test_batch_streams_one_line_per_item(server, llm_api):
+    raw, status, lines = post(server, {'items': [item('A'), item('B'), item('C')]})
+
+    assert status == '200' and raw.count('HTTP/1.') == 1
+    assert sorted(line['index'] for line in lines) == [0, 1, 2]
+    assert all('Immediate Safety Measures' in line['recommendations'] for line in lines)
+
+
+@pytest.mark.parametrize('data, message', [
+    ({'items': [item('A'), item('B', impacts=False)]}, 'item 1'),
+    ({'items': [item('A'), 'B']}, 'item 1'),
+    ({'items': [dict(item('A'), impacts=['far away'])]}, 'Item 0'),
+    ({'items': [item('A')], 'concurrency': 0}, 'concurrency'),
+    ({'items': [item('A')], 'concurrency': 'many'}, 'concurrency'),
+    ({'items': []}, 'Missing items'),
+])
+def test_invalid_batch_is_rejected_before_streaming(server, llm_api, data, message):
+    raw, status, lines = post(server, data)
+
+    assert status == '500' and raw.count('HTTP/1.') == 1
+    assert message in lines[0]['error']
+    assert llm_api.requests == []
+
+
+def test_failed_item_is_an_error_record(server, llm_api, monkeypatch):
+    generate = recommendations.generate_recommendations
+
+    def failing(facility, impacts, rate_limiter=None):
+        if facility['name'] == 'B':
+            raise RuntimeError('model unavailable')
+        return generate(facility, impacts, rate_limiter)
+
+    monkeypatch.setattr(recommendations, 'generate_recommendations', failing)
+    raw, status, lines = post(server, {'items': [item('A'), item('B'), item('C')]})
+
+    assert status == '200' and raw.count('HTTP/1.') == 1
+    by_index = {line['index']: line for line in lines}
+    assert by_index[1] == {'index': 1, 'facility': item('B')['facility'], 'error': 'model unavailable'}
+    assert 'recommendations' in by_index[0] and 'recommendations' in by_index[2]
+
+
+def test_batch_failure_after_streaming_ends_the_stream(server, llm_api, monkeypatch):
+    def batch(items, concurrency):
+        yield 0, {'Immediate Safety Measures': ['Stay safe']}
+        raise RuntimeError('worker pool gone')
+
+    monkeypatch.setattr(recommendations, 'generate_recommendations_batch', batch)
+    raw, status, lines = post(server, {'items': [item('A'), item('B')]})
+
+    assert status == '200' and raw.count('HTTP/1.') == 1
+    assert lines == [{'index': 0, 'facility': item('A')['facility'],
+                      'recommendations': {'Immediate Safety Measures': ['Stay safe']}},
+                     {'error': 'worker pool gone'}]
@@ -0,0 +1,145 @@
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import metrics
+import server
+
+NEAREST = {'facilities': 'name,latitude,longitude\nClinic,10.1,20.1\nSchool,11,21\n',
+           'disasters': [{'eventType': 'EQ', 'title': 'M6', 'latitude': 10.0, 'longitude': 20.0}], 'k': 1}
+
+
+@pytest.fixture
+def httpd(monkeypatch):
+    monkeypatch.setattr(server.RouterHandler, 'log_message', lambda *args: None)
+    instance = server.make_server(port=0, workers=2, warm=False)
+    threading.Thread(target=instance.serve_forever, args=(0.05,), daemon=True).start()
+    yield instance
+    instance.shutdown()
+    instance.server_close()
+
+
+def connect(httpd):
+    return http.client.HTTPConnection('127.0.0.1', httpd.server_port, timeout=5)
+
+
+def request(conn, method, path, data=None):
+    body = json.dumps(data) if data is not None else None
+    conn.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def raw(httpd, data):
+    with socket.create_connection(('127.0.0.1', httpd.server_port), timeout=5) as sock:
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b''.join(chunks).decode()
+            chunks.append(chunk)
+
+
+def test_routes_requests_to_the_handlers(httpd):
+    conn = connect(httpd)
+    response, body = request(conn, 'POST', '/api/nearest_facilities/', NEAREST)
+    assert response.status == 200
+    assert json.loads(body)['nearestFacilities'][0]['facilities'][0]['facility']['name'] == 'Clinic'
+
+    response, body = request(conn, 'GET', '/api/unknown')
+    assert response.status == 404 and 'No route' in json.loads(body)['error']
+    response, body = request(conn, 'GET', '/api/sitrep')
+    assert response.status == 405
+
+
+def test_unrouted_request_with_a_body_closes_the_connection(httpd):
+    conn = connect(httpd)
+    response, _ = request(conn, 'POST', '/api/unknown', {'unread': True})
+    assert response.status == 404 and response.getheader('Connection') == 'close'
+
+    # The next request goes out on a new connection and is not mixed with the body
+    response, _ = request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+    assert response.status == 200
+
+
+def test_body_without_length_is_rejected(httpd):
+    reply = raw(httpd, b'POST /api/sitrep HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n{}')
+
+    assert reply.startswith('HTTP/1.0 411') or reply.startswith('HTTP/1.1 411')
+    assert 'Content-Length required' in reply
+
+
+def test_oversized_body_is_rejected_and_the_connection_closed(httpd, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_BODY_BYTES', 100)
+    reply = raw(httpd, b'POST /api/sitrep HTTP/1.1\r\nHost: test\r\nContent-Length: 1000\r\n\r\n' + b'x' * 200)
+
+    assert ' 413 ' in reply.splitlines()[0]
+    assert 'Connection: close' in reply
+
+
+def test_connections_are_kept_alive(httpd):
+    conn = connect(httpd)
+    request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+    sock = conn.sock
+    for _ in range(3):
+        response, _ = request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+        assert response.status == 200
+    assert conn.sock is sock
+
+
+def test_pipelined_requests_are_all_served(httpd):
+    body = json.dumps(NEAREST).encode()
+    one = (b'POST /api/nearest_facilities HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n'
+           + f'Content-Length: {len(body)}\r\n'.encode())
+    reply = raw(httpd, one + b'\r\n' + body + one + b'Connection: close\r\n\r\n' + body)
+
+    assert reply.count('HTTP/1.1 200') == 2
+
+
+def test_idle_connections_do_not_hold_workers(httpd):
+    # Twice as many idle keep-alive clients as workers
+    idle = [connect(httpd) for _ in range(4)]
+    for conn in idle:
+        request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+
+    start = time.monotonic()
+    response, _ = request(connect(httpd), 'POST', '/api/nearest_facilities', NEAREST)
+    assert response.status == 200 and time.monotonic() - start < 1
+    assert httpd.idle_connections() >= 4
+    # The idle ones are served again when their next request arrives
+    for conn in idle:
+        assert request(conn, 'POST', '/api/nearest_facilities', NEAREST)[0].status == 200
+
+
+def test_idle_connections_are_closed_after_the_timeout(httpd, monkeypatch):
+    monkeypatch.setattr(server, 'KEEPALIVE_TIMEOUT', 0.2)
+    conn = connect(httpd)
+    request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+    conn.sock.settimeout(2)
+
+    assert conn.sock.recv(1) == b''
+    assert httpd.idle_connections() == 0
+
+
+def test_metrics_endpoint(httpd):
+    metrics.configure(enabled=True)
+    metrics.REGISTRY.reset()
+    try:
+        conn = connect(httpd)
+        request(conn, 'POST', '/api/nearest_facilities', NEAREST)
+        request(conn, 'GET', '/api/../../etc')
+        response, body = request(conn, 'GET', '/metrics')
+    finally:
+        metrics.configure(enabled=False)
+        metrics.REGISTRY.reset()
+
+    assert response.status == 200 and response.getheader('Content-type').startswith('text/plain')
+    text = body.decode()
+    assert 'requests_total{route="/api/nearest_facilities",status="200"} 1' in text
+    assert 'requests_total{route="other",status="404"} 1' in text
+    assert 'request_duration_seconds_count{route="/api/nearest_facilities"} 1' in text
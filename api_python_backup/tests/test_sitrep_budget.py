@@ -0,0 +1,68 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import sitrep
+from situation_overview import estimate_tokens
+from test_situation_overview import scenario
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), sitrep.handler)
+    httpd.daemon_threads = True
+    sitrep.handler.log_message = lambda *args: None
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize('requested, budget', [(None, sitrep.SITREP_OVERVIEW_TOKENS), (1000, 1000),
+                                               (10 ** 6, sitrep.SITREP_OVERVIEW_TOKENS),
+                                               (1, sitrep.SITREP_MIN_OVERVIEW_TOKENS),
+                                               (-50, sitrep.SITREP_MIN_OVERVIEW_TOKENS)])
+def test_requested_budget_is_clamped(server, monkeypatch, requested, budget):
+    options = []
+    monkeypatch.setattr(sitrep, 'generate_sitrep', lambda facilities, disasters, **kwargs: options.append(kwargs))
+    data = {'disasters': [{'eventType': 'EQ', 'title': 'M6'}]}
+    if requested is not None:
+        data['tokenBudget'] = requested
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    conn.request('POST', '/api/sitrep', body=json.dumps(data), headers={'Content-Type': 'application/json'})
+    assert conn.getresponse().status == 200
+
+    assert options == [{'token_budget': budget, 'map_reduce': False}]
+
+
+@pytest.mark.parametrize('budget', [200, 600, 3000])
+def test_map_reduce_overview_stays_within_budget(monkeypatch, budget):
+    requests = []
+
+    def verbose_summary(messages, max_tokens, **kwargs):
+        requests.append(max_tokens)
+        return 'The situation is severe. ' * 200
+
+    monkeypatch.setattr(sitrep, 'chat_completion', verbose_summary)
+    impacted, disasters = scenario()
+    overview = sitrep.map_reduce_overview(impacted, disasters, budget)
+
+    assert estimate_tokens(overview) <= budget
+    assert [line for line in overview.splitlines() if line.endswith(':')] == ['EARTHQUAKE:', 'TROPICAL CYCLONE:',
+                                                                             'FLOOD:']
+    assert len(requests) == 3 and max(requests) <= budget // 3
+
+
+def test_failed_summaries_fall_back_within_budget(monkeypatch):
+    def failing(**kwargs):
+        raise RuntimeError('model unavailable')
+
+    monkeypatch.setattr(sitrep, 'chat_completion', failing)
+    impacted, disasters = scenario()
+    overview = sitrep.map_reduce_overview(impacted, disasters, 600)
+
+    assert estimate_tokens(overview) <= 600
+    assert 'Alert Level: Red' in overview
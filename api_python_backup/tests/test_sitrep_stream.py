@@ -0,0 +1,93 @@
+import functools
+import http.client
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import sitrep
+
+REQUEST = {'disasters': [{'guid': 'EQ1', 'eventType': 'EQ', 'title': 'M6 earthquake', 'pubDate': '1'}], 'stream': True}
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), sitrep.handler)
+    httpd.daemon_threads = True
+    sitrep.handler.log_message = lambda *args: None
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(server, data=REQUEST):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    conn.request('POST', '/api/sitrep', body=json.dumps(data), headers={'Content-Type': 'application/json'})
+    return conn, conn.getresponse()
+
+
+def events(text):
+    parsed = []
+    for block in text.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        parsed.append((lines['event'], json.loads(lines['data'])))
+    return parsed
+
+
+def test_tokens_are_streamed_then_done(server, llm_api):
+    llm_api.answer = 'Situation is stable'
+    _, response = post(server)
+
+    assert response.getheader('Content-type') == 'text/event-stream'
+    received = events(response.read().decode())
+    assert [name for name, _ in received] == ['token'] * 3 + ['done']
+    assert received[-1][1] == {'sitrep': 'Situation is stable'}
+
+
+def test_stream_that_cannot_open_falls_back_to_one_buffered_attempt(server, llm_api, monkeypatch):
+    monkeypatch.setattr(sitrep, 'stream_chat_completion',
+                        functools.partial(sitrep.stream_chat_completion, retries=1, backoff=0.01))
+    llm_api.statuses = [503, 503]
+    _, response = post(server)
+
+    assert response.status == 200
+    assert response.getheader('Content-type') == 'application/json'
+    assert json.loads(response.read()) == {'sitrep': 'Stay safe'}
+    # The stream's retries are not repeated by the buffered request
+    assert [stream for _, stream in llm_api.requests] == [True, True, False]
+
+
+def test_refused_stream_returns_the_error_without_a_buffered_request(server, llm_api):
+    llm_api.statuses = [400]
+    _, response = post(server)
+
+    assert response.status == 200
+    assert response.getheader('Content-type') == 'application/json'
+    assert json.loads(response.read())['sitrep'].startswith('Error generating Situation Report: stub 400')
+    assert [stream for _, stream in llm_api.requests] == [True]
+
+
+def test_stream_failing_before_the_first_token_falls_back_to_buffered_json(server, llm_api):
+    llm_api.bad_stream = True
+    _, response = post(server)
+
+    assert response.getheader('Content-type') == 'application/json'
+    assert json.loads(response.read()) == {'sitrep': 'Stay safe'}
+
+
+def test_client_disconnect_closes_the_upstream_stream(server, llm_api):
+    llm_api.answer = ' '.join(['word'] * 2000)
+    llm_api.token_delay = 0.002
+    conn, response = post(server)
+    assert response.fp.readline().startswith(b'event: token')
+    response.close()
+    conn.close()
+
+    deadline = time.monotonic() + 5
+    while not llm_api.disconnects and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert llm_api.disconnects == 1
+    assert llm_api.tokens_sent < 2000
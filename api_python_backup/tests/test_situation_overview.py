@@ -0,0 +1,47 @@
+import pytest
+
+from situation_overview import budgeted_overview, estimate_tokens
+
+LEVELS = ('Green', 'Orange', 'Red')
+
+
+def scenario(events=60, facilities=2000):
+    disasters = [{'eventId': str(i), 'eventType': ('EQ', 'TC', 'FL')[i % 3], 'title': f'Event {i}',
+                  'alertLevel': LEVELS[i % 3]} for i in range(events)]
+    impacted = [{'facility': {'name': f'Facility {j}', 'country': f'Country {j % 7}'},
+                 'impacts': [{'disaster': disasters[(j * 7 + k) % events], 'distance': float(j % 300 + k)}
+                             for k in range(3)]} for j in range(facilities)]
+    return impacted, disasters
+
+
+@pytest.mark.parametrize('budget', [200, 500, 1000, 3000, 10_000])
+def test_budgeted_overview_stays_within_budget(budget):
+    impacted, disasters = scenario()
+    overview = budgeted_overview(impacted, disasters, budget)
+
+    assert sum(estimate_tokens(line) + 1 for line in overview.splitlines()) <= budget
+    assert 'IMPACTED FACILITIES: 2000' in overview
+
+
+def test_most_severe_events_are_admitted_first():
+    impacted, disasters = scenario()
+    overview = budgeted_overview(impacted, disasters, 400)
+    headlines = [line for line in overview.splitlines() if line.startswith('- ')]
+
+    assert 0 < len(headlines) < len(disasters)
+    assert all('Alert Level: Red' in line for line in headlines)
+    assert 'lower-severity disasters and further detail omitted' in overview
+    # Among equally alerted events, the one impacting more facilities leads
+    counts = [int(line.rsplit(': ', 1)[1].split()[0]) for line in headlines]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_headlines_come_before_detail():
+    impacted, disasters = scenario(events=6, facilities=200)
+    lines = budgeted_overview(impacted, disasters, 200).splitlines()
+
+    assert sum(line.startswith('- ') for line in lines) == 6
+    # Distance bands of the most severe events, nothing further
+    assert [line.startswith('  Distance bands') for line in lines[5:8]] == [True, False, True]
+    assert not any(line.startswith(('  Most affected', '  Nearest')) for line in lines)
+    assert budgeted_overview(impacted, disasters, 10_000).count('Nearest facilities') == 6